@@ -0,0 +1,299 @@
+# GSD-Calculator for UAV Flights - headless batch mode
+#
+# Streams (camera_name, altitude_m) or (camera_name, gsd_cm) rows from a CSV/JSONL job file
+# or stdin, computes the missing value in fixed-size chunks and writes the results as it goes,
+# so memory stays constant regardless of the size of the job file.
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import sys
+import time
+
+import numpy as np
+
+import instrumentation
+from main import Camera_Database, GSDCalculator, get_pixel_size_um
+
+# Same bounds the interactive calculators pass to validate_input
+ALTITUDE_BOUNDS = (0, 2000000)
+GSD_BOUNDS = (0, 10000)
+
+DEFAULT_CHUNK_SIZE = 65536
+OUTPUT_FIELDS = ['camera_name', 'altitude_m', 'gsd_cm']
+REJECT_FIELDS = ['line', 'camera_name', 'altitude_m', 'gsd_cm', 'reason']
+
+
+def read_csv_rows(stream):
+  """
+  Reads job rows from a CSV stream with a header line.
+
+  The header must contain 'camera_name' and at least one of 'altitude_m' and 'gsd_cm'.
+
+  Args:
+    stream (file): A text stream positioned at the header line.
+
+  Yields:
+    tuple: (line, camera_name, altitude_m, gsd_cm, error) with the raw field values.
+
+  Raises:
+    ValueError: If the header is missing the required columns.
+  """
+  reader = csv.reader(stream)
+  header = next(reader, None)
+  if header is None:
+    return
+  header = [field.strip() for field in header]
+  if 'camera_name' not in header or ('altitude_m' not in header and 'gsd_cm' not in header):
+    raise ValueError("CSV header must contain camera_name and altitude_m and/or gsd_cm.")
+  name_col = header.index('camera_name')
+  altitude_col = header.index('altitude_m') if 'altitude_m' in header else None
+  gsd_col = header.index('gsd_cm') if 'gsd_cm' in header else None
+  width = len(header)
+  for line, row in enumerate(reader, start=2):
+    if not row:
+      continue
+    if len(row) != width:
+      yield line, ','.join(row), '', '', f"expected {width} fields, got {len(row)}"
+      continue
+    yield (line, row[name_col], '' if altitude_col is None else row[altitude_col],
+           '' if gsd_col is None else row[gsd_col], None)
+
+
+def read_jsonl_rows(stream):
+  """
+  Reads job rows from a JSON Lines stream, one object per line.
+
+  Args:
+    stream (file): A text stream of JSON objects with 'camera_name' and 'altitude_m' or 'gsd_cm'.
+
+  Yields:
+    tuple: (line, camera_name, altitude_m, gsd_cm, error) with the raw field values.
+  """
+  for line, text in enumerate(stream, start=1):
+    if not text.strip():
+      continue
+    try:
+      row = json.loads(text)
+    except ValueError as e:
+      yield line, text.strip(), '', '', f"invalid JSON: {e}"
+      continue
+    if not isinstance(row, dict):
+      yield line, text.strip(), '', '', "expected a JSON object"
+      continue
+    yield (line, row.get('camera_name', ''), row.get('altitude_m', ''), row.get('gsd_cm', ''), None)
+
+
+def iter_chunks(rows, chunk_size):
+  """
+  Groups an iterator of rows into lists of at most chunk_size rows.
+
+  Args:
+    rows (Iterable): The rows to group.
+    chunk_size (int): The maximum number of rows per chunk.
+
+  Yields:
+    list: The next chunk of rows.
+  """
+  rows = iter(rows)
+  chunk = list(itertools.islice(rows, chunk_size))
+  while chunk:
+    yield chunk
+    chunk = list(itertools.islice(rows, chunk_size))
+
+
+def parse_floats(values):
+  """
+  Converts a list of raw field values to a float64 array, with NaN for missing or bad values.
+  JSON true/false are bad values, not 1 and 0.
+  """
+  try:
+    # Fast path: the whole column parses in one call
+    return np.array([np.nan if value == '' or value is None or isinstance(value, bool) else value
+                     for value in values], dtype=np.float64)
+  except (TypeError, ValueError, OverflowError):
+    parsed = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+      if isinstance(value, bool):
+        continue
+      try:
+        parsed[i] = float(value)
+      except (TypeError, ValueError, OverflowError):
+        pass
+    return parsed
+
+
+class BatchJob:
+  """
+  Computes GSDs and altitudes for a stream of job rows in fixed-size chunks.
+  """
+
+  def __init__(self, camera_database, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Args:
+      camera_database (Camera_Database): The database to resolve camera names against.
+      chunk_size (int): The number of rows validated and computed per chunk.
+    """
+    self.camera_database = camera_database
+    self.chunk_size = chunk_size
+    # camera name -> (sensor_width_px, pixel_size_um, focal_length_mm), or None if unknown
+    self._cameras = {}
+    self.stats = {'rows': 0, 'written': 0, 'rejected': 0, 'chunks': 0}
+
+  def _resolve_camera(self, camera_name):
+    """
+    Resolves a camera through Camera_Database.get_camera_data, once per distinct name.
+    """
+    if camera_name not in self._cameras:
+      # get_camera_data reports unknown cameras on stdout, which may be our output stream
+      with contextlib.redirect_stdout(sys.stderr):
+        camera_parameters = self.camera_database.get_camera_data(camera_name)
+      if camera_parameters is None:
+        self._cameras[camera_name] = None
+      else:
+        self._cameras[camera_name] = (camera_parameters['sensor_width_px'],
+                                      get_pixel_size_um(camera_parameters),
+                                      camera_parameters['focal_length_mm'])
+    return self._cameras[camera_name]
+
+  def process_chunk(self, chunk):
+    """
+    Validates and computes one chunk of rows.
+
+    Args:
+      chunk (list): Rows as yielded by read_csv_rows/read_jsonl_rows.
+
+    Returns:
+      tuple: (results, rejects) where results is a list of (camera_name, altitude_m, gsd_cm)
+      in input order and rejects is a list of (line, camera_name, altitude_m, gsd_cm, reason).
+    """
+    lines, names, raw_altitudes, raw_gsds, errors = zip(*chunk)
+    altitude_m = parse_floats(raw_altitudes)
+    gsd_cm = parse_floats(raw_gsds)
+
+    # Resolve each distinct camera once and map the rows onto the unique list. Malformed rows
+    # carry the raw line as their name, so they are kept out of the lookup.
+    parsed_rows = [i for i, error in enumerate(errors) if error is None]
+    unique_names, camera_index = np.unique([str(names[i]) for i in parsed_rows], return_inverse=True)
+    cameras = [self._resolve_camera(name) for name in unique_names.tolist()]
+    known = np.zeros(len(chunk), dtype=bool)
+    known[parsed_rows] = np.array([camera is not None for camera in cameras], dtype=bool)[camera_index]
+    parameters = np.full((len(chunk), 3), np.nan)
+    parameters[parsed_rows] = np.array([camera if camera is not None else (np.nan, np.nan, np.nan)
+                                        for camera in cameras], dtype=np.float64).reshape(-1, 3)[camera_index]
+
+    # Vectorized validation of the whole chunk
+    has_altitude = ~np.isnan(altitude_m)
+    has_gsd = ~np.isnan(gsd_cm)
+    reason = np.full(len(chunk), None, dtype=object)
+    reason[has_gsd & ~((gsd_cm >= GSD_BOUNDS[0]) & (gsd_cm <= GSD_BOUNDS[1]))] = \
+      f"gsd_cm out of range {GSD_BOUNDS}"
+    reason[has_altitude & ~((altitude_m >= ALTITUDE_BOUNDS[0]) & (altitude_m <= ALTITUDE_BOUNDS[1]))] = \
+      f"altitude_m out of range {ALTITUDE_BOUNDS}"
+    reason[has_altitude & has_gsd] = "expected only one of altitude_m and gsd_cm"
+    reason[~has_altitude & ~has_gsd] = "missing or invalid altitude_m/gsd_cm"
+    reason[~known] = "unknown camera"
+    raw_errors = np.array(errors, dtype=object)
+    has_error = raw_errors != None  # noqa: E711 - elementwise comparison
+    reason[has_error] = raw_errors[has_error]
+    valid = reason == None  # noqa: E711 - elementwise comparison
+
+    # Fill in the missing column for the valid rows
+    width_px, pixel_size_um, focal_length_mm = parameters.T
+    to_gsd = valid & has_altitude
+    to_altitude = valid & has_gsd
+    gsd_cm[to_gsd] = GSDCalculator.calculate_gsd_batch(
+      altitude_m[to_gsd], width_px[to_gsd], pixel_size_um[to_gsd], focal_length_mm[to_gsd], outer=False)
+    altitude_m[to_altitude] = GSDCalculator.calculate_altitude_batch(
+      gsd_cm[to_altitude], width_px[to_altitude], pixel_size_um[to_altitude],
+      focal_length_mm[to_altitude], outer=False)
+
+    valid_rows = np.flatnonzero(valid).tolist()
+    results = list(zip([names[i] for i in valid_rows], altitude_m[valid_rows].tolist(),
+                       gsd_cm[valid_rows].tolist()))
+    rejects = [(lines[i], names[i], raw_altitudes[i], raw_gsds[i], reason[i])
+               for i in np.flatnonzero(~valid).tolist()]
+    return results, rejects
+
+  def run(self, rows, output, output_format='csv', rejects=None):
+    """
+    Processes all rows chunk by chunk, writing results as each chunk completes.
+
+    Args:
+      rows (Iterable): Rows as yielded by read_csv_rows/read_jsonl_rows.
+      output (file): Text stream for the results.
+      output_format (str): 'csv' or 'jsonl'.
+      rejects (Optional[file]): Text stream for rejected rows (CSV); they are dropped if None.
+
+    Returns:
+      dict: Row, written, rejected and chunk counts.
+    """
+    if output_format == 'csv':
+      writer = csv.writer(output)
+      writer.writerow(OUTPUT_FIELDS)
+      write_results = writer.writerows
+    else:
+      def write_results(results):
+        output.write(''.join(json.dumps(dict(zip(OUTPUT_FIELDS, result))) + '\n' for result in results))
+    reject_writer = None
+    if rejects is not None:
+      reject_writer = csv.writer(rejects)
+      reject_writer.writerow(REJECT_FIELDS)
+
+    for chunk in iter_chunks(rows, self.chunk_size):
+      results, rejected = self.process_chunk(chunk)
+      write_results(results)
+      if reject_writer is not None:
+        reject_writer.writerows(rejected)
+      self.stats['rows'] += len(chunk)
+      self.stats['written'] += len(results)
+      self.stats['rejected'] += len(rejected)
+      self.stats['chunks'] += 1
+    return self.stats
+
+
+def _detect_format(path, requested):
+  """
+  Picks the file format from an explicit choice or the file extension.
+  """
+  if requested is not None:
+    return requested
+  if path is not None and path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+    return 'jsonl'
+  return 'csv'
+
+
+def main(argv=None):
+  """
+  Command line entry point for the headless batch mode.
+  """
+  parser = argparse.ArgumentParser(
+    description="Compute GSDs/altitudes for a CSV or JSONL job file without the interactive menu.")
+  parser.add_argument('input', nargs='?', default='-', help="Job file, or - for stdin (default)")
+  parser.add_argument('-o', '--output', default='-', help="Result file, or - for stdout (default)")
+  parser.add_argument('-r', '--rejects', help="CSV file for rejected rows")
+  parser.add_argument('--input-format', choices=['csv', 'jsonl'], help="Default: from file extension, csv for stdin")
+  parser.add_argument('--output-format', choices=['csv', 'jsonl'], help="Default: from file extension, csv for stdout")
+  parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per chunk")
+  args = parser.parse_args(argv)
+  instrumentation.configure_from_environment()
+
+  input_format = _detect_format(None if args.input == '-' else args.input, args.input_format)
+  output_format = _detect_format(None if args.output == '-' else args.output, args.output_format)
+  start = time.perf_counter()
+  with contextlib.ExitStack() as stack:
+    source = sys.stdin if args.input == '-' else stack.enter_context(open(args.input, newline=''))
+    output = sys.stdout if args.output == '-' else stack.enter_context(open(args.output, 'w', newline=''))
+    rejects = None if args.rejects is None else stack.enter_context(open(args.rejects, 'w', newline=''))
+    rows = read_jsonl_rows(source) if input_format == 'jsonl' else read_csv_rows(source)
+    stats = BatchJob(Camera_Database.from_environment(), args.chunk_size).run(rows, output, output_format, rejects)
+  elapsed = time.perf_counter() - start
+  print(f"Processed {stats['rows']} rows ({stats['written']} written, {stats['rejected']} rejected) "
+        f"in {elapsed:.2f}s", file=sys.stderr)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
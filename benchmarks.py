@@ -0,0 +1,500 @@
+# GSD-Calculator for UAV Flights - benchmark suite
+#
+# Measures the calculator, camera database and batch paths with the standard library and NumPy
+# only, so a change that makes one of them slower shows up before it is released.
+#
+#   python benchmarks.py run -o before.json
+#   python benchmarks.py run -o after.json
+#   python benchmarks.py compare before.json after.json --threshold 0.1
+#
+# Every result records 'seconds' (median time per operation) and, where it applies,
+# 'peak_bytes' (tracemalloc peak while the operation ran) or 'retained_bytes' (memory a data
+# structure holds). compare flags any of them that grew by more than the threshold and exits
+# with status 1.
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from batch_mode import BatchJob, read_csv_rows
+from camera_catalog import CameraCatalog
+from camera_storage import JSONCameraStorage, SQLiteCameraStorage
+import main as gsd_main
+from main import Camera_Database, CompiledCamera, GSDCalculator, validate_input
+from parallel import ShardedExecutor
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+QUICK_SIZES = (1000, 10000)
+DEFAULT_THRESHOLD = 0.10
+# Metrics compare looks at; for all of them larger is worse
+COMPARED_METRICS = ('seconds', 'peak_bytes', 'retained_bytes')
+
+# name -> function(config) returning {result name: metrics}
+BENCHMARKS = {}
+
+# One pass through every menu screen, including invalid input and going back; repeated by the
+# menu benchmark. Ends on the main menu.
+MENU_SCRIPT = ('1', 'x', '99', '0', '120', '55.5', 'abc', 'b',
+               '2', '0', '1.5', '-3', 'b',
+               '3', '',
+               '4', 'b',
+               '4', 'New camera', '6000', 'b',
+               '6', '',
+               'nonsense',
+               '2', 'b')
+
+
+def benchmark(name):
+  """
+  Registers a benchmark function under a name.
+  """
+  def register(func):
+    BENCHMARKS[name] = func
+    return func
+  return register
+
+
+def measure(func, number, repeat=5):
+  """
+  Times a function.
+
+  Args:
+    func (callable): Called without arguments.
+    number (int): Calls per timing run.
+    repeat (int): Timing runs.
+
+  Returns:
+    dict: 'seconds' (median per call), 'best_seconds' and 'ops_per_s'.
+  """
+  runs = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    for _ in range(number):
+      func()
+    runs.append((time.perf_counter() - start) / number)
+  seconds = statistics.median(runs)
+  return {'seconds': seconds, 'best_seconds': min(runs), 'ops_per_s': 1 / seconds if seconds else None}
+
+
+def peak_memory(func):
+  """
+  Runs a function once under tracemalloc.
+
+  Returns:
+    tuple: (result of func, peak traced bytes).
+  """
+  tracemalloc.start()
+  try:
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return result, peak
+
+
+def retained_memory(func):
+  """
+  Runs a function once under tracemalloc.
+
+  Returns:
+    tuple: (result of func, bytes still traced afterwards, i.e. held by the result).
+  """
+  tracemalloc.start()
+  try:
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return result, current
+
+
+def synthetic_cameras(n, seed=0):
+  """
+  Builds n cameras with realistic parameter ranges.
+
+  Returns:
+    dict: Camera name -> parameters, in the layout Camera_Database stores.
+  """
+  rng = np.random.default_rng(seed)
+  widths = rng.integers(640, 12000, n).tolist()
+  heights = rng.integers(480, 9000, n).tolist()
+  pixel_sizes = np.round(rng.uniform(1.0, 12.0, n), 2).tolist()
+  focal_lengths = np.round(rng.uniform(4.0, 200.0, n), 1).tolist()
+  return {f'Synthetic camera {i:06d}': {'sensor_width_px': widths[i], 'sensor_height_px': heights[i],
+                                        'pixel_size_um': pixel_sizes[i], 'focal_length_mm': focal_lengths[i]}
+          for i in range(n)}
+
+
+def _storage(backend, directory, name):
+  if backend == 'json':
+    return JSONCameraStorage(os.path.join(directory, name + '.json'))
+  return SQLiteCameraStorage(os.path.join(directory, name + '.db'))
+
+
+def _seeded_storage(backend, directory, n):
+  """
+  Writes n synthetic cameras to a new storage and returns a function that reopens it.
+  """
+  _storage(backend, directory, f'{backend}-{n}').save(synthetic_cameras(n))
+  return lambda: _storage(backend, directory, f'{backend}-{n}')
+
+
+@benchmark('calculator')
+def bench_calculator(config):
+  """
+  Scalar GSDCalculator calls against CompiledCamera and the batch API, per value.
+  """
+  camera = {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27, 'focal_length_mm': 35}
+  compiled_camera = CompiledCamera('Zenmuse P1 35mm', camera)
+  cameras = synthetic_cameras(config['batch_cameras'])
+  widths = np.array([c['sensor_width_px'] for c in cameras.values()])
+  pixel_sizes = np.array([c['pixel_size_um'] for c in cameras.values()])
+  focal_lengths = np.array([c['focal_length_mm'] for c in cameras.values()])
+  altitudes = np.linspace(10, 500, config['batch_values'])
+  gsds = np.linspace(0.1, 10, config['batch_values'])
+  cells = altitudes.size * widths.size
+  number = config['number']
+  results = {
+    'calculator.gsd.scalar': measure(lambda: GSDCalculator.calculate_gsd(120.0, 8192, 4.27, 35), number),
+    'calculator.altitude.scalar': measure(lambda: GSDCalculator.calculate_altitude(1.5, 8192, 4.27, 35), number),
+    'calculator.gsd.compiled': measure(lambda: compiled_camera.calculate_gsd(120.0), number),
+    'calculator.altitude.compiled': measure(lambda: compiled_camera.calculate_altitude(1.5), number),
+  }
+  for name, func, values in (('gsd', GSDCalculator.calculate_gsd_batch, altitudes),
+                             ('altitude', GSDCalculator.calculate_altitude_batch, gsds)):
+    out = np.empty((values.size, widths.size))
+    timing = measure(lambda: func(values, widths, pixel_sizes, focal_lengths, out=out), 20)
+    # Per value, so scalar and batch numbers are directly comparable
+    results[f'calculator.{name}.batch'] = {key: value / cells if key != 'ops_per_s' else value * cells
+                                           for key, value in timing.items()}
+  results['validate_input.float'] = measure(lambda: validate_input('120.5', 0, 2000000, [float]), number)
+  results['validate_input.int'] = measure(lambda: validate_input('8192', 1, 100000, [int]), number)
+  return results
+
+
+@benchmark('catalog_load')
+def bench_catalog_load(config):
+  """
+  Camera_Database start-up time and memory for growing synthetic catalogs.
+  """
+  results = {}
+  with tempfile.TemporaryDirectory() as directory:
+    for backend in ('json', 'sqlite'):
+      for n in config['sizes']:
+        reopen = _seeded_storage(backend, directory, n)
+        result = measure(lambda: Camera_Database(reopen()), 1, repeat=config['repeat'])
+        _, result['peak_bytes'] = peak_memory(lambda: Camera_Database(reopen()))
+        result['cameras'] = n
+        results[f'catalog_load.{backend}.{n}'] = result
+  return results
+
+
+@benchmark('add_camera')
+def bench_add_camera(config):
+  """
+  Cost of Camera_Database.add_camera as the catalog grows.
+  """
+  results = {}
+  with tempfile.TemporaryDirectory() as directory:
+    for backend in ('json', 'sqlite'):
+      for n in config['sizes']:
+        camera_database = Camera_Database(_seeded_storage(backend, directory, n)())
+        counter = iter(range(10 ** 9))
+
+        def add():
+          camera_database.add_camera(f'Added camera {next(counter)}', 6000, 4000, 3.9, 24)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+          result = measure(add, 1, repeat=config['repeat'])
+        result['cameras'] = n
+        results[f'add_camera.{backend}.{n}'] = result
+  return results
+
+
+@benchmark('catalog_layout')
+def bench_catalog_layout(config):
+  """
+  The dict per camera layout of Camera_Database against CameraCatalog: memory held, a single
+  lookup by name and the GSD of every camera at 120 m. The name strings are shared by both
+  layouts and not counted.
+  """
+  results = {}
+  for n in config['sizes']:
+    cameras = synthetic_cameras(n)
+    names = list(cameras)
+    columns = [np.array([camera[field] for camera in cameras.values()]) for field in
+               ('sensor_width_px', 'sensor_height_px', 'pixel_size_um', 'focal_length_mm')]
+
+    def build_dicts():
+      # Fresh number objects, as json.load creates them
+      return {name: {'sensor_width_px': width, 'sensor_height_px': height, 'pixel_size_um': pixel_size,
+                     'focal_length_mm': focal_length}
+              for name, width, height, pixel_size, focal_length in zip(names, *(column.tolist() for column in columns))}
+
+    dicts, dict_bytes = retained_memory(build_dicts)
+    catalog, catalog_bytes = retained_memory(lambda: CameraCatalog.from_dict(dicts))
+    name = names[n // 2]
+    layouts = {
+      'dict': {'memory': dict_bytes, 'lookup': lambda: dicts[name],
+               'gsd_all': lambda: [GSDCalculator.calculate_gsd(120, camera['sensor_width_px'], camera['pixel_size_um'],
+                                                               camera['focal_length_mm'])
+                                   for camera in dicts.values()]},
+      'columnar': {'memory': catalog_bytes, 'lookup': lambda: catalog.get(name),
+                   'gsd_all': lambda: catalog.calculate_gsd(120)},
+    }
+    for layout, cases in layouts.items():
+      lookup = measure(cases['lookup'], config['number'], repeat=config['repeat'])
+      lookup['retained_bytes'] = cases['memory']
+      results[f'catalog_layout.{layout}.lookup.{n}'] = lookup
+      results[f'catalog_layout.{layout}.gsd_all.{n}'] = measure(cases['gsd_all'], 1, repeat=config['repeat'])
+  return results
+
+
+@benchmark('batch_file')
+def bench_batch_file(config):
+  """
+  End-to-end batch_mode throughput: parse a CSV, compute and write the results.
+  """
+  rows = config['batch_rows']
+  cameras = synthetic_cameras(100)
+  names = list(cameras)
+  rng = np.random.default_rng(1)
+  with tempfile.TemporaryDirectory() as directory:
+    camera_database = Camera_Database(JSONCameraStorage(os.path.join(directory, 'cameras.json')))
+    camera_database.add_cameras(cameras)
+    input_path = os.path.join(directory, 'input.csv')
+    with open(input_path, 'w') as f:
+      f.write('camera_name,altitude_m,gsd_cm\n')
+      picks = rng.integers(0, len(names), rows)
+      altitudes = rng.uniform(10, 500, rows)
+      gsds = rng.uniform(0.1, 10, rows)
+      has_altitude = rng.random(rows) < 0.5
+      for pick, altitude, gsd, use_altitude in zip(picks.tolist(), altitudes.tolist(), gsds.tolist(),
+                                                   has_altitude.tolist()):
+        f.write(f'{names[pick]},{altitude:.2f},\n' if use_altitude else f'{names[pick]},,{gsd:.3f}\n')
+
+    def run():
+      with open(input_path, newline='') as source, open(os.path.join(directory, 'output.csv'), 'w',
+                                                         newline='') as output:
+        BatchJob(camera_database).run(read_csv_rows(source), output)
+
+    result = measure(run, 1, repeat=config['repeat'])
+  result['rows'] = rows
+  result['rows_per_s'] = rows / result['seconds']
+  return {f'batch_file.{rows}': result}
+
+
+@benchmark('menu')
+def bench_menu(config):
+  """
+  Scripted interactive session: menu_transitions inputs through display_menu, recording the
+  deepest stack seen at an input prompt and the peak traced memory.
+  """
+  # Whole passes through the script, so the final 'q' lands on the main menu
+  passes = -(-config['menu_transitions'] // len(MENU_SCRIPT))
+  transitions = passes * len(MENU_SCRIPT) + 1
+  with tempfile.TemporaryDirectory() as directory:
+    camera_database = Camera_Database(JSONCameraStorage(os.path.join(directory, 'cameras.json')))
+
+    def session(trace):
+      script = itertools.chain(itertools.chain.from_iterable(itertools.repeat(MENU_SCRIPT, passes)), ['q'])
+      # Only the extremes, so the probe itself does not grow with the session
+      depths = [sys.maxsize, 0]
+
+      def scripted_input(prompt=''):
+        if trace:
+          depth, frame = 0, sys._getframe()
+          while frame is not None:
+            depth, frame = depth + 1, frame.f_back
+          depths[0], depths[1] = min(depths[0], depth), max(depths[1], depth)
+        return next(script)
+
+      gsd_main.input = scripted_input
+      gsd_main.clear_console = lambda: None
+      try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+          gsd_main.display_menu(camera_database)
+      finally:
+        del gsd_main.input
+        gsd_main.clear_console = clear_console
+      return depths
+
+    clear_console = gsd_main.clear_console
+    result = measure(lambda: session(False), 1, repeat=1)
+    depths, result['peak_bytes'] = peak_memory(lambda: session(True))
+  peak_bytes = result.pop('peak_bytes')
+  # Per transition, like the other per-operation timings
+  result = {key: value / transitions if key != 'ops_per_s' else value * transitions
+            for key, value in result.items()}
+  result.update({'peak_bytes': peak_bytes, 'transitions': transitions, 'min_stack_depth': depths[0],
+                 'max_stack_depth': depths[1]})
+  return {f"menu.{config['menu_transitions']}": result}
+
+
+@benchmark('parallel')
+def bench_parallel(config):
+  """
+  Scaling of ShardedExecutor.sweep over a catalog x altitude grid with 1, 2, 4, ... workers up
+  to the CPU count, against the same grid computed in-process. Pool start-up is not timed.
+  """
+  cameras = synthetic_cameras(config['parallel_cameras'])
+  altitudes = np.linspace(1, 500, config['parallel_values'])
+  cells = len(cameras) * len(altitudes)
+  cpus = os.cpu_count() or 1
+  worker_counts = sorted({2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus} | {cpus})
+  results = {}
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, 'cameras.json')
+    JSONCameraStorage(path).save(cameras)
+    catalog = CameraCatalog.from_dict(cameras)
+    out = np.empty((len(altitudes), len(cameras)))
+    timings = {'inline': measure(lambda: catalog.calculate_gsd(altitudes, out=out), 1, repeat=config['repeat'])}
+    for workers in worker_counts:
+      with ShardedExecutor(workers, database_path=path) as executor:
+        executor.sweep('gsd', altitudes[:workers], list(cameras))  # Start the workers
+        timings[workers] = measure(lambda: executor.sweep('gsd', altitudes, list(cameras), out=out), 1,
+                                   repeat=config['repeat'])
+  for workers, timing in timings.items():
+    result = {key: value / cells if key != 'ops_per_s' else value * cells for key, value in timing.items()}
+    result.update({'cells': cells, 'workers': workers})
+    if workers != 'inline':
+      result['speedup'] = timings[1]['seconds'] / timing['seconds']
+      result['efficiency'] = result['speedup'] / workers
+    results[f'parallel.{workers}'] = result
+  return results
+
+
+def run_benchmarks(names=None, quick=False, sizes=None):
+  """
+  Runs benchmarks.
+
+  Args:
+    names (Optional[Iterable[str]]): The benchmarks to run (keys of BENCHMARKS); all by default.
+    quick (bool): Smaller catalogs and fewer repeats, for a fast smoke run.
+    sizes (Optional[Iterable[int]]): Catalog sizes for the database benchmarks.
+
+  Returns:
+    dict: 'meta' (environment and settings) and 'results' (result name -> metrics).
+
+  Raises:
+    ValueError: If a benchmark name is unknown.
+  """
+  names = list(BENCHMARKS) if names is None else list(names)
+  unknown = [name for name in names if name not in BENCHMARKS]
+  if unknown:
+    raise ValueError(f"Unknown benchmarks: {', '.join(unknown)}. Choose from {', '.join(BENCHMARKS)}.")
+  config = {'sizes': list(sizes or (QUICK_SIZES if quick else DEFAULT_SIZES)),
+            'repeat': 3 if quick else 5, 'number': 20000 if quick else 200000,
+            'batch_cameras': 100, 'batch_values': 1000, 'batch_rows': 20000 if quick else 200000,
+            'menu_transitions': 10000 if quick else 100000,
+            'parallel_cameras': 1000, 'parallel_values': 2000 if quick else 20000,
+            'quick': quick}
+  results = {}
+  for name in names:
+    results.update(BENCHMARKS[name](config))
+  meta = {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+          'machine': platform.machine(), 'cpus': os.cpu_count(),
+          'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'benchmarks': names, 'config': config}
+  return {'meta': meta, 'results': results}
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+  """
+  Compares two benchmark runs.
+
+  Args:
+    baseline (dict): An earlier run_benchmarks result.
+    current (dict): The run to check.
+    threshold (float): Relative growth, e.g. 0.1 for 10 %, above which a metric regressed.
+
+  Returns:
+    list: Dicts with the result name, metric, baseline and current value, relative change and
+    whether it regressed, for every metric present in both runs.
+  """
+  rows = []
+  for name, metrics in current['results'].items():
+    baseline_metrics = baseline['results'].get(name)
+    if baseline_metrics is None:
+      continue
+    for metric in COMPARED_METRICS:
+      old, new = baseline_metrics.get(metric), metrics.get(metric)
+      if not old or new is None:
+        continue
+      change = (new - old) / old
+      rows.append({'name': name, 'metric': metric, 'baseline': old, 'current': new, 'change': change,
+                   'regressed': change > threshold})
+  return rows
+
+
+def _format_value(metric, value):
+  if metric in ('peak_bytes', 'retained_bytes'):
+    return f'{value / 1e6:.2f} MB'
+  for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+    if value >= scale:
+      return f'{value / scale:.3f} {unit}'
+  return f'{value / 1e-9:.1f} ns'
+
+
+def main(argv=None):
+  """
+  Command line entry point for the benchmark suite.
+  """
+  parser = argparse.ArgumentParser(description="Run or compare the GSD calculator benchmarks.")
+  subparsers = parser.add_subparsers(dest='command', required=True)
+  run_parser = subparsers.add_parser('run', help="Run the benchmarks")
+  run_parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+  run_parser.add_argument('-o', '--output', help="Write the results to this JSON file")
+  run_parser.add_argument('--quick', action='store_true', help="Smaller sizes and fewer repeats")
+  run_parser.add_argument('--sizes', type=int, nargs='+', help="Catalog sizes for the database benchmarks")
+  compare_parser = subparsers.add_parser('compare', help="Compare two result files")
+  compare_parser.add_argument('baseline')
+  compare_parser.add_argument('current')
+  compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                              help="Relative slow-down that counts as a regression (default 0.1)")
+  args = parser.parse_args(argv)
+
+  if args.command == 'run':
+    try:
+      report = run_benchmarks(args.benchmarks or None, args.quick, args.sizes)
+    except ValueError as e:
+      print(f"Error: {e}")
+      return 1
+    for name, metrics in report['results'].items():
+      line = f"{name:<40} {_format_value('seconds', metrics['seconds']):>12}"
+      if 'peak_bytes' in metrics:
+        line += f"  peak {_format_value('peak_bytes', metrics['peak_bytes'])}"
+      if 'retained_bytes' in metrics:
+        line += f"  held {_format_value('retained_bytes', metrics['retained_bytes'])}"
+      print(line)
+    if args.output:
+      with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    return 0
+
+  with open(args.baseline) as f:
+    baseline = json.load(f)
+  with open(args.current) as f:
+    current = json.load(f)
+  rows = compare(baseline, current, args.threshold)
+  for row in rows:
+    flag = 'REGRESSION' if row['regressed'] else ''
+    print(f"{row['name']:<40} {row['metric']:<10} {_format_value(row['metric'], row['baseline']):>12} -> "
+          f"{_format_value(row['metric'], row['current']):>12} {row['change']:+7.1%} {flag}")
+  regressions = sum(row['regressed'] for row in rows)
+  print(f"{regressions} of {len(rows)} metrics regressed by more than {args.threshold:.0%}.")
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
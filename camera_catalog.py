@@ -0,0 +1,272 @@
+# GSD-Calculator for UAV Flights - columnar camera catalog
+#
+# Holds the camera database as parallel NumPy arrays (one per parameter) plus a name -> row
+# index, instead of one dict per camera. Single lookups return a lightweight Camera view and
+# catalog-wide questions such as "GSD of every camera at 120 m" are one vectorized call.
+
+import numpy as np
+
+from main import GSDCalculator, get_pixel_size_um
+
+
+class Camera:
+  """
+  Read-only view of one row of a CameraCatalog.
+  """
+  __slots__ = ('_catalog', '_row')
+
+  def __init__(self, catalog, row):
+    """
+    Args:
+      catalog (CameraCatalog): The catalog the camera belongs to.
+      row (int): The row of the camera in the catalog's column arrays.
+    """
+    self._catalog = catalog
+    self._row = row
+
+  @property
+  def name(self):
+    """
+    str: The name of the camera.
+    """
+    return self._catalog._names[self._row]
+
+  @property
+  def sensor_width_px(self):
+    """
+    int: The width of the sensor in pixels.
+    """
+    return int(self._catalog._sensor_width_px[self._row])
+
+  @property
+  def sensor_height_px(self):
+    """
+    int: The height of the sensor in pixels.
+    """
+    return int(self._catalog._sensor_height_px[self._row])
+
+  @property
+  def pixel_size_um(self):
+    """
+    float: The size of each pixel in micrometers.
+    """
+    return float(self._catalog._pixel_size_um[self._row])
+
+  @property
+  def focal_length_mm(self):
+    """
+    float: The focal length of the camera in millimeters.
+    """
+    return float(self._catalog._focal_length_mm[self._row])
+
+  def to_dict(self):
+    """
+    Returns:
+      dict: The camera parameters in the same layout as Camera_Database.get_camera_data.
+    """
+    return {'sensor_width_px': self.sensor_width_px, 'sensor_height_px': self.sensor_height_px,
+            'pixel_size_um': self.pixel_size_um, 'focal_length_mm': self.focal_length_mm}
+
+  def __repr__(self):
+    return f"Camera({self.name!r}, {self.to_dict()})"
+
+
+class CameraCatalog:
+  """
+  Struct-of-arrays camera catalog. Rows are appended in insertion order and never move, so
+  Camera views stay valid; adding an existing name updates its row in place.
+  """
+
+  def __init__(self, capacity=16):
+    """
+    Args:
+      capacity (int): The number of rows to preallocate. The arrays grow by doubling.
+    """
+    capacity = max(int(capacity), 1)
+    self._size = 0
+    self._names = []
+    self._index = {}
+    self._sensor_width_px = np.empty(capacity, dtype=np.int32)
+    self._sensor_height_px = np.empty(capacity, dtype=np.int32)
+    self._pixel_size_um = np.empty(capacity, dtype=np.float64)
+    self._focal_length_mm = np.empty(capacity, dtype=np.float64)
+
+  @classmethod
+  def from_dict(cls, cameras):
+    """
+    Builds a catalog from a camera name -> parameters dict, as stored by Camera_Database.
+
+    Args:
+      cameras (dict): Camera name -> dict with sensor_width_px, sensor_height_px,
+        pixel_size_um (or pixel_size_nm) and focal_length_mm.
+
+    Returns:
+      CameraCatalog: The new catalog.
+    """
+    catalog = cls(capacity=len(cameras))
+    n = len(cameras)
+    catalog._names = list(cameras)
+    catalog._index = {name: row for row, name in enumerate(catalog._names)}
+    parameters = cameras.values()
+    catalog._sensor_width_px[:n] = [camera['sensor_width_px'] for camera in parameters]
+    catalog._sensor_height_px[:n] = [camera['sensor_height_px'] for camera in parameters]
+    catalog._pixel_size_um[:n] = [get_pixel_size_um(camera) for camera in parameters]
+    catalog._focal_length_mm[:n] = [camera['focal_length_mm'] for camera in parameters]
+    catalog._size = n
+    return catalog
+
+  @classmethod
+  def from_camera_database(cls, camera_database):
+    """
+    Builds a catalog from the current contents of a Camera_Database.
+
+    Args:
+      camera_database (Camera_Database): The database to copy.
+
+    Returns:
+      CameraCatalog: The new catalog.
+    """
+    return cls.from_dict(camera_database.camera_database)
+
+  def _grow(self, capacity):
+    """
+    Reallocates the column arrays to hold at least capacity rows.
+    """
+    for attribute in ('_sensor_width_px', '_sensor_height_px', '_pixel_size_um', '_focal_length_mm'):
+      column = getattr(self, attribute)
+      grown = np.empty(capacity, dtype=column.dtype)
+      grown[:self._size] = column[:self._size]
+      setattr(self, attribute, grown)
+
+  def add(self, camera_name, sensor_width_px, sensor_height_px, pixel_size_um, focal_length_mm):
+    """
+    Adds a camera, or updates it in place if the name already exists.
+
+    Args:
+      camera_name (str): The name of the camera.
+      sensor_width_px (int): The width of the sensor in pixels.
+      sensor_height_px (int): The height of the sensor in pixels.
+      pixel_size_um (float): The size of each pixel in micrometers.
+      focal_length_mm (float): The focal length of the camera in millimeters.
+
+    Returns:
+      int: The row of the camera.
+    """
+    row = self._index.get(camera_name)
+    if row is None:
+      row = self._size
+      if row == len(self._sensor_width_px):
+        self._grow(2 * row)
+      self._names.append(camera_name)
+      self._index[camera_name] = row
+      self._size += 1
+    self._sensor_width_px[row] = sensor_width_px
+    self._sensor_height_px[row] = sensor_height_px
+    self._pixel_size_um[row] = pixel_size_um
+    self._focal_length_mm[row] = focal_length_mm
+    return row
+
+  def __len__(self):
+    return self._size
+
+  def __contains__(self, camera_name):
+    return camera_name in self._index
+
+  def get(self, camera_name):
+    """
+    Looks up a camera by name.
+
+    Args:
+      camera_name (str): The name of the camera.
+
+    Returns:
+      Camera or None: A view of the camera, or None if it is not in the catalog.
+    """
+    row = self._index.get(camera_name)
+    return None if row is None else Camera(self, row)
+
+  def row(self, camera_name):
+    """
+    Returns:
+      int: The row of a camera in the column arrays.
+
+    Raises:
+      KeyError: If the camera is not in the catalog.
+    """
+    return self._index[camera_name]
+
+  @property
+  def names(self):
+    """
+    list: The camera names, in row order.
+    """
+    return self._names
+
+  @property
+  def sensor_width_px(self):
+    """
+    numpy.ndarray: Sensor widths in pixels, in row order; a view of the column, not a copy.
+    """
+    return self._sensor_width_px[:self._size]
+
+  @property
+  def sensor_height_px(self):
+    """
+    numpy.ndarray: Sensor heights in pixels, in row order; a view of the column, not a copy.
+    """
+    return self._sensor_height_px[:self._size]
+
+  @property
+  def pixel_size_um(self):
+    """
+    numpy.ndarray: Pixel sizes in micrometers, in row order; a view of the column, not a copy.
+    """
+    return self._pixel_size_um[:self._size]
+
+  @property
+  def focal_length_mm(self):
+    """
+    numpy.ndarray: Focal lengths in millimeters, in row order; a view of the column, not a copy.
+    """
+    return self._focal_length_mm[:self._size]
+
+  def calculate_gsd(self, altitude_m, dtype=np.float64, out=None):
+    """
+    Calculates the GSD of every camera in the catalog.
+
+    Args:
+      altitude_m (array_like): One or more flight altitudes in meters.
+      dtype (numpy dtype): np.float64 or np.float32.
+      out (Optional[numpy.ndarray]): Buffer to write the result into.
+
+    Returns:
+      numpy.ndarray: GSDs in centimeters with shape altitude_m.shape + (len(catalog),).
+    """
+    return GSDCalculator.calculate_gsd_batch(altitude_m, self.sensor_width_px, self.pixel_size_um,
+                                             self.focal_length_mm, dtype=dtype, out=out)
+
+  def calculate_altitude(self, gsd_cm, dtype=np.float64, out=None):
+    """
+    Calculates the flight altitude every camera in the catalog needs for a GSD.
+
+    Args:
+      gsd_cm (array_like): One or more GSDs in centimeters.
+      dtype (numpy dtype): np.float64 or np.float32.
+      out (Optional[numpy.ndarray]): Buffer to write the result into.
+
+    Returns:
+      numpy.ndarray: Altitudes in meters with shape gsd_cm.shape + (len(catalog),).
+    """
+    return GSDCalculator.calculate_altitude_batch(gsd_cm, self.sensor_width_px, self.pixel_size_um,
+                                                  self.focal_length_mm, dtype=dtype, out=out)
+
+  def to_dict(self):
+    """
+    Returns:
+      dict: Camera name -> parameters, in the layout Camera_Database stores.
+    """
+    columns = zip(self._names, self.sensor_width_px.tolist(), self.sensor_height_px.tolist(),
+                  self.pixel_size_um.tolist(), self.focal_length_mm.tolist())
+    return {name: {'sensor_width_px': width, 'sensor_height_px': height, 'pixel_size_um': pixel_size,
+                   'focal_length_mm': focal_length}
+            for name, width, height, pixel_size, focal_length in columns}
@@ -0,0 +1,310 @@
+# GSD-Calculator for UAV Flights - bulk camera import
+#
+# Imports a vendor spec sheet of cameras from CSV, JSON or JSON Lines in one go instead of one
+# add_cam prompt at a time. All rows are validated together with the bounds add_cam enforces,
+# duplicate names are resolved with a conflict policy, the pixel size is read from either
+# 'pixel_size_um' or the 'pixel_size_nm' key the shipped camera_database.json uses (the value
+# is in micrometers either way) and stored as 'pixel_size_um', and the accepted cameras are
+# committed with a single Camera_Database.add_cameras call: one file write, or one SQLite
+# transaction.
+
+import argparse
+import contextlib
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+
+from batch_mode import parse_floats
+from main import Camera_Database
+
+# Field -> (min, max, integer), the bounds add_cam passes to validate_input
+FIELD_BOUNDS = {'sensor_width_px': (1, 100000, True), 'sensor_height_px': (1, 100000, True),
+                'pixel_size_um': (1, 100000, False), 'focal_length_mm': (1, 1500, False)}
+FIELDS = tuple(FIELD_BOUNDS)
+FORMATS = ('csv', 'json', 'jsonl')
+# error: abort the import on any duplicate name; skip: keep existing cameras and the first row
+# of each name; overwrite: the last row of each name wins, replacing existing cameras
+CONFLICT_POLICIES = ('error', 'skip', 'overwrite')
+REJECT_FIELDS = ['line', 'camera_name', 'reason']
+
+
+def _pixel_size(parameters):
+  """
+  Returns the raw pixel size of a row, preferring 'pixel_size_um' over 'pixel_size_nm'.
+  """
+  value = parameters.get('pixel_size_um')
+  if value is None or value == '':
+    value = parameters.get('pixel_size_nm', '')
+  return value
+
+
+def _object_row(line, camera_name, parameters):
+  """
+  Converts one camera object to a raw row.
+  """
+  if not isinstance(parameters, dict):
+    return line, str(camera_name), '', '', '', '', "expected a JSON object"
+  return (line, camera_name, parameters.get('sensor_width_px', ''), parameters.get('sensor_height_px', ''),
+          _pixel_size(parameters), parameters.get('focal_length_mm', ''), None)
+
+
+def read_csv_cameras(stream):
+  """
+  Reads cameras from a CSV stream with a header line.
+
+  The header must contain camera_name (or name), sensor_width_px, sensor_height_px,
+  pixel_size_um and/or pixel_size_nm, and focal_length_mm.
+
+  Args:
+    stream (file): A text stream positioned at the header line.
+
+  Yields:
+    tuple: (line, camera_name, sensor_width_px, sensor_height_px, pixel_size_um,
+    focal_length_mm, error) with the raw field values.
+
+  Raises:
+    ValueError: If the header is missing a required column.
+  """
+  reader = csv.reader(stream)
+  header = next(reader, None)
+  if header is None:
+    return
+  header = [field.strip() for field in header]
+  if 'camera_name' not in header and 'name' in header:
+    header[header.index('name')] = 'camera_name'
+  required = ['camera_name', 'sensor_width_px', 'sensor_height_px', 'focal_length_mm']
+  missing = [field for field in required if field not in header]
+  if 'pixel_size_um' not in header and 'pixel_size_nm' not in header:
+    missing.append('pixel_size_um')
+  if missing:
+    raise ValueError(f"CSV header is missing {', '.join(missing)}.")
+  for line, row in enumerate(reader, start=2):
+    if not row:
+      continue
+    if len(row) != len(header):
+      yield line, ','.join(row), '', '', '', '', f"expected {len(header)} fields, got {len(row)}"
+      continue
+    yield _object_row(line, row[header.index('camera_name')], dict(zip(header, row)))
+
+
+def read_json_cameras(stream):
+  """
+  Reads cameras from a JSON document: either the Camera_Database layout (camera name ->
+  parameters) or a list of objects with a 'camera_name' (or 'name') key.
+
+  Args:
+    stream (file): A text stream with one JSON document.
+
+  Returns:
+    list: Rows as yielded by read_csv_cameras; the line is the position in the document.
+
+  Raises:
+    ValueError: If the document is not valid JSON or neither an object nor a list.
+  """
+  document = json.load(stream)
+  if isinstance(document, dict):
+    return [_object_row(i, name, parameters) for i, (name, parameters) in enumerate(document.items(), start=1)]
+  if isinstance(document, list):
+    return [_object_row(i, item.get('camera_name', item.get('name', '')) if isinstance(item, dict) else '', item)
+            for i, item in enumerate(document, start=1)]
+  raise ValueError("Expected a JSON object of cameras or a list of camera objects.")
+
+
+def read_jsonl_cameras(stream):
+  """
+  Reads cameras from a JSON Lines stream, one object with a 'camera_name' key per line.
+
+  Yields:
+    tuple: Rows as yielded by read_csv_cameras.
+  """
+  for line, text in enumerate(stream, start=1):
+    if not text.strip():
+      continue
+    try:
+      item = json.loads(text)
+    except ValueError as e:
+      yield line, text.strip(), '', '', '', '', f"invalid JSON: {e}"
+      continue
+    yield _object_row(line, item.get('camera_name', item.get('name', '')) if isinstance(item, dict) else '', item)
+
+
+def validate_cameras(rows):
+  """
+  Validates all rows at once against the add_cam bounds.
+
+  Args:
+    rows (list): Rows as yielded by read_csv_cameras.
+
+  Returns:
+    tuple: (valid, columns, reasons) where valid is a boolean array, columns maps
+    'line', 'camera_name' and every field in FIELDS to an array, and reasons holds the
+    rejection reason of each invalid row.
+  """
+  lines, names, *raw_fields, errors = zip(*rows) if rows else ((),) * 7
+  columns = {'line': np.array(lines, dtype=np.int64),
+             'camera_name': np.array([str(name).strip() for name in names], dtype=object)}
+  reason = np.array(errors, dtype=object)
+  # Check the fields last to first, so each row reports its first problem
+  for field, raw in reversed(list(zip(FIELDS, raw_fields))):
+    minimum, maximum, integer = FIELD_BOUNDS[field]
+    values = parse_floats(raw)
+    bad = ~((values >= minimum) & (values <= maximum))  # Also catches NaN
+    if integer:
+      bad |= values != np.floor(values)
+    reason[bad & (reason == None)] = (  # noqa: E711 - elementwise comparison
+      f"{field} must be {'an integer' if integer else 'a number'} between {minimum} and {maximum}")
+    columns[field] = np.where(bad, 0, values).astype(np.int64) if integer else values
+  reason[(columns['camera_name'] == '') & (reason == None)] = "missing camera_name"  # noqa: E711
+  return reason == None, columns, reason  # noqa: E711
+
+
+def _first_rows(names, last=False):
+  """
+  Returns a boolean array marking the first (or last) row of every name.
+  """
+  keep = np.zeros(len(names), dtype=bool)
+  if last:
+    _, rows = np.unique(names[::-1], return_index=True)
+    keep[len(names) - 1 - rows] = True
+  else:
+    _, rows = np.unique(names, return_index=True)
+    keep[rows] = True
+  return keep
+
+
+def import_cameras(camera_database, rows, on_conflict='error', dry_run=False):
+  """
+  Validates, deduplicates and imports cameras with a single storage write.
+
+  Args:
+    camera_database (Camera_Database): The database to import into.
+    rows (Iterable): Rows as yielded by read_csv_cameras/read_json_cameras.
+    on_conflict (str): What to do with names that repeat in the rows or are already in the
+      database, one of CONFLICT_POLICIES.
+    dry_run (bool): Validate and report without writing anything.
+
+  Returns:
+    tuple: (stats, rejects) where stats counts rows, imported, overwritten and rejected
+    cameras, and rejects is a list of (line, camera_name, reason).
+
+  Raises:
+    ValueError: If on_conflict is unknown, or it is 'error' and a name is duplicated.
+  """
+  if on_conflict not in CONFLICT_POLICIES:
+    raise ValueError(f"on_conflict must be one of {CONFLICT_POLICIES}.")
+  rows = list(rows)
+  valid, columns, reason = validate_cameras(rows)
+  names = columns['camera_name'].astype(str)
+
+  # Duplicates among the valid rows, then names the database already has
+  keep = valid.copy()
+  valid_rows = np.flatnonzero(valid)
+  first = np.zeros(len(rows), dtype=bool)
+  first[valid_rows] = _first_rows(names[valid_rows], last=on_conflict == 'overwrite')
+  duplicate = valid & ~first
+  existing = np.array([name in camera_database.camera_database for name in names.tolist()], dtype=bool) & first
+  if on_conflict == 'error' and (duplicate.any() or existing.any()):
+    conflicts = sorted(set(names[duplicate | existing].tolist()))
+    raise ValueError(f"{len(conflicts)} camera names are repeated or already in the database "
+                     f"(e.g. {', '.join(conflicts[:5])}); choose another conflict policy.")
+  if on_conflict == 'skip':
+    reason[existing] = "already in the database"
+    keep &= ~existing
+  reason[duplicate] = "later row with the same name" if on_conflict == 'skip' else "replaced by a later row"
+  keep &= first
+
+  kept = np.flatnonzero(keep)
+  cameras = {name: {'sensor_width_px': width, 'sensor_height_px': height, 'pixel_size_um': pixel_size,
+                    'focal_length_mm': focal_length}
+             for name, width, height, pixel_size, focal_length in zip(
+               names[kept].tolist(), *(columns[field][kept].tolist() for field in FIELDS))}
+  imported = list(cameras)
+  if not dry_run and cameras:
+    # 'skip' is rechecked under the writer lock, against cameras other processes just added
+    imported = camera_database.add_cameras(cameras, overwrite=on_conflict != 'skip')
+    for name in set(cameras).difference(imported):
+      row = kept[names[kept] == name][0]
+      reason[row] = "already in the database"
+  rejects = [(rows[i][0], rows[i][1], reason[i]) for i in np.flatnonzero(reason != None).tolist()]  # noqa: E711
+  stats = {'rows': len(rows), 'imported': len(imported), 'overwritten': int((existing & keep).sum()),
+           'rejected': len(rejects)}
+  return stats, rejects
+
+
+def _detect_format(path, requested):
+  """
+  Picks the file format from an explicit choice or the file extension.
+  """
+  if requested is not None:
+    return requested
+  extension = path.rsplit('.', 1)[-1].lower()
+  if extension in ('jsonl', 'ndjson'):
+    return 'jsonl'
+  return 'json' if extension == 'json' else 'csv'
+
+
+def import_file(camera_database, path, file_format=None, on_conflict='error', rejects_path=None, dry_run=False):
+  """
+  Imports cameras from a file, see import_cameras.
+
+  Args:
+    camera_database (Camera_Database): The database to import into.
+    path (str): The CSV, JSON or JSON Lines file, or - for stdin.
+    file_format (Optional[str]): One of FORMATS; by default taken from the extension, CSV for stdin.
+    on_conflict (str): One of CONFLICT_POLICIES.
+    rejects_path (Optional[str]): CSV file to write the rejected rows to.
+    dry_run (bool): Validate and report without writing anything.
+
+  Returns:
+    dict: The import_cameras stats.
+  """
+  file_format = _detect_format('' if path == '-' else path, file_format)
+  readers = {'csv': read_csv_cameras, 'json': read_json_cameras, 'jsonl': read_jsonl_cameras}
+  with contextlib.ExitStack() as stack:
+    source = sys.stdin if path == '-' else stack.enter_context(open(path, newline=''))
+    stats, rejects = import_cameras(camera_database, readers[file_format](source), on_conflict, dry_run)
+  if rejects_path is not None:
+    with open(rejects_path, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow(REJECT_FIELDS)
+      writer.writerows(rejects)
+  return stats
+
+
+def main(argv=None, prog=None):
+  """
+  Command line entry point for the bulk camera import, also run by `main.py import`.
+
+  Args:
+    argv (Optional[list]): The command line arguments; sys.argv[1:] by default.
+    prog (Optional[str]): The program name shown in usage messages.
+
+  Returns:
+    int: The exit status.
+  """
+  parser = argparse.ArgumentParser(prog=prog, description="Import cameras from a CSV, JSON or JSON Lines file.")
+  parser.add_argument('input', help="Camera file, or - for stdin")
+  parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension, csv for stdin")
+  parser.add_argument('--on-conflict', choices=CONFLICT_POLICIES, default='error',
+                      help="Repeated or existing names: abort (default), keep the existing/first, or overwrite")
+  parser.add_argument('-r', '--rejects', help="CSV file for rejected rows")
+  parser.add_argument('--dry-run', action='store_true', help="Validate only, do not write the database")
+  args = parser.parse_args(argv)
+
+  start = time.perf_counter()
+  try:
+    stats = import_file(Camera_Database.from_environment(), args.input, args.format, args.on_conflict,
+                        args.rejects, args.dry_run)
+  except (OSError, ValueError) as e:
+    print(f"Error: {e}", file=sys.stderr)
+    return 1
+  print(f"{'Checked' if args.dry_run else 'Imported'} {stats['imported']} of {stats['rows']} cameras "
+        f"({stats['overwritten']} overwritten, {stats['rejected']} rejected) in {time.perf_counter() - start:.2f}s")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
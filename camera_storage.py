@@ -0,0 +1,333 @@
+# GSD-Calculator for UAV Flights - camera database storage backends
+#
+# Camera_Database keeps the catalog in memory and hands persistence to one of these backends.
+# Both write atomically: JSONCameraStorage replaces the file in one rename, SQLiteCameraStorage
+# commits each insert or bulk import as a single transaction.
+#
+# Each backend also reports a cheap change token (version) so a long-running Camera_Database
+# can tell whether another process changed the catalog, and an advisory file lock (lock) so
+# processes writing the same catalog take turns.
+
+import contextlib
+import json
+import os
+import sqlite3
+import tempfile
+
+try:
+  import fcntl
+except ImportError:  # Not available on Windows; writers are then not coordinated across processes
+  fcntl = None
+
+CAMERA_FIELDS = ('sensor_width_px', 'sensor_height_px', 'pixel_size_um', 'focal_length_mm')
+
+# Errors a backend can raise while loading a catalog another process is changing
+STORAGE_ERRORS = (OSError, ValueError, sqlite3.Error)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+  """
+  Holds an exclusive advisory lock on a lock file for the duration of the block.
+
+  Args:
+    path (str): The lock file, created if it does not exist.
+  """
+  if fcntl is None:
+    yield
+    return
+  with open(path, 'a') as f:
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _file_mode(path):
+  """
+  Returns the permission bits of an existing file, or those a new file gets under the umask.
+  """
+  try:
+    return os.stat(path).st_mode & 0o7777
+  except FileNotFoundError:
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class JSONCameraStorage:
+  """
+  Stores the camera database as a single JSON object of camera name -> parameters.
+  """
+
+  def __init__(self, path):
+    """
+    Args:
+      path (str): The path of the JSON file.
+    """
+    self.path = path
+
+  def version(self):
+    """
+    Returns a token that changes whenever the file is rewritten. save replaces the file, so
+    the inode changes even if the size and modification time happen to stay the same.
+
+    Returns:
+      tuple or None: (inode, mtime in ns, size), or None if the file does not exist.
+    """
+    try:
+      stat = os.stat(self.path)
+    except FileNotFoundError:
+      return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+  def lock(self):
+    """
+    Returns:
+      context manager: An exclusive lock on <path>.lock for writers.
+    """
+    return file_lock(self.path + '.lock')
+
+  def get(self, camera_name):
+    """
+    Looks up one camera. The JSON format has no index, so the whole file is read.
+
+    Args:
+      camera_name (str): The name of the camera.
+
+    Returns:
+      dict or None: The parameters of the camera, or None if it is not stored.
+    """
+    return (self.load() or {}).get(camera_name)
+
+  def names(self):
+    """
+    Returns:
+      list: The names of all stored cameras, in insertion order.
+    """
+    return list(self.load() or {})
+
+  def load(self):
+    """
+    Loads all cameras.
+
+    Returns:
+      dict or None: Camera name -> parameters, or None if the file does not exist yet.
+    """
+    if not os.path.exists(self.path):
+      return None
+    with open(self.path, 'r') as f:
+      return json.load(f)
+
+  def save(self, cameras):
+    """
+    Writes all cameras atomically: a crash mid-write leaves the previous file intact.
+
+    Args:
+      cameras (dict): Camera name -> parameters.
+    """
+    directory = os.path.dirname(os.path.abspath(self.path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.camera_database.', suffix='.tmp', dir=directory)
+    try:
+      # mkstemp creates the file owner-only; keep the mode of the file it replaces. By path:
+      # os.fchmod is not available on Windows
+      os.chmod(tmp_path, _file_mode(self.path))
+      with os.fdopen(fd, 'w') as f:
+        json.dump(cameras, f)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(tmp_path, self.path)
+    except BaseException:
+      os.unlink(tmp_path)
+      raise
+
+  def put(self, camera_name, camera_parameters, cameras):
+    """
+    Stores one camera. The JSON format has no partial update, so the whole catalog is written.
+
+    Args:
+      camera_name (str): The name of the camera.
+      camera_parameters (dict): The parameters of the camera.
+      cameras (dict): The full catalog, already containing the new camera.
+    """
+    self.save(cameras)
+
+  def put_many(self, new_cameras, cameras):
+    """
+    Stores several cameras with a single write of the whole catalog.
+
+    Args:
+      new_cameras (dict): Camera name -> parameters of the cameras being added.
+      cameras (dict): The full catalog, already containing the new cameras.
+    """
+    self.save(cameras)
+
+
+class SQLiteCameraStorage:
+  """
+  Stores the camera database in an SQLite file with an indexed camera name column.
+  """
+
+  def __init__(self, path, migrate_from=None):
+    """
+    Opens (and creates if needed) the SQLite database.
+
+    Args:
+      path (str): The path of the SQLite file.
+      migrate_from (Optional[str]): A camera_database.json to import the first time the
+        database is created. Later opens skip the migration.
+    """
+    self.path = path
+    self.created = not os.path.exists(path)
+    # Camera_Database serializes access, and a watcher thread may check for changes
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    with self.connection:
+      self.connection.execute('PRAGMA journal_mode=WAL')
+      self.connection.execute("""CREATE TABLE IF NOT EXISTS cameras (
+                                   name TEXT PRIMARY KEY,
+                                   sensor_width_px INTEGER NOT NULL,
+                                   sensor_height_px INTEGER NOT NULL,
+                                   pixel_size_um REAL NOT NULL,
+                                   focal_length_mm REAL NOT NULL)""")
+      self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+    if migrate_from is not None:
+      self.migrate_from_json(migrate_from)
+
+  def close(self):
+    """
+    Closes the database connection.
+    """
+    self.connection.close()
+
+  def version(self):
+    """
+    Returns a token that changes whenever another connection commits. Commits made through
+    this connection do not change it, as the in-memory catalog already has them.
+
+    Returns:
+      int: SQLite's data_version.
+    """
+    return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+  def lock(self):
+    """
+    Returns:
+      context manager: An exclusive lock on <path>.lock for writers.
+    """
+    return file_lock(self.path + '.lock')
+
+  def load(self):
+    """
+    Loads all cameras.
+
+    Returns:
+      dict or None: Camera name -> parameters, or None if the database was just created empty.
+    """
+    rows = self.connection.execute(f"SELECT name, {', '.join(CAMERA_FIELDS)} FROM cameras ORDER BY rowid").fetchall()
+    if not rows and self.created:
+      return None
+    return {row[0]: dict(zip(CAMERA_FIELDS, row[1:])) for row in rows}
+
+  def get(self, camera_name):
+    """
+    Looks up one camera by name using the primary key index.
+
+    Args:
+      camera_name (str): The name of the camera.
+
+    Returns:
+      dict or None: The parameters of the camera, or None if it is not stored.
+    """
+    row = self.connection.execute(f"SELECT {', '.join(CAMERA_FIELDS)} FROM cameras WHERE name = ?",
+                                  (camera_name,)).fetchone()
+    return None if row is None else dict(zip(CAMERA_FIELDS, row))
+
+  def names(self):
+    """
+    Returns:
+      list: The names of all stored cameras, in insertion order.
+    """
+    return [row[0] for row in self.connection.execute('SELECT name FROM cameras ORDER BY rowid')]
+
+  def save(self, cameras):
+    """
+    Replaces all stored cameras in one transaction.
+
+    Args:
+      cameras (dict): Camera name -> parameters.
+    """
+    with self.connection:
+      self.connection.execute('DELETE FROM cameras')
+      self._insert(cameras)
+
+  def put(self, camera_name, camera_parameters, cameras=None):
+    """
+    Inserts or updates one camera.
+
+    Args:
+      camera_name (str): The name of the camera.
+      camera_parameters (dict): The parameters of the camera.
+      cameras (Optional[dict]): Unused, accepted for interface compatibility with JSONCameraStorage.
+    """
+    self.put_many({camera_name: camera_parameters})
+
+  def put_many(self, new_cameras, cameras=None):
+    """
+    Inserts or updates several cameras in a single transaction.
+
+    Args:
+      new_cameras (dict): Camera name -> parameters of the cameras being added.
+      cameras (Optional[dict]): Unused, accepted for interface compatibility with JSONCameraStorage.
+    """
+    with self.connection:
+      self._insert(new_cameras)
+
+  def _insert(self, cameras):
+    """
+    Upserts cameras inside the caller's transaction.
+    """
+    self.connection.executemany(
+      f"INSERT INTO cameras (name, {', '.join(CAMERA_FIELDS)}) VALUES (?, ?, ?, ?, ?) "
+      f"ON CONFLICT(name) DO UPDATE SET {', '.join(f'{field} = excluded.{field}' for field in CAMERA_FIELDS)}",
+      ((name, parameters['sensor_width_px'], parameters['sensor_height_px'],
+        # The shipped JSON stores the pixel size under 'pixel_size_nm'
+        parameters.get('pixel_size_um', parameters.get('pixel_size_nm')), parameters['focal_length_mm'])
+       for name, parameters in cameras.items()))
+
+  def migrate_from_json(self, json_path):
+    """
+    Imports a camera_database.json once. The migration is recorded in the meta table, so
+    calling this again (e.g. on every start-up) does nothing.
+
+    Args:
+      json_path (str): The path of the JSON camera database.
+
+    Returns:
+      int: The number of cameras imported.
+    """
+    if self.connection.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+      return 0
+    cameras = JSONCameraStorage(json_path).load() or {}
+    with self.connection:
+      self._insert(cameras)
+      self.connection.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                              (os.path.abspath(json_path),))
+    return len(cameras)
+
+
+def open_storage(path, migrate_from=None):
+  """
+  Opens a storage backend based on the file extension: .db/.sqlite/.sqlite3 use SQLite,
+  anything else is treated as JSON.
+
+  Args:
+    path (str): The path of the camera database.
+    migrate_from (Optional[str]): For SQLite, a JSON database to import on first use.
+
+  Returns:
+    JSONCameraStorage or SQLiteCameraStorage: The storage backend.
+  """
+  if path.lower().endswith(('.db', '.sqlite', '.sqlite3')):
+    return SQLiteCameraStorage(path, migrate_from=migrate_from)
+  return JSONCameraStorage(path)
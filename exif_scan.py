@@ -0,0 +1,346 @@
+# GSD-Calculator for UAV Flights - achieved GSD from flight images
+#
+# Scans a folder of JPEGs from a mission, reads only the header segments of each file (EXIF
+# and XMP, never the image data), and computes the GSD each photo actually achieved from its
+# relative altitude, focal length and image width. Files are read on a thread pool and the
+# results are streamed to CSV in batches. Standard library and NumPy only, works offline.
+
+import argparse
+import contextlib
+import csv
+import os
+import re
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from main import Camera_Database, GSDCalculator, get_pixel_size_um
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_THREADS = 16
+FOCAL_LENGTH_TOLERANCE_MM = 0.5  # When matching photos to cameras by focal length and aspect ratio
+ASPECT_RATIO_TOLERANCE = 0.01  # Relative; resizing rounds the image dimensions
+
+OUTPUT_FIELDS = ['path', 'camera', 'make', 'model', 'relative_altitude_m', 'focal_length_mm',
+                 'image_width_px', 'image_height_px', 'gsd_cm', 'error']
+
+# TIFF tags
+_TAG_MAKE = 0x010F
+_TAG_MODEL = 0x0110
+_TAG_EXIF_IFD = 0x8769
+_TAG_FOCAL_LENGTH = 0x920A
+_TAG_PIXEL_X = 0xA002
+_TAG_PIXEL_Y = 0xA003
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+_XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+# DJI (drone-dji:RelativeAltitude) and similar vendor tags, as attribute or element
+_XMP_RELATIVE_ALTITUDE = re.compile(rb'RelativeAltitude(?:="|>)\s*([+-]?[0-9.]+)')
+
+
+def read_jpeg_headers(path):
+  """
+  Reads the EXIF and XMP segments of a JPEG, stopping at the start of the image data.
+
+  Args:
+    path (str): The JPEG file.
+
+  Returns:
+    tuple: (exif, xmp) payloads as bytes, either of which may be None.
+
+  Raises:
+    ValueError: If the file is not a JPEG or a segment length is corrupt.
+  """
+  exif = xmp = None
+  with open(path, 'rb') as f:
+    if f.read(2) != b'\xff\xd8':
+      raise ValueError("not a JPEG file")
+    while exif is None or xmp is None:
+      header = f.read(4)
+      if len(header) < 4 or header[0] != 0xFF:
+        break
+      marker, length = header[1], struct.unpack('>H', header[2:])[0]
+      if marker == 0xDA:  # Start of scan: the image data follows
+        break
+      if length < 2:  # The length counts its own two bytes
+        raise ValueError("corrupt JPEG segment")
+      if marker == 0xE1:
+        payload = f.read(length - 2)
+        if payload.startswith(b'Exif\x00\x00'):
+          exif = payload[6:]
+        elif payload.startswith(_XMP_HEADER):
+          xmp = payload[len(_XMP_HEADER):]
+      else:
+        f.seek(length - 2, os.SEEK_CUR)
+  return exif, xmp
+
+
+def parse_exif(tiff):
+  """
+  Extracts make, model, focal length and image dimensions from an EXIF TIFF block.
+
+  Args:
+    tiff (bytes): The EXIF payload after the 'Exif\\0\\0' header.
+
+  Returns:
+    dict: Any of 'make', 'model', 'focal_length_mm', 'image_width_px', 'image_height_px'.
+  """
+  endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+  if endian is None:
+    return {}
+
+  def read_ifd(offset):
+    entries = {}
+    if offset + 2 > len(tiff):
+      return entries
+    count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for i in range(count):
+      entry = offset + 2 + 12 * i
+      if entry + 12 > len(tiff):
+        break
+      tag, kind, n = struct.unpack(endian + 'HHI', tiff[entry:entry + 8])
+      size = _TYPE_SIZES.get(kind, 1) * n
+      if size <= 4:
+        data = tiff[entry + 8:entry + 8 + size]
+      else:
+        value_offset = struct.unpack(endian + 'I', tiff[entry + 8:entry + 12])[0]
+        data = tiff[value_offset:value_offset + size]
+      if len(data) < size:
+        continue
+      if kind == 2:
+        entries[tag] = data.rstrip(b'\x00').decode('ascii', 'replace').strip()
+      elif kind == 3:
+        entries[tag] = struct.unpack(endian + 'H', data[:2])[0]
+      elif kind == 4:
+        entries[tag] = struct.unpack(endian + 'I', data[:4])[0]
+      elif kind in (5, 10):
+        numerator, denominator = struct.unpack(endian + ('II' if kind == 5 else 'ii'), data[:8])
+        entries[tag] = numerator / denominator if denominator else None
+    return entries
+
+  ifd0 = read_ifd(struct.unpack(endian + 'I', tiff[4:8])[0])
+  exif_ifd = read_ifd(ifd0[_TAG_EXIF_IFD]) if _TAG_EXIF_IFD in ifd0 else {}
+  fields = {'make': ifd0.get(_TAG_MAKE), 'model': ifd0.get(_TAG_MODEL),
+            'focal_length_mm': exif_ifd.get(_TAG_FOCAL_LENGTH),
+            'image_width_px': exif_ifd.get(_TAG_PIXEL_X), 'image_height_px': exif_ifd.get(_TAG_PIXEL_Y)}
+  return {key: value for key, value in fields.items() if value is not None}
+
+
+def read_photo(path):
+  """
+  Reads the GSD-relevant metadata of one photo.
+
+  Args:
+    path (str): The JPEG file.
+
+  Returns:
+    dict: 'path' plus whatever metadata was found, and 'error' if the file could not be read.
+  """
+  photo = {'path': path}
+  try:
+    exif, xmp = read_jpeg_headers(path)
+  except (OSError, ValueError, struct.error) as e:
+    photo['error'] = str(e)
+    return photo
+  if exif is not None:
+    try:
+      photo.update(parse_exif(exif))
+    except (struct.error, ZeroDivisionError, IndexError) as e:
+      photo['error'] = f"invalid EXIF: {e}"
+  if xmp is not None:
+    match = _XMP_RELATIVE_ALTITUDE.search(xmp)
+    if match:
+      try:
+        photo['relative_altitude_m'] = float(match.group(1))
+      except ValueError:  # e.g. a lone '.'
+        photo['error'] = "invalid relative altitude in XMP"
+  return photo
+
+
+class CameraMatcher:
+  """
+  Matches photos to cameras in the camera database: by an explicit camera name, by a camera
+  named like the EXIF model, or by focal length and image aspect ratio, so resized photos
+  still match their camera.
+  """
+
+  def __init__(self, camera_database, camera_name=None):
+    """
+    Args:
+      camera_database (Camera_Database): The cameras to match against.
+      camera_name (Optional[str]): Use this camera for every photo.
+    """
+    self.camera_database = camera_database
+    self.camera_name = camera_name
+    self._matches = {}
+    self._parameters = {}
+
+  def match(self, photo):
+    """
+    Returns:
+      str or None: The name of the matching camera.
+    """
+    if self.camera_name is not None:
+      return self.camera_name
+    key = (photo.get('model'), photo.get('image_width_px'), photo.get('image_height_px'),
+           photo.get('focal_length_mm'))
+    if key not in self._matches:
+      self._matches[key] = self._find(*key)
+    return self._matches[key]
+
+  def parameters(self, camera_name):
+    """
+    Gets a camera's parameters through Camera_Database.get_camera_data, once per camera.
+
+    Returns:
+      dict or None: The camera parameters, or None if the camera is not in the database.
+    """
+    if camera_name not in self._parameters:
+      # get_camera_data reports unknown cameras on stdout, which may be our output stream
+      with contextlib.redirect_stdout(sys.stderr):
+        self._parameters[camera_name] = self.camera_database.get_camera_data(camera_name)
+    return self._parameters[camera_name]
+
+  def _find(self, model, width_px, height_px, focal_length_mm):
+    cameras = self.camera_database.camera_database
+    if model in cameras:
+      return model
+    if not width_px or focal_length_mm is None:
+      return None
+
+    def same_frame(camera):
+      if not height_px:
+        return camera['sensor_width_px'] == width_px
+      aspect_ratio = camera['sensor_width_px'] / camera['sensor_height_px']
+      return abs(width_px / height_px - aspect_ratio) <= ASPECT_RATIO_TOLERANCE * aspect_ratio
+
+    candidates = [name for name, camera in cameras.items()
+                  if abs(camera['focal_length_mm'] - focal_length_mm) <= FOCAL_LENGTH_TOLERANCE_MM
+                  and same_frame(camera)]
+    if model:
+      named = [name for name in candidates if model.lower() in name.lower()]
+      candidates = named or candidates
+    # Prefer a camera at the photo's own resolution over one it could be resized from
+    candidates.sort(key=lambda name: cameras[name]['sensor_width_px'] != width_px)
+    return candidates[0] if candidates else None
+
+
+def compute_batch(photos, matcher):
+  """
+  Computes the achieved GSD for a batch of photos in one vectorized call.
+
+  The photo's own width and focal length are used where present. The pixel size is scaled
+  from the matched camera, so resized images keep the sensor's physical width. Photos with a
+  relative altitude at or below the takeoff point, or a zero width or focal length, are marked
+  with an 'error' instead.
+
+  Args:
+    photos (list): Dicts from read_photo; 'camera' and 'gsd_cm' are filled in place.
+    matcher (CameraMatcher): Resolves the camera of each photo.
+  """
+  rows, altitude_m, width_px, pixel_size_um, focal_length_mm = [], [], [], [], []
+  for i, photo in enumerate(photos):
+    if 'error' in photo:
+      continue
+    camera_name = matcher.match(photo)
+    if camera_name is None:
+      photo['error'] = "no matching camera in the database"
+      continue
+    camera = matcher.parameters(camera_name)
+    if camera is None:
+      photo['error'] = "no matching camera in the database"
+      continue
+    photo['camera'] = camera_name
+    if 'relative_altitude_m' not in photo:
+      photo['error'] = "no relative altitude in XMP"
+      continue
+    if photo['relative_altitude_m'] <= 0:
+      photo['error'] = "relative altitude at or below the takeoff point"
+      continue
+    image_width_px = photo.get('image_width_px', camera['sensor_width_px'])
+    if image_width_px <= 0 or photo.get('focal_length_mm', 1) <= 0:
+      photo['error'] = "invalid image width or focal length in EXIF"
+      continue
+    rows.append(i)
+    altitude_m.append(photo['relative_altitude_m'])
+    width_px.append(image_width_px)
+    pixel_size_um.append(get_pixel_size_um(camera) * camera['sensor_width_px'] / image_width_px)
+    focal_length_mm.append(photo.get('focal_length_mm', camera['focal_length_mm']))
+  if rows:
+    gsd_cm = GSDCalculator.calculate_gsd_batch(altitude_m, width_px, pixel_size_um, focal_length_mm, outer=False)
+    for i, gsd in zip(rows, gsd_cm.tolist()):
+      photos[i]['gsd_cm'] = gsd
+
+
+def iter_images(folder):
+  """
+  Yields the JPEG files below a folder, in sorted order.
+  """
+  for root, dirs, files in os.walk(folder):
+    dirs.sort()
+    for name in sorted(files):
+      if name.lower().endswith(IMAGE_EXTENSIONS):
+        yield os.path.join(root, name)
+
+
+def scan_folder(folder, output, camera_database, camera_name=None, threads=DEFAULT_THREADS,
+                batch_size=DEFAULT_BATCH_SIZE):
+  """
+  Scans a folder and streams one CSV row per photo to output.
+
+  Args:
+    folder (str): The folder to scan recursively.
+    output (file): Text stream for the CSV.
+    camera_database (Camera_Database): The cameras to match photos against.
+    camera_name (Optional[str]): Use this camera for every photo instead of matching.
+    threads (int): Threads reading file headers.
+    batch_size (int): Photos read and computed per batch.
+
+  Returns:
+    dict: Photo, computed and failed counts.
+  """
+  writer = csv.DictWriter(output, OUTPUT_FIELDS, extrasaction='ignore')
+  writer.writeheader()
+  matcher = CameraMatcher(camera_database, camera_name)
+  stats = {'photos': 0, 'computed': 0, 'failed': 0}
+  paths = iter_images(folder)
+  with ThreadPoolExecutor(max_workers=threads) as executor:
+    while True:
+      batch = [path for _, path in zip(range(batch_size), paths)]
+      if not batch:
+        break
+      photos = list(executor.map(read_photo, batch))
+      compute_batch(photos, matcher)
+      writer.writerows(photos)
+      stats['photos'] += len(photos)
+      stats['computed'] += sum('gsd_cm' in photo for photo in photos)
+  stats['failed'] = stats['photos'] - stats['computed']
+  return stats
+
+
+def main(argv=None):
+  """
+  Command line entry point for the EXIF scan.
+  """
+  parser = argparse.ArgumentParser(description="Compute the achieved GSD of every photo in a folder.")
+  parser.add_argument('folder', help="Folder with the mission's JPEGs (scanned recursively)")
+  parser.add_argument('-o', '--output', default='-', help="CSV file, or - for stdout (default)")
+  parser.add_argument('--camera', help="Camera name to use for every photo instead of matching")
+  parser.add_argument('--threads', type=int, default=DEFAULT_THREADS)
+  parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+  args = parser.parse_args(argv)
+
+  start = time.perf_counter()
+  with contextlib.ExitStack() as stack:
+    output = sys.stdout if args.output == '-' else stack.enter_context(open(args.output, 'w', newline=''))
+    stats = scan_folder(args.folder, output, Camera_Database.from_environment(), args.camera,
+                        args.threads, args.batch_size)
+  print(f"Scanned {stats['photos']} photos ({stats['computed']} with GSD, {stats['failed']} failed) "
+        f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
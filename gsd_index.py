@@ -0,0 +1,141 @@
+# GSD-Calculator for UAV Flights - GSD envelope index
+#
+# Answers "which cameras can achieve a GSD between g_min and g_max while flying between
+# a_min and a_max?" without calling GSDCalculator.calculate_altitude for every camera.
+#
+# For a camera, GSD = k * altitude with k its GSD-per-meter coefficient. The camera meets the
+# envelope if some altitude in [a_min, a_max] gives a GSD in [g_min, g_max], which is exactly
+# g_min / a_max <= k <= g_max / a_min. Keeping the cameras sorted by k turns the question into
+# a range query: two binary searches plus the k matching cameras.
+
+import argparse
+import bisect
+import math
+import sys
+
+from main import Camera_Database, CompiledCamera
+
+# Relative slack on the k bounds so cameras exactly on the envelope edge are not lost to
+# rounding; every candidate is then checked exactly.
+_K_TOLERANCE = 1e-12
+
+
+class GSDEnvelopeIndex:
+  """
+  Cameras sorted by GSD-per-meter coefficient. The index registers itself with the camera
+  database and updates incrementally when add_camera adds or overwrites a camera.
+  """
+
+  def __init__(self, camera_database):
+    """
+    Args:
+      camera_database (Camera_Database): The database to index.
+    """
+    self.camera_database = camera_database
+    # Sorted (gsd_per_m, camera_name) keys and camera_name -> (key, CompiledCamera, parameters)
+    self._keys = []
+    self._cameras = {}
+    for camera_name, camera_parameters in camera_database.camera_database.items():
+      self._cameras[camera_name] = self._entry(camera_name, camera_parameters)
+    self._keys = sorted(entry[0] for entry in self._cameras.values())
+    camera_database.add_listener(self.update)
+
+  @staticmethod
+  def _entry(camera_name, camera_parameters):
+    compiled_camera = CompiledCamera(camera_name, camera_parameters)
+    return (compiled_camera.gsd_per_m, camera_name), compiled_camera, camera_parameters
+
+  def __len__(self):
+    return len(self._keys)
+
+  def update(self, camera_names):
+    """
+    Re-indexes cameras that were added or changed in the camera database.
+
+    Args:
+      camera_names (Iterable[str]): The names of the changed cameras.
+    """
+    for camera_name in camera_names:
+      old = self._cameras.pop(camera_name, None)
+      if old is not None:
+        del self._keys[bisect.bisect_left(self._keys, old[0])]
+      camera_parameters = self.camera_database.camera_database.get(camera_name)
+      if camera_parameters is not None:
+        entry = self._entry(camera_name, camera_parameters)
+        self._cameras[camera_name] = entry
+        bisect.insort(self._keys, entry[0])
+
+  def query(self, gsd_min_cm, gsd_max_cm, altitude_min_m=0.0, altitude_max_m=math.inf,
+            min_sensor_width_px=None, min_sensor_height_px=None, min_focal_length_mm=None,
+            max_focal_length_mm=None):
+    """
+    Finds the cameras that can meet a GSD envelope within an altitude band.
+
+    Args:
+      gsd_min_cm (float): The finest acceptable GSD in centimeters.
+      gsd_max_cm (float): The coarsest acceptable GSD in centimeters.
+      altitude_min_m (float): The lowest allowed altitude in meters (e.g. obstacle floor).
+      altitude_max_m (float): The highest allowed altitude in meters (e.g. regulatory ceiling).
+      min_sensor_width_px (Optional[int]): Only cameras at least this wide.
+      min_sensor_height_px (Optional[int]): Only cameras at least this tall.
+      min_focal_length_mm (Optional[float]): Only lenses at least this long.
+      max_focal_length_mm (Optional[float]): Only lenses at most this long.
+
+    Returns:
+      list: Dicts with the camera name, gsd_per_m and the altitude band (altitude_min_m,
+      altitude_max_m) over which it meets the envelope, sorted by gsd_per_m.
+
+    Raises:
+      ValueError: If a range is empty or negative.
+    """
+    if not 0 <= gsd_min_cm <= gsd_max_cm or not 0 <= altitude_min_m <= altitude_max_m:
+      raise ValueError("GSD and altitude ranges must be non-negative with min <= max.")
+    k_min = gsd_min_cm / altitude_max_m if altitude_max_m > 0 else math.inf
+    k_max = gsd_max_cm / altitude_min_m if altitude_min_m > 0 else math.inf
+    start = bisect.bisect_left(self._keys, (k_min * (1 - _K_TOLERANCE), ''))
+    stop = bisect.bisect_right(self._keys, (k_max * (1 + _K_TOLERANCE), '\U0010ffff'))
+
+    results = []
+    for gsd_per_m, camera_name in self._keys[start:stop]:
+      _, compiled_camera, camera_parameters = self._cameras[camera_name]
+      if min_sensor_width_px is not None and camera_parameters['sensor_width_px'] < min_sensor_width_px:
+        continue
+      if min_sensor_height_px is not None and camera_parameters['sensor_height_px'] < min_sensor_height_px:
+        continue
+      if min_focal_length_mm is not None and camera_parameters['focal_length_mm'] < min_focal_length_mm:
+        continue
+      if max_focal_length_mm is not None and camera_parameters['focal_length_mm'] > max_focal_length_mm:
+        continue
+      low = max(altitude_min_m, compiled_camera.calculate_altitude(gsd_min_cm))
+      high = min(altitude_max_m, compiled_camera.calculate_altitude(gsd_max_cm))
+      if low <= high:
+        results.append({'camera': camera_name, 'gsd_per_m': gsd_per_m,
+                        'altitude_min_m': low, 'altitude_max_m': high})
+    return results
+
+
+def main(argv=None):
+  """
+  Command line entry point for envelope queries.
+  """
+  parser = argparse.ArgumentParser(description="List the cameras that can meet a GSD envelope.")
+  parser.add_argument('--gsd', type=float, nargs=2, required=True, metavar=('MIN', 'MAX'), help="GSD range in cm")
+  parser.add_argument('--altitude', type=float, nargs=2, default=(0.0, math.inf), metavar=('MIN', 'MAX'),
+                      help="Allowed altitude band in meters")
+  parser.add_argument('--min-width', type=int, help="Minimum sensor width in pixels")
+  parser.add_argument('--min-height', type=int, help="Minimum sensor height in pixels")
+  parser.add_argument('--min-focal-length', type=float, help="Minimum focal length in mm")
+  parser.add_argument('--max-focal-length', type=float, help="Maximum focal length in mm")
+  args = parser.parse_args(argv)
+
+  index = GSDEnvelopeIndex(Camera_Database.from_environment())
+  results = index.query(args.gsd[0], args.gsd[1], args.altitude[0], args.altitude[1], args.min_width,
+                        args.min_height, args.min_focal_length, args.max_focal_length)
+  for result in results:
+    print(f"{result['camera']}: fly between {result['altitude_min_m']:.1f} m and {result['altitude_max_m']:.1f} m")
+  print(f"{len(results)} of {len(index)} cameras meet the envelope.")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
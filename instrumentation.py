@@ -0,0 +1,346 @@
+# GSD-Calculator for UAV Flights - opt-in instrumentation
+#
+# Records call counts and latency histograms for the calculator, camera database, storage and
+# batch hot paths. Nothing is wrapped until enable() is called: enable() replaces the methods
+# listed in TARGETS with timing wrappers and disable() puts the originals back, so there is no
+# overhead at all while instrumentation is off.
+#
+# Switch it on per run with environment variables (see configure_from_environment):
+#   GSD_INSTRUMENT=1            record timings
+#   GSD_STATS_FILE=stats.json   write the timings and memory figures as JSON on exit
+#   GSD_PROFILE=run.prof        run cProfile and write pstats data on exit
+#   GSD_TRACEMALLOC=25          trace allocations (25 frames deep) and dump the top sites on exit
+
+import atexit
+import cProfile
+import functools
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+  import resource
+except ImportError:  # Not available on Windows
+  resource = None
+
+# (module, attribute path, metric name) of every instrumented callable
+TARGETS = (
+  ('main', 'GSDCalculator.calculate_gsd', 'calculator.calculate_gsd'),
+  ('main', 'GSDCalculator.calculate_altitude', 'calculator.calculate_altitude'),
+  ('main', 'GSDCalculator.calculate_gsd_batch', 'calculator.calculate_gsd_batch'),
+  ('main', 'GSDCalculator.calculate_altitude_batch', 'calculator.calculate_altitude_batch'),
+  ('main', 'CompiledCamera.calculate_gsd', 'compiled_camera.calculate_gsd'),
+  ('main', 'CompiledCamera.calculate_altitude', 'compiled_camera.calculate_altitude'),
+  ('main', 'CompiledCameraCache.get', 'compiled_camera_cache.get'),
+  ('main', 'Camera_Database.get_camera_data', 'database.get_camera_data'),
+  ('main', 'Camera_Database.add_camera', 'database.add_camera'),
+  ('main', 'Camera_Database.add_cameras', 'database.add_cameras'),
+  ('main', 'Camera_Database.reload_if_changed', 'database.reload_if_changed'),
+  ('main', 'validate_input', 'validate_input'),
+  ('camera_storage', 'JSONCameraStorage.load', 'storage.json.load'),
+  ('camera_storage', 'JSONCameraStorage.save', 'storage.json.save'),
+  ('camera_storage', 'SQLiteCameraStorage.load', 'storage.sqlite.load'),
+  ('camera_storage', 'SQLiteCameraStorage.save', 'storage.sqlite.save'),
+  ('camera_storage', 'SQLiteCameraStorage.put_many', 'storage.sqlite.put_many'),
+  ('batch_mode', 'BatchJob.process_chunk', 'batch.process_chunk'),
+)
+
+# Latency buckets are powers of two in nanoseconds: bucket i holds [2**(i-1), 2**i) ns
+_BUCKETS = 64
+
+_lock = threading.Lock()
+_histograms = {}
+# (owner, attribute, original) for every installed wrapper, to restore on disable()
+_installed = []
+_profiler = None
+
+
+class LatencyHistogram:
+  """
+  Call count, total/min/max and a log2 histogram of call durations.
+  """
+
+  def __init__(self):
+    self.count = 0
+    self.total_s = 0.0
+    self.min_s = float('inf')
+    self.max_s = 0.0
+    self.buckets = [0] * _BUCKETS
+
+  def add(self, seconds):
+    """
+    Records one call.
+
+    Args:
+      seconds (float): The duration of the call.
+    """
+    # Durations below 2**63 ns (292 years) fit in the 64 buckets
+    bucket = int(seconds * 1e9).bit_length()
+    with _lock:
+      self.count += 1
+      self.total_s += seconds
+      if seconds > self.max_s:
+        self.max_s = seconds
+      if seconds < self.min_s:
+        self.min_s = seconds
+      self.buckets[bucket] += 1
+
+  def percentile(self, q):
+    """
+    Estimates a percentile as the upper edge of the bucket it falls in (at most a factor of
+    two high), capped at the slowest call.
+
+    Args:
+      q (float): The percentile, 0-100.
+
+    Returns:
+      float: The duration in seconds, or 0.0 if nothing was recorded.
+    """
+    if not self.count:
+      return 0.0
+    rank = q / 100 * self.count
+    seen = 0
+    for bucket, count in enumerate(self.buckets):
+      seen += count
+      if seen >= rank and count:
+        return min(2 ** bucket * 1e-9, self.max_s)
+    return self.max_s
+
+  def to_dict(self):
+    """
+    Returns:
+      dict: Count, total/mean/min/max and p50/p90/p99 in seconds, and the non-empty buckets
+      keyed by their upper edge in nanoseconds.
+    """
+    return {'calls': self.count, 'total_s': self.total_s,
+            'mean_s': self.total_s / self.count if self.count else 0.0,
+            'min_s': self.min_s if self.count else 0.0, 'max_s': self.max_s,
+            'p50_s': self.percentile(50), 'p90_s': self.percentile(90), 'p99_s': self.percentile(99),
+            'buckets_ns': {2 ** bucket: count for bucket, count in enumerate(self.buckets) if count}}
+
+
+def histogram(name):
+  """
+  Gets (creating if needed) the latency histogram for a metric name, e.g. to time a block
+  that is not a method in TARGETS.
+  """
+  with _lock:
+    return _histograms.setdefault(name, LatencyHistogram())
+
+
+def _wrap(func, hist):
+  @functools.wraps(func)
+  def timed(*args, **kwargs):
+    start = time.perf_counter()
+    try:
+      return func(*args, **kwargs)
+    finally:
+      hist.add(time.perf_counter() - start)
+  return timed
+
+
+def _resolve(module_name, path):
+  """
+  Finds the objects holding a target attribute. When a module runs as a script (python main.py)
+  it exists twice, as __main__ and as the copy other modules import, so both are returned.
+  """
+  modules = [importlib.import_module(module_name)]
+  script = sys.modules.get('__main__')
+  script_file = getattr(script, '__file__', None)
+  if script_file and os.path.splitext(os.path.basename(script_file))[0] == module_name:
+    modules.append(script)
+  *parents, attribute = path.split('.')
+  owners = []
+  for owner in modules:
+    for parent in parents:
+      owner = getattr(owner, parent)
+    owners.append(owner)
+  return owners, attribute
+
+
+def is_enabled():
+  """
+  Returns:
+    bool: Whether the timing wrappers are installed.
+  """
+  return bool(_installed)
+
+
+def enable(targets=TARGETS):
+  """
+  Installs timing wrappers on the target callables. Calling it again does nothing.
+
+  Args:
+    targets (Iterable[tuple]): (module, attribute path, metric name) triples.
+  """
+  if _installed:
+    return
+  for module_name, path, name in targets:
+    owners, attribute = _resolve(module_name, path)
+    hist = histogram(name)
+    for owner in owners:
+      # Look in __dict__ so staticmethod/classmethod wrappers are kept
+      original = vars(owner)[attribute]
+      if isinstance(original, (staticmethod, classmethod)):
+        wrapped = type(original)(_wrap(original.__func__, hist))
+      else:
+        wrapped = _wrap(original, hist)
+      setattr(owner, attribute, wrapped)
+      _installed.append((owner, attribute, original))
+
+
+def disable():
+  """
+  Restores the original callables. The recorded statistics are kept.
+  """
+  while _installed:
+    owner, attribute, original = _installed.pop()
+    setattr(owner, attribute, original)
+
+
+def reset():
+  """
+  Clears the recorded statistics.
+  """
+  with _lock:
+    for hist in _histograms.values():
+      hist.__init__()
+
+
+def memory_stats():
+  """
+  Probes peak memory.
+
+  Returns:
+    dict: 'peak_rss_bytes' of the process (None where unavailable) and, if tracemalloc is
+    tracing, its current and peak traced bytes.
+  """
+  stats = {'peak_rss_bytes': None}
+  if resource is not None:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if os.uname().sysname == 'Darwin' else 1024
+    stats['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+  if tracemalloc.is_tracing():
+    stats['traced_bytes'], stats['traced_peak_bytes'] = tracemalloc.get_traced_memory()
+  return stats
+
+
+def snapshot():
+  """
+  Returns:
+    dict: 'enabled', 'timers' (metric name -> LatencyHistogram.to_dict() for every metric with
+    calls) and 'memory' (memory_stats()).
+  """
+  with _lock:
+    histograms = list(_histograms.items())
+  return {'enabled': is_enabled(),
+          'timers': {name: hist.to_dict() for name, hist in sorted(histograms) if hist.count},
+          'memory': memory_stats()}
+
+
+def format_stats(stats=None):
+  """
+  Formats a snapshot as a text table for the console.
+
+  Args:
+    stats (Optional[dict]): A snapshot() result; taken now if not given.
+
+  Returns:
+    str: The table.
+  """
+  stats = snapshot() if stats is None else stats
+  lines = []
+  if not stats['enabled'] and not stats['timers']:
+    lines.append("Timing is off. Run with GSD_INSTRUMENT=1 to record call counts and latencies.")
+  if stats['timers']:
+    lines.append(f"{'Metric':<38} {'Calls':>9} {'Total ms':>10} {'Mean us':>9} {'p50 us':>9} "
+                 f"{'p99 us':>9} {'Max us':>9}")
+    for name, timer in stats['timers'].items():
+      lines.append(f"{name:<38} {timer['calls']:>9} {timer['total_s'] * 1e3:>10.2f} {timer['mean_s'] * 1e6:>9.2f} "
+                   f"{timer['p50_s'] * 1e6:>9.2f} {timer['p99_s'] * 1e6:>9.2f} {timer['max_s'] * 1e6:>9.2f}")
+  memory = stats['memory']
+  if memory['peak_rss_bytes'] is not None:
+    lines.append(f"Peak RSS: {memory['peak_rss_bytes'] / 1e6:.1f} MB")
+  if 'traced_peak_bytes' in memory:
+    lines.append(f"Traced memory: {memory['traced_bytes'] / 1e6:.1f} MB, peak {memory['traced_peak_bytes'] / 1e6:.1f} MB")
+  return '\n'.join(lines)
+
+
+def dump(path, extra=None):
+  """
+  Writes a snapshot as JSON.
+
+  Args:
+    path (str): The output file.
+    extra (Optional[dict]): More sections to include, e.g. cache statistics.
+  """
+  stats = snapshot()
+  stats.update(extra or {})
+  with open(path, 'w') as f:
+    json.dump(stats, f, indent=4)
+
+
+def start_profiling(cprofile=True, tracemalloc_frames=None):
+  """
+  Starts cProfile and/or tracemalloc for the rest of the run.
+
+  Args:
+    cprofile (bool): Whether to run cProfile.
+    tracemalloc_frames (Optional[int]): Start tracemalloc with this many frames per allocation.
+  """
+  global _profiler
+  if cprofile and _profiler is None:
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+  if tracemalloc_frames and not tracemalloc.is_tracing():
+    tracemalloc.start(tracemalloc_frames)
+
+
+def stop_profiling(profile_path=None, tracemalloc_path=None, top=25):
+  """
+  Stops profiling and writes the results.
+
+  Args:
+    profile_path (Optional[str]): Where to write the cProfile data (load with pstats or snakeviz).
+    tracemalloc_path (Optional[str]): Where to write the top allocation sites as text.
+    top (int): The number of allocation sites to write.
+  """
+  global _profiler
+  if _profiler is not None:
+    _profiler.disable()
+    if profile_path:
+      _profiler.dump_stats(profile_path)
+    _profiler = None
+  if tracemalloc.is_tracing():
+    if tracemalloc_path:
+      statistics = tracemalloc.take_snapshot().statistics('lineno')
+      with open(tracemalloc_path, 'w') as f:
+        f.write('\n'.join(str(statistic) for statistic in statistics[:top]) + '\n')
+    tracemalloc.stop()
+
+
+def configure_from_environment(extra_stats=None):
+  """
+  Enables instrumentation and profiling as requested by the GSD_INSTRUMENT, GSD_STATS_FILE,
+  GSD_PROFILE and GSD_TRACEMALLOC environment variables, and registers the exit dumps.
+
+  Args:
+    extra_stats (Optional[callable]): Returns more sections for the JSON dump, e.g. cache
+      statistics, when it is written.
+  """
+  stats_path = os.environ.get('GSD_STATS_FILE')
+  profile_path = os.environ.get('GSD_PROFILE')
+  tracemalloc_frames = int(os.environ.get('GSD_TRACEMALLOC') or 0)
+  if os.environ.get('GSD_INSTRUMENT', '') not in ('', '0') or stats_path:
+    enable()
+  if profile_path or tracemalloc_frames:
+    start_profiling(bool(profile_path), tracemalloc_frames)
+    tracemalloc_path = (stats_path or profile_path or 'gsd') + '.tracemalloc.txt' if tracemalloc_frames else None
+    # Dump the stats first: they include the traced memory figures
+    atexit.register(stop_profiling, profile_path, tracemalloc_path)
+  if stats_path:
+    atexit.register(lambda: dump(stats_path, extra_stats() if extra_stats else None))
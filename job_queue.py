@@ -0,0 +1,463 @@
+# GSD-Calculator for UAV Flights - asyncio job queue
+#
+# Lets several planners submit jobs (GSD/altitude series, lookup tables, survey plans, terrain
+# rasters) to one process at the same time. Jobs wait in a bounded queue: when it is full,
+# submit() waits (or raises asyncio.QueueFull with wait=False), which pushes back on the clients
+# instead of letting the backlog grow. A fixed number of queue workers run the jobs in a thread
+# pool, so at most `concurrency` jobs compute at once; NumPy releases the GIL in the heavy loops.
+#
+# Identical jobs (same type, cameras and inputs) submitted while one is still queued or running
+# are merged: every submitter gets the same Job and it is computed once. Runners report progress
+# and check for cancellation between chunks through the checkpoint callable they are given.
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from camera_catalog import CameraCatalog
+from lookup_tables import table_axis, table_steps
+from main import Camera_Database, GSDCalculator
+from survey_planner import DEFAULT_FORWARD_OVERLAP, DEFAULT_SIDE_OVERLAP, plan_survey, rank_cameras
+from terrain import terrain_gsd_raster
+
+# Same bounds the interactive calculators pass to validate_input
+ALTITUDE_BOUNDS = (0, 2000000)
+GSD_BOUNDS = (0, 10000)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_PENDING = 256
+CHUNK_SIZE = 65536  # Values (or table cells) computed between checkpoints
+MAX_TABLE_CELLS = 10000000  # steps x cameras of a table job, 80 MB of float64
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# job type -> function(params, catalog, checkpoint) run in the executor
+JOB_TYPES = {}
+# Job types computed for exactly one camera, named by params['camera']
+SINGLE_CAMERA_JOBS = ('gsd', 'altitude', 'terrain')
+
+
+class JobCancelled(Exception):
+  """
+  Raised by a checkpoint once a running job has been cancelled.
+  """
+
+
+def job_type(name):
+  """
+  Registers a job runner under a name.
+  """
+  def register(func):
+    JOB_TYPES[name] = func
+    return func
+  return register
+
+
+def _check_bounds(values, name, bounds):
+  if np.any(~((values >= bounds[0]) & (values <= bounds[1]))):
+    raise ValueError(f"{name} must be between {bounds[0]} and {bounds[1]}.")
+
+
+def _series(params, catalog, checkpoint, key, bounds, calculate):
+  values = np.asarray(params[key], dtype=np.float64).ravel()
+  _check_bounds(values, key, bounds)
+  out = np.empty_like(values)
+  for start in range(0, len(values), CHUNK_SIZE):
+    checkpoint(start, len(values))
+    stop = start + CHUNK_SIZE
+    calculate(values[start:stop], catalog.sensor_width_px[0], catalog.pixel_size_um[0],
+              catalog.focal_length_mm[0], out=out[start:stop])
+  return out
+
+
+@job_type('gsd')
+def run_gsd(params, catalog, checkpoint):
+  """
+  GSDs (cm) of one camera: {'camera': name, 'altitude_m': [...]}.
+  """
+  return _series(params, catalog, checkpoint, 'altitude_m', ALTITUDE_BOUNDS, GSDCalculator.calculate_gsd_batch)
+
+
+@job_type('altitude')
+def run_altitude(params, catalog, checkpoint):
+  """
+  Flight altitudes (m) of one camera: {'camera': name, 'gsd_cm': [...]}.
+  """
+  return _series(params, catalog, checkpoint, 'gsd_cm', GSD_BOUNDS, GSDCalculator.calculate_altitude_batch)
+
+
+@job_type('table')
+def run_table(params, catalog, checkpoint):
+  """
+  A steps x cameras table: {'kind': 'gsd' or 'altitude', 'start', 'stop', 'step', optional 'cameras'}.
+  """
+  axis = table_axis(params['start'], params['stop'], params['step'])
+  calculate = catalog.calculate_gsd if params.get('kind', 'gsd') == 'gsd' else catalog.calculate_altitude
+  out = np.empty((len(axis), len(catalog)))
+  rows = max(1, CHUNK_SIZE // max(len(catalog), 1))
+  for start in range(0, len(axis), rows):
+    checkpoint(start, len(axis))
+    calculate(axis[start:start + rows], out=out[start:start + rows])
+  return {'axis': axis, 'cameras': catalog.names, 'table': out}
+
+
+@job_type('survey')
+def run_survey(params, catalog, checkpoint):
+  """
+  A ranked survey plan: {'polygon', 'target_gsd_cm', optional 'forward_overlap', 'side_overlap',
+  'heading_deg', 'rank_by', 'min_altitude_m', 'max_altitude_m', 'cameras'}.
+  """
+  plan = plan_survey(catalog, params['polygon'], params['target_gsd_cm'],
+                     params.get('forward_overlap', DEFAULT_FORWARD_OVERLAP),
+                     params.get('side_overlap', DEFAULT_SIDE_OVERLAP), params.get('heading_deg', 0.0))
+  checkpoint(1, 2)
+  return rank_cameras(plan, params.get('rank_by', 'photos'), params.get('min_altitude_m'),
+                      params.get('max_altitude_m'))
+
+
+@job_type('terrain')
+def run_terrain(params, catalog, checkpoint):
+  """
+  A terrain GSD raster: {'camera', 'dem_path', 'altitude_amsl_m', 'gsd_path', optional
+  'target_gsd_cm', 'exceed_path', 'nodata', 'workers'}. The raster runs on its own process pool,
+  so it reports no progress until it is done.
+  """
+  return terrain_gsd_raster(params['dem_path'], catalog.get(catalog.names[0]).to_dict(),
+                            params['altitude_amsl_m'], params['gsd_path'], params.get('target_gsd_cm'),
+                            params.get('exceed_path'), nodata=params.get('nodata'),
+                            workers=params.get('workers'))
+
+
+class Job:
+  """
+  One submitted job, shared by every client that submitted the same request.
+  """
+
+  def __init__(self, job_id, kind, params, key, catalog, future):
+    self.id = job_id
+    self.kind = kind
+    self.params = params
+    self.key = key
+    self.catalog = catalog
+    self.state = QUEUED
+    self.progress = 0.0
+    self.result = None
+    self.error = None
+    self.submitted_at = time.perf_counter()
+    self.started_at = None
+    self.finished_at = None
+    self.submitters = 1
+    self._future = future
+    self._cancel = threading.Event()
+    # Nobody may be waiting for the result; retrieve the outcome so asyncio does not warn about it
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+  @property
+  def queue_seconds(self):
+    """
+    float or None: Time between submission and the start of the computation.
+    """
+    return None if self.started_at is None else self.started_at - self.submitted_at
+
+  def done(self):
+    return self.state in (DONE, FAILED, CANCELLED)
+
+  async def wait(self):
+    """
+    Waits for the job to finish.
+
+    Returns:
+      The job result.
+
+    Raises:
+      asyncio.CancelledError: If the job was cancelled.
+      Exception: Whatever the runner raised, e.g. ValueError for invalid inputs.
+    """
+    # Shielded, so a cancelled waiter does not cancel the job for the other submitters
+    return await asyncio.shield(self._future)
+
+  def status(self):
+    """
+    Returns:
+      dict: The id, type, state, progress, submitter count and timings of the job.
+    """
+    return {'id': self.id, 'kind': self.kind, 'state': self.state, 'progress': self.progress,
+            'submitters': self.submitters, 'queue_seconds': self.queue_seconds,
+            'run_seconds': None if self.finished_at is None or self.started_at is None
+            else self.finished_at - self.started_at,
+            'error': None if self.error is None else str(self.error)}
+
+
+class JobQueue:
+  """
+  Bounded asyncio job queue around Camera_Database and the calculators. Use it as an async
+  context manager, or call start() and close(), from inside a running event loop.
+  """
+
+  def __init__(self, camera_database, concurrency=DEFAULT_CONCURRENCY, max_pending=DEFAULT_MAX_PENDING,
+               executor=None):
+    """
+    Args:
+      camera_database (Camera_Database): The cameras jobs refer to by name.
+      concurrency (int): Jobs computed at the same time.
+      max_pending (int): Jobs that may wait in the queue before submit() blocks.
+      executor (Optional[ThreadPoolExecutor]): Where the jobs run; by default a pool of
+        `concurrency` threads owned by the queue. Runners report progress from the thread, so
+        a process pool cannot be used here.
+
+    Raises:
+      ValueError: If concurrency or max_pending is not positive.
+    """
+    if concurrency < 1 or max_pending < 1:
+      raise ValueError("concurrency and max_pending must be positive.")
+    self.camera_database = camera_database
+    self.concurrency = concurrency
+    self.max_pending = max_pending
+    self._executor = executor
+    self._owns_executor = executor is None
+    self._queue = None
+    self._workers = []
+    self._in_flight = {}  # request key -> queued or running Job
+    self._ids = itertools.count(1)
+    self._catalog = None
+    self._catalog_version = 0
+    self.stats = {'submitted': 0, 'merged': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+
+  async def __aenter__(self):
+    self.start()
+    return self
+
+  async def __aexit__(self, *exc_info):
+    await self.close(cancel_pending=exc_info[0] is not None)
+
+  def start(self):
+    """
+    Starts the queue workers on the running event loop.
+    """
+    self.camera_database.add_listener(self._cameras_changed)
+    if self._executor is None:
+      self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='gsd-job')
+    self._queue = asyncio.Queue(self.max_pending)
+    self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+
+  async def close(self, cancel_pending=False):
+    """
+    Stops the queue workers and stops listening for camera changes.
+
+    Args:
+      cancel_pending (bool): Cancel queued and running jobs instead of finishing them first.
+    """
+    if cancel_pending:
+      for job in list(self._in_flight.values()):
+        self._cancel(job)
+    await self._queue.join()
+    for worker in self._workers:
+      worker.cancel()
+    await asyncio.gather(*self._workers, return_exceptions=True)
+    self.camera_database.remove_listener(self._cameras_changed)
+    if self._owns_executor:
+      self._executor.shutdown()
+      self._executor = None
+
+  def _cameras_changed(self, camera_names):
+    # May be called from the Camera_Database watch thread; the catalog is rebuilt on next use
+    self._catalog = None
+    self._catalog_version += 1
+
+  def _check_size(self, kind, params, catalog):
+    """
+    Rejects table jobs whose result would not fit in MAX_TABLE_CELLS.
+
+    Raises:
+      ValueError: If the table axis is invalid or the table is too large.
+    """
+    if kind != 'table':
+      return
+    try:
+      steps = table_steps(params['start'], params['stop'], params['step'])
+    except (KeyError, TypeError, OverflowError):
+      raise ValueError("A table job needs numeric 'start', 'stop' and 'step'.")
+    if steps * len(catalog) > MAX_TABLE_CELLS:
+      raise ValueError(f"A table job may have at most {MAX_TABLE_CELLS} cells (steps x cameras), "
+                       f"not {steps * len(catalog)}.")
+
+  def _job_catalog(self, params):
+    """
+    Builds the catalog a job runs on: its 'camera', its 'cameras' or the whole database.
+
+    Raises:
+      ValueError: If a named camera is not in the database.
+    """
+    if 'camera' in params or 'cameras' in params:
+      names = [params['camera']] if 'camera' in params else list(params['cameras'])
+      cameras = self.camera_database.camera_database
+      missing = [name for name in names if name not in cameras]
+      if missing:
+        raise ValueError(f"Cameras not in the database: {', '.join(missing)}")
+      return CameraCatalog.from_dict({name: cameras[name] for name in names})
+    catalog = self._catalog
+    if catalog is None:
+      catalog = self._catalog = CameraCatalog.from_camera_database(self.camera_database)
+    return catalog
+
+  async def submit(self, kind, params, wait=True):
+    """
+    Submits a job, or joins an identical job that is still queued or running.
+
+    Args:
+      kind (str): The job type, one of JOB_TYPES.
+      params (dict): The JSON-serializable job inputs, as documented on each runner.
+      wait (bool): If the queue is full, wait for room (default) instead of raising.
+
+    Returns:
+      Job: The job; await job.wait() for the result.
+
+    Raises:
+      ValueError: If the job type is unknown, a camera is not in the database, a gsd,
+        altitude or terrain job does not name exactly one camera, or a table job is larger
+        than MAX_TABLE_CELLS.
+      asyncio.QueueFull: If the queue is full and wait is False.
+    """
+    if kind not in JOB_TYPES:
+      raise ValueError(f"Unknown job type {kind!r}. Choose from {', '.join(JOB_TYPES)}.")
+    if kind in SINGLE_CAMERA_JOBS and (not isinstance(params.get('camera'), str) or 'cameras' in params):
+      raise ValueError(f"A {kind} job needs exactly one camera, given as 'camera'.")
+    # The database version is part of the key, so a request never joins a job computed with
+    # cameras that have changed since
+    key = (kind, self._catalog_version, json.dumps(params, sort_keys=True))
+    job = self._in_flight.get(key)
+    if job is not None:
+      job.submitters += 1
+      self.stats['merged'] += 1
+      return job
+    catalog = self._job_catalog(params)
+    self._check_size(kind, params, catalog)
+    job = Job(next(self._ids), kind, params, key, catalog, asyncio.get_running_loop().create_future())
+    if wait:
+      self._in_flight[key] = job
+      try:
+        await self._queue.put(job)
+      except asyncio.CancelledError:
+        self._cancel(job)
+        raise
+    else:
+      self._queue.put_nowait(job)
+      self._in_flight[key] = job
+    self.stats['submitted'] += 1
+    return job
+
+  def cancel(self, job):
+    """
+    Withdraws one submitter from a job. The job is cancelled once every client that submitted
+    it has withdrawn: a queued job is skipped, a running one stops at its next checkpoint.
+
+    Returns:
+      bool: Whether the job is now being cancelled.
+    """
+    if job.done():
+      return False
+    job.submitters -= 1
+    if job.submitters > 0:
+      return False
+    self._cancel(job)
+    return True
+
+  def _cancel(self, job):
+    job._cancel.set()
+    # New identical requests must start a fresh job rather than join one that is stopping
+    self._in_flight.pop(job.key, None)
+    if job.state == QUEUED:
+      self._finish(job, CANCELLED)
+
+  def _finish(self, job, state, result=None, error=None):
+    job.state = state
+    job.result = result
+    job.error = error
+    job.finished_at = time.perf_counter()
+    self._in_flight.pop(job.key, None)
+    if state == DONE:
+      self.stats['completed'] += 1
+      job.progress = 1.0
+      job._future.set_result(result)
+    elif state == FAILED:
+      self.stats['failed'] += 1
+      job._future.set_exception(error)
+    else:
+      self.stats['cancelled'] += 1
+      job._future.cancel()
+
+  def queued(self):
+    """
+    Returns:
+      int: Jobs waiting for a worker.
+    """
+    return self._queue.qsize()
+
+  async def _worker(self):
+    loop = asyncio.get_running_loop()
+    while True:
+      job = await self._queue.get()
+      try:
+        if job.state != QUEUED:
+          continue  # Cancelled while it waited
+        job.state = RUNNING
+        job.started_at = time.perf_counter()
+
+        def checkpoint(done, total, job=job):
+          job.progress = done / total if total else 0.0
+          if job._cancel.is_set():
+            raise JobCancelled()
+
+        try:
+          result = await loop.run_in_executor(self._executor, JOB_TYPES[job.kind], job.params, job.catalog,
+                                              checkpoint)
+        except JobCancelled:
+          self._finish(job, CANCELLED)
+        except Exception as e:
+          self._finish(job, FAILED, error=e)
+        else:
+          if job._cancel.is_set():
+            self._finish(job, CANCELLED)
+          else:
+            self._finish(job, DONE, result)
+      finally:
+        self._queue.task_done()
+
+
+def main(argv=None):
+  """
+  Command line entry point: runs one job through the queue and prints its result as JSON.
+  """
+  parser = argparse.ArgumentParser(description="Run a GSD job through the asyncio job queue.")
+  parser.add_argument('kind', choices=list(JOB_TYPES))
+  parser.add_argument('params', help="The job inputs as a JSON object")
+  args = parser.parse_args(argv)
+
+  async def run():
+    async with JobQueue(Camera_Database.from_environment(), concurrency=1) as queue:
+      job = await queue.submit(args.kind, json.loads(args.params))
+      return await job.wait()
+
+  try:
+    result = asyncio.run(run())
+  except ValueError as e:
+    print(f"Error: {e}", file=sys.stderr)
+    return 1
+  print(json.dumps(result, indent=4, default=lambda value: value.tolist()))
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
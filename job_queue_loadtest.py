@@ -0,0 +1,122 @@
+# GSD-Calculator for UAV Flights - local stress test for job_queue.py
+#
+# Runs hundreds of concurrent asyncio clients against one JobQueue. Each client submits a mix of
+# GSD series, lookup tables and survey plans until the deadline, waits for each result, and
+# cancels a share of its jobs. Part of the requests come from a small pool of popular ones, so
+# identical in-flight requests get merged. Reports throughput, queue latency (submission to
+# start of computation) and end-to-end latency.
+#
+# Run with: python job_queue_loadtest.py [--clients 200] [--duration 5] [--concurrency 4]
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from job_queue import DEFAULT_CONCURRENCY, JobQueue
+from main import Camera_Database
+
+
+def _make_requests(cameras, rng):
+  """
+  Returns a function that builds a random (kind, params) job request.
+  """
+  polygon = [[0, 0], [2000, 0], [2000, 1200], [0, 1200]]
+
+  def make_request():
+    kind = rng.choices(('gsd', 'table', 'survey'), weights=(6, 1, 3))[0]
+    if kind == 'gsd':
+      return kind, {'camera': rng.choice(cameras),
+                    'altitude_m': [round(rng.uniform(20, 120), 2) for _ in range(1000)]}
+    if kind == 'table':
+      return kind, {'kind': 'gsd', 'start': 0, 'stop': rng.choice((100, 200, 500)), 'step': 0.01}
+    return kind, {'polygon': polygon, 'target_gsd_cm': round(rng.uniform(0.5, 5), 1)}
+
+  return make_request
+
+
+async def _client(queue, make_request, popular, duplicate_rate, cancel_rate, deadline, rng):
+  """
+  Submits jobs until the deadline.
+
+  Returns:
+    tuple: (end-to-end latency of each answered request, number of cancelled requests, jobs).
+  """
+  latencies = []
+  cancelled = 0
+  jobs = []
+  while time.perf_counter() < deadline:
+    kind, params = rng.choice(popular) if rng.random() < duplicate_rate else make_request()
+    start = time.perf_counter()
+    job = await queue.submit(kind, params)
+    jobs.append(job)
+    if rng.random() < cancel_rate:
+      queue.cancel(job)
+      cancelled += 1
+      continue
+    await job.wait()
+    latencies.append(time.perf_counter() - start)
+  return latencies, cancelled, jobs
+
+
+def _quantiles_ms(values):
+  if len(values) < 2:
+    return {'p50_ms': None, 'p99_ms': None}
+  quantiles = statistics.quantiles(values, n=100)
+  return {'p50_ms': quantiles[49] * 1000, 'p99_ms': quantiles[98] * 1000}
+
+
+async def run_stress_test(camera_database, clients, duration, concurrency, max_pending, duplicate_rate,
+                          cancel_rate, seed=0):
+  """
+  Runs the stress test and prints its results.
+
+  Returns:
+    dict: Job counts, jobs/sec, queue latency and end-to-end latency percentiles.
+  """
+  rng = random.Random(seed)
+  cameras = camera_database.get_list_cameras()
+  make_request = _make_requests(cameras, rng)
+  popular = [make_request() for _ in range(10)]
+  async with JobQueue(camera_database, concurrency, max_pending) as queue:
+    start = time.perf_counter()
+    deadline = start + duration
+    results = await asyncio.gather(*(
+      _client(queue, make_request, popular, duplicate_rate, cancel_rate, deadline, random.Random(seed + i))
+      for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    stats = dict(queue.stats)
+  latencies = [latency for client_latencies, _, _ in results for latency in client_latencies]
+  # Merged requests share a Job; count each once
+  jobs = {job.id: job for _, _, client_jobs in results for job in client_jobs}
+  queue_seconds = [job.queue_seconds for job in jobs.values() if job.queue_seconds is not None]
+  report = {'clients': clients, 'requests': len(latencies) + sum(cancelled for _, cancelled, _ in results),
+            **stats, 'jobs_per_s': stats['completed'] / elapsed, 'requests_per_s': len(latencies) / elapsed,
+            'queue': _quantiles_ms(queue_seconds), 'end_to_end': _quantiles_ms(latencies)}
+  print(f"{clients} clients, {concurrency} concurrent jobs, {max_pending} queue slots, {elapsed:.1f}s")
+  print(f"{report['requests']} requests: {stats['submitted']} jobs computed or cancelled, "
+        f"{stats['merged']} merged into in-flight jobs, {stats['cancelled']} cancelled, {stats['failed']} failed")
+  print(f"throughput: {report['jobs_per_s']:.0f} jobs/s, {report['requests_per_s']:.0f} answered requests/s")
+  for name in ('queue', 'end_to_end'):
+    if report[name]['p50_ms'] is not None:
+      print(f"{name.replace('_', '-') + ' latency':<20} p50 {report[name]['p50_ms']:8.2f} ms   "
+            f"p99 {report[name]['p99_ms']:8.2f} ms")
+  return report
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Stress test the asyncio job queue.")
+  parser.add_argument('--clients', type=int, default=200, help="Concurrent clients")
+  parser.add_argument('--duration', type=float, default=5.0, help="Seconds to submit jobs for")
+  parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Jobs computed at once")
+  parser.add_argument('--max-pending', type=int, default=64, help="Queue slots before submit waits")
+  parser.add_argument('--duplicate-rate', type=float, default=0.3, help="Share of requests from a popular pool")
+  parser.add_argument('--cancel-rate', type=float, default=0.05, help="Share of jobs cancelled after submission")
+  args = parser.parse_args(argv)
+  asyncio.run(run_stress_test(Camera_Database.from_environment(), args.clients, args.duration, args.concurrency,
+                              args.max_pending, args.duplicate_rate, args.cancel_rate))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,264 @@
+# GSD-Calculator for UAV Flights - precomputed lookup tables
+#
+# Exports dense altitude -> GSD or GSD -> altitude tables for every camera (or a selection) so
+# flight controllers and field tablets can look values up instead of running the calculator.
+#
+# Tables are laid out one row per camera and one column per step, so a consumer reads camera i
+# at step j from offset i * steps + j. They are written as:
+#   .npy  NumPy array plus a <path>.json sidecar with the axis and camera names
+#   .csv  one line per step with a column per camera, for people
+#   other a flat little-endian binary: a fixed header (HEADER_FORMAT), the camera names as
+#         newline-separated UTF-8, padding up to data_offset, then the table
+# The table is computed and written in blocks, so memory does not grow with the catalog.
+
+import argparse
+import json
+import math
+import struct
+import sys
+
+import numpy as np
+
+from camera_catalog import CameraCatalog
+from main import Camera_Database, GSDCalculator
+
+KINDS = ('gsd', 'altitude')  # gsd: GSD (cm) by altitude (m); altitude: altitude (m) by GSD (cm)
+FORMATS = ('npy', 'bin', 'csv')
+
+MAGIC = b'GSDLUT\x00\x00'
+VERSION = 1
+# magic, version, kind, itemsize, cameras, steps, start, step, names_size, data_offset
+HEADER_FORMAT = '<8sHBBIIddII'
+DATA_ALIGNMENT = 64
+DEFAULT_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def table_steps(start, stop, step):
+  """
+  Counts the values of a table axis without building it.
+
+  Args:
+    start (float): The first value.
+    stop (float): The last value (included if it falls on a step).
+    step (float): The spacing.
+
+  Returns:
+    int: The number of values table_axis returns.
+
+  Raises:
+    ValueError: If step is not positive or stop is before start.
+  """
+  if step <= 0 or stop < start:
+    raise ValueError("The step must be positive and stop must not be before start.")
+  # Tolerate rounding so 0..500 in 0.01 steps includes 500
+  return math.floor((stop - start) / step * (1 + 1e-12)) + 1
+
+
+def table_axis(start, stop, step):
+  """
+  Builds the altitude/GSD axis of a table.
+
+  Values are start + i * step, not a running sum, so they do not drift over long tables.
+
+  Args:
+    start (float): The first value.
+    stop (float): The last value (included if it falls on a step).
+    step (float): The spacing.
+
+  Returns:
+    numpy.ndarray: The float64 axis.
+
+  Raises:
+    ValueError: If step is not positive or stop is before start.
+  """
+  return start + step * np.arange(table_steps(start, stop, step), dtype=np.float64)
+
+
+def _select(catalog, camera_names):
+  """
+  Returns the names and camera parameter columns to export.
+  """
+  if camera_names is None:
+    return (catalog.names, catalog.sensor_width_px, catalog.pixel_size_um, catalog.focal_length_mm)
+  missing = [name for name in camera_names if name not in catalog]
+  if missing:
+    raise ValueError(f"Cameras not in the database: {', '.join(missing)}")
+  rows = np.array([catalog.row(name) for name in camera_names], dtype=np.intp)
+  return (list(camera_names), catalog.sensor_width_px[rows], catalog.pixel_size_um[rows],
+          catalog.focal_length_mm[rows])
+
+
+def _iter_camera_blocks(kind, axis, sensor_width_px, pixel_size_um, focal_length_mm, dtype, block_bytes):
+  """
+  Computes the table in blocks of cameras.
+
+  Yields:
+    numpy.ndarray: (cameras in block, len(axis)) slices of the table, reusing one buffer.
+  """
+  calculate = GSDCalculator.calculate_gsd_batch if kind == 'gsd' else GSDCalculator.calculate_altitude_batch
+  block = max(1, block_bytes // (len(axis) * np.dtype(dtype).itemsize))
+  buffer = np.empty((min(block, len(sensor_width_px)), len(axis)), dtype=dtype)
+  for start in range(0, len(sensor_width_px), block):
+    stop = min(start + block, len(sensor_width_px))
+    out = buffer[:stop - start]
+    # Pair a column of cameras with the row of axis values: one (cameras, steps) pass
+    yield calculate(axis[np.newaxis, :], sensor_width_px[start:stop, np.newaxis],
+                    pixel_size_um[start:stop, np.newaxis], focal_length_mm[start:stop, np.newaxis],
+                    dtype=dtype, out=out, outer=False)
+
+
+def _write_npy(path, kind, axis, names, columns, dtype, block_bytes):
+  shape = (len(names), len(axis))
+  with open(path, 'wb') as f:
+    np.lib.format.write_array_header_1_0(f, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                             'fortran_order': False, 'shape': shape})
+    for block in _iter_camera_blocks(kind, axis, *columns, dtype, block_bytes):
+      block.tofile(f)
+  with open(path + '.json', 'w') as f:
+    json.dump({'kind': kind, 'start': float(axis[0]), 'step': _axis_step(axis), 'steps': len(axis),
+               'cameras': names}, f, indent=4)
+
+
+def _write_binary(path, kind, axis, names, columns, dtype, block_bytes):
+  names_block = '\n'.join(names).encode('utf-8')
+  header_size = struct.calcsize(HEADER_FORMAT)
+  data_offset = -(-(header_size + len(names_block)) // DATA_ALIGNMENT) * DATA_ALIGNMENT
+  header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, KINDS.index(kind), np.dtype(dtype).itemsize,
+                       len(names), len(axis), float(axis[0]), _axis_step(axis), len(names_block), data_offset)
+  with open(path, 'wb') as f:
+    f.write(header)
+    f.write(names_block)
+    f.write(b'\x00' * (data_offset - header_size - len(names_block)))
+    for block in _iter_camera_blocks(kind, axis, *columns, dtype, block_bytes):
+      block.astype(block.dtype.newbyteorder('<'), copy=False).tofile(f)
+
+
+def _write_csv(path, kind, axis, names, columns, dtype, block_bytes):
+  calculate = GSDCalculator.calculate_gsd_batch if kind == 'gsd' else GSDCalculator.calculate_altitude_batch
+  axis_label = 'altitude_m' if kind == 'gsd' else 'gsd_cm'
+  block = max(1, block_bytes // (max(len(names), 1) * np.dtype(dtype).itemsize))
+  # CSV is step by step, so it is computed in blocks of steps with one column per camera
+  with open(path, 'w', newline='') as f:
+    f.write(','.join([axis_label] + [_csv_field(name) for name in names]) + '\n')
+    for start in range(0, len(axis), block):
+      values = axis[start:start + block]
+      table = calculate(values, *columns, dtype=dtype)
+      np.savetxt(f, np.column_stack((values, table)), fmt='%.6g', delimiter=',')
+
+
+def _csv_field(value):
+  if any(character in value for character in ',"\n'):
+    return '"' + value.replace('"', '""') + '"'
+  return value
+
+
+def _axis_step(axis):
+  return float((axis[-1] - axis[0]) / (len(axis) - 1)) if len(axis) > 1 else 0.0
+
+
+_WRITERS = {'npy': _write_npy, 'bin': _write_binary, 'csv': _write_csv}
+
+
+def export_table(camera_database, path, kind='gsd', start=0.0, stop=500.0, step=0.01, camera_names=None,
+                 file_format=None, dtype=np.float32, block_bytes=DEFAULT_BLOCK_BYTES):
+  """
+  Writes a lookup table for the cameras in a database.
+
+  Args:
+    camera_database (Camera_Database or CameraCatalog): The cameras.
+    path (str): The output file.
+    kind (str): 'gsd' for GSD in cm by altitude in m, 'altitude' for altitude in m by GSD in cm.
+    start (float): The first altitude (m) or GSD (cm).
+    stop (float): The last altitude (m) or GSD (cm).
+    step (float): The altitude/GSD resolution.
+    camera_names (Optional[list]): Only export these cameras, in this order.
+    file_format (Optional[str]): One of FORMATS; by default taken from the extension of path,
+      with anything other than .npy or .csv written as the flat binary format.
+    dtype (numpy dtype): np.float32 (default) or np.float64.
+    block_bytes (int): The approximate size of each computed block.
+
+  Returns:
+    dict: The kind, format, number of cameras and steps, and the axis start and step.
+
+  Raises:
+    ValueError: If the kind or format is unknown, a camera is not in the database or the
+      range is invalid.
+  """
+  if kind not in KINDS:
+    raise ValueError(f"kind must be one of {KINDS}.")
+  if file_format is None:
+    extension = path.rsplit('.', 1)[-1].lower()
+    file_format = extension if extension in ('npy', 'csv') else 'bin'
+  if file_format not in FORMATS:
+    raise ValueError(f"file_format must be one of {FORMATS}.")
+  catalog = camera_database
+  if not isinstance(catalog, CameraCatalog):
+    catalog = CameraCatalog.from_camera_database(camera_database)
+  axis = table_axis(start, stop, step)
+  names, *columns = _select(catalog, camera_names)
+  _WRITERS[file_format](path, kind, axis, names, columns, dtype, block_bytes)
+  return {'kind': kind, 'format': file_format, 'cameras': len(names), 'steps': len(axis),
+          'start': float(axis[0]), 'step': _axis_step(axis)}
+
+
+def open_table(path):
+  """
+  Memory-maps a table written by export_table in the npy or flat binary format.
+
+  Args:
+    path (str): The table file.
+
+  Returns:
+    tuple: (table, axis, camera_names, kind), with table a read-only (cameras, steps) memory map.
+
+  Raises:
+    ValueError: If a binary file does not start with the table header.
+  """
+  if path.lower().endswith('.npy'):
+    table = np.load(path, mmap_mode='r')
+    with open(path + '.json') as f:
+      metadata = json.load(f)
+    axis = metadata['start'] + metadata['step'] * np.arange(metadata['steps'])
+    return table, axis, metadata['cameras'], metadata['kind']
+  header_size = struct.calcsize(HEADER_FORMAT)
+  with open(path, 'rb') as f:
+    header = f.read(header_size)
+    if len(header) < header_size or header[:len(MAGIC)] != MAGIC:
+      raise ValueError(f"{path} is not a GSD lookup table.")
+    (_, version, kind, itemsize, cameras, steps, start, step, names_size,
+     data_offset) = struct.unpack(HEADER_FORMAT, header)
+    if version != VERSION:
+      raise ValueError(f"{path} has table version {version}, expected {VERSION}.")
+    names = f.read(names_size).decode('utf-8').split('\n') if cameras else []
+  dtype = np.dtype('<f4' if itemsize == 4 else '<f8')
+  table = np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(cameras, steps))
+  return table, start + step * np.arange(steps), names, KINDS[kind]
+
+
+def main(argv=None):
+  """
+  Command line entry point for the lookup-table exporter.
+  """
+  parser = argparse.ArgumentParser(description="Export altitude/GSD lookup tables for the camera database.")
+  parser.add_argument('kind', choices=KINDS, help="gsd: GSD (cm) by altitude (m); altitude: altitude (m) by GSD (cm)")
+  parser.add_argument('-o', '--output', required=True, help="Output file (.npy, .csv, or anything else for flat binary)")
+  parser.add_argument('--start', type=float, default=0.0, help="First altitude (m) or GSD (cm)")
+  parser.add_argument('--stop', type=float, default=500.0, help="Last altitude (m) or GSD (cm)")
+  parser.add_argument('--step', type=float, default=0.01, help="Resolution of the table")
+  parser.add_argument('--camera', action='append', dest='cameras', help="Export only this camera (repeatable)")
+  parser.add_argument('--format', choices=FORMATS, help="Override the format implied by the extension")
+  parser.add_argument('--float64', action='store_true', help="Write float64 instead of float32")
+  args = parser.parse_args(argv)
+
+  try:
+    result = export_table(Camera_Database.from_environment(), args.output, args.kind, args.start, args.stop,
+                          args.step, args.cameras, args.format, np.float64 if args.float64 else np.float32)
+  except ValueError as e:
+    print(f"Error: {e}")
+    return 1
+  print(f"Wrote {result['cameras']} cameras x {result['steps']} steps to {args.output} ({result['format']})")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
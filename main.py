@@ -1,39 +1,108 @@
 # GSD-Calculator for UAV Flights
 # Author: Orinal author: 21satspleb, Revised by Ryan Dorrill - dorrill1@gmail.com
 
+import argparse
 import os
-import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from camera_storage import STORAGE_ERRORS, JSONCameraStorage, open_storage
 
 # Constants
 
 uM_TO_M = 1e-6  # nanometers to meters --> #Ryan's note - Bro mixed up um and nm....whoops
 MM_TO_M = 1e-3  # millimeters to meters
 CM_TO_M = 100  # millimeters to meters
+COMPILED_CAMERA_CACHE_SIZE = 256  # Compiled cameras kept per Camera_Database
+# Environment variables that switch on instrumentation (see instrumentation.py)
+INSTRUMENTATION_VARIABLES = ('GSD_INSTRUMENT', 'GSD_STATS_FILE', 'GSD_PROFILE', 'GSD_TRACEMALLOC')
+
+def storage_from_environment():
+  """
+  Opens the storage named by the GSD_CAMERA_DATABASE environment variable, or the default
+  camera_database.json in the working directory if it is not set. A .db/.sqlite path uses the
+  SQLite backend and imports camera_database.json from the working directory the first time
+  it is created.
+
+  Returns:
+    JSONCameraStorage or SQLiteCameraStorage: The storage backend.
+  """
+  default_path = os.path.join(os.getcwd(), 'camera_database.json')
+  path = os.environ.get('GSD_CAMERA_DATABASE')
+  if not path:
+    return JSONCameraStorage(default_path)
+  return open_storage(path, migrate_from=default_path)
+
+def get_pixel_size_um(camera_parameters):
+  """
+  Gets the pixel size from a camera entry.
+
+  Older databases (including the shipped camera_database.json) store the pixel size under
+  'pixel_size_nm' although the value is in micrometers, so both keys are accepted.
+
+  Args:
+    camera_parameters (dict): The parameters of a camera from the camera database.
+
+  Returns:
+    float: The pixel size in micrometers.
+  """
+  if 'pixel_size_um' in camera_parameters:
+    return camera_parameters['pixel_size_um']
+  return camera_parameters['pixel_size_nm']
 
 class Camera_Database:
-  def __init__(self):
+  def __init__(self, storage=None, watch_interval=None):
     """
-    Initializes the Camera_Database class and loads the camera database from a JSON file
+    Initializes the Camera_Database class and loads the camera database from its storage
     if it exists. If not, creates a new one with example data.
+
+    Args:
+      storage (Optional[JSONCameraStorage or SQLiteCameraStorage]): Where the cameras are
+        persisted. Defaults to camera_database.json in the working directory.
+      watch_interval (Optional[float]): If given, check the storage for changes made by other
+        processes every watch_interval seconds and reload it (see watch).
     """
-    self.camera_database_path = os.path.join(os.getcwd(), 'camera_database.json')
-    # Create camera database json if not exist in path
-    if not os.path.exists(self.camera_database_path):
-      # Create camera dict with example parameter based on Camera class
-      self.camera_database = {'Zenmuse P1 35mm': {'sensor_width_px': 8192, 'sensor_height_px': 5460,
-                                                  'pixel_size_um': 4.27, 'focal_length_mm': 35}}
-      # Save camera database as .json on wkdir
-      with open(self.camera_database_path, 'w') as f:
-        json.dump(self.camera_database, f)
-    else:
-      # Load camera database from.json on wkdir
-      with open(self.camera_database_path, 'r') as f:
-        self.camera_database = json.load(f)
+    if storage is None:
+      storage = JSONCameraStorage(os.path.join(os.getcwd(), 'camera_database.json'))
+    self.storage = storage
+    self.camera_database_path = storage.path
+    # Serializes storage access between writers and reloads
+    self._lock = threading.RLock()
+    # Load camera database from storage. Saves are atomic, so reading needs no lock and a
+    # catalog on a read-only mount still loads; only creating it takes the writer lock.
+    self._storage_version = self.storage.version()
+    self.camera_database = self.storage.load()
+    # Create camera database if not exist in storage
+    if self.camera_database is None:
+      with self.storage.lock():
+        # Another process may have created it while we waited for the lock
+        self.camera_database = self.storage.load()
+        if self.camera_database is None:
+          # Create camera dict with example parameter based on Camera class
+          self.camera_database = {'Zenmuse P1 35mm': {'sensor_width_px': 8192, 'sensor_height_px': 5460,
+                                                      'pixel_size_um': 4.27, 'focal_length_mm': 35}}
+          self.storage.save(self.camera_database)
+        self._storage_version = self.storage.version()
+    # Callbacks notified with the names of added/overwritten cameras
+    self._listeners = []
+    self.compiled_cameras = CompiledCameraCache(self)
+    self.reload_checks = 0
+    self.reloads = 0
+    self.reload_errors = 0
+    self.last_reload_s = 0.0
+    self.total_reload_s = 0.0
+    self.max_reload_s = 0.0
+    self._watcher = None
+    self._stop_watching = threading.Event()
+    if watch_interval is not None:
+      self.watch(watch_interval)
 
 
   def add_camera(self, camera_name, sensor_width_px, sensor_height_px, pixel_size_um, focal_length_mm):
     """
-    Adds a new camera to the camera database and updates the JSON file.
+    Adds a new camera to the camera database and updates the storage.
 
     Args:
       camera_name (str): The name of the camera.
@@ -42,13 +111,178 @@ class Camera_Database:
       pixel_size_um (float): The size of each pixel in nanometers.
       focal_length_mm (float): The focal length of the camera in millimeters.
     """
-    self.camera_database[camera_name] = {'sensor_width_px': sensor_width_px,'sensor_height_px':
-                                         sensor_height_px, 'pixel_size_um': pixel_size_um,
-                                         'focal_length_mm': focal_length_mm}
-    # Save camera database as.json on wkdir
-    with open(self.camera_database_path, 'w') as f:
-      json.dump(self.camera_database, f)
-      print(f'Camera database updated at {os.getcwd()}')
+    with self._lock, self.storage.lock():
+      # Pick up cameras other processes added, so a whole-file save does not drop them
+      self.reload_if_changed()
+      self.camera_database[camera_name] = {'sensor_width_px': sensor_width_px,'sensor_height_px':
+                                           sensor_height_px, 'pixel_size_um': pixel_size_um,
+                                           'focal_length_mm': focal_length_mm}
+      # Save camera database to storage
+      self.storage.put(camera_name, self.camera_database[camera_name], self.camera_database)
+      self._storage_version = self.storage.version()
+    self._notify([camera_name])
+    print(f'Camera database updated at {os.path.dirname(os.path.abspath(self.camera_database_path))}')
+
+  def add_cameras(self, cameras, overwrite=True):
+    """
+    Adds several cameras to the camera database with a single storage write (one transaction
+    for SQLite).
+
+    Args:
+      cameras (dict): Camera name -> dict with sensor_width_px, sensor_height_px,
+        pixel_size_um (or pixel_size_nm) and focal_length_mm.
+      overwrite (bool): Replace cameras that are already in the database; if False they are
+        left as they are.
+
+    Returns:
+      list: The names of the cameras that were added or replaced.
+    """
+    new_cameras = {camera_name: {'sensor_width_px': camera_parameters['sensor_width_px'],
+                                 'sensor_height_px': camera_parameters['sensor_height_px'],
+                                 'pixel_size_um': get_pixel_size_um(camera_parameters),
+                                 'focal_length_mm': camera_parameters['focal_length_mm']}
+                   for camera_name, camera_parameters in cameras.items()}
+    with self._lock, self.storage.lock():
+      self.reload_if_changed()
+      if not overwrite:
+        new_cameras = {camera_name: camera_parameters for camera_name, camera_parameters in new_cameras.items()
+                       if camera_name not in self.camera_database}
+      self.camera_database.update(new_cameras)
+      self.storage.put_many(new_cameras, self.camera_database)
+      self._storage_version = self.storage.version()
+    self._notify(list(new_cameras))
+    return list(new_cameras)
+
+  def reload_if_changed(self, force=False):
+    """
+    Reloads the catalog if another process changed the storage since it was last read.
+
+    The check is one stat call (JSON) or one PRAGMA (SQLite). A reload builds the new catalog
+    on the side and swaps it in with a single assignment, so concurrent get_camera_data calls
+    see either the old or the new catalog, never a partly loaded one. Listeners are notified
+    with the cameras that were added, changed or removed.
+
+    Args:
+      force (bool): Reload even if the storage reports no change.
+
+    Returns:
+      bool: Whether the catalog was reloaded.
+    """
+    with self._lock:
+      self.reload_checks += 1
+      # Read the version before loading: a change during the load triggers another reload
+      version = self.storage.version()
+      if version == self._storage_version and not force:
+        return False
+      start = time.perf_counter()
+      try:
+        cameras = self.storage.load()
+      except STORAGE_ERRORS:
+        # E.g. a file being rewritten in place by an editor; keep the current catalog and retry
+        self.reload_errors += 1
+        return False
+      if cameras is None:
+        # The storage was removed; keep serving the current catalog
+        self._storage_version = version
+        return False
+      old_cameras = self.camera_database
+      changed = [name for name in old_cameras.keys() | cameras.keys()
+                 if old_cameras.get(name) != cameras.get(name)]
+      self.camera_database = cameras
+      self._storage_version = version
+      elapsed = time.perf_counter() - start
+      self.reloads += 1
+      self.last_reload_s = elapsed
+      self.total_reload_s += elapsed
+      self.max_reload_s = max(self.max_reload_s, elapsed)
+    if changed:
+      self._notify(changed)
+    return True
+
+  def watch(self, interval=1.0):
+    """
+    Starts a daemon thread that calls reload_if_changed every interval seconds.
+
+    Args:
+      interval (float): Seconds between checks.
+    """
+    if self._watcher is not None:
+      return
+    self._stop_watching.clear()
+
+    def run():
+      while not self._stop_watching.wait(interval):
+        self.reload_if_changed()
+
+    self._watcher = threading.Thread(target=run, name='camera-database-watcher', daemon=True)
+    self._watcher.start()
+
+  def stop_watching(self):
+    """
+    Stops the thread started by watch.
+    """
+    if self._watcher is not None:
+      self._stop_watching.set()
+      self._watcher.join()
+      self._watcher = None
+
+  def reload_stats(self):
+    """
+    Returns:
+      dict: Change checks, reloads and failed reloads, the last, mean and max reload duration
+      in seconds, the number of cameras and whether the watcher is running.
+    """
+    with self._lock:
+      return {'checks': self.reload_checks, 'reloads': self.reloads, 'errors': self.reload_errors,
+              'last_reload_s': self.last_reload_s,
+              'mean_reload_s': self.total_reload_s / self.reloads if self.reloads else 0.0,
+              'max_reload_s': self.max_reload_s, 'cameras': len(self.camera_database),
+              'watching': self._watcher is not None}
+
+  def add_listener(self, callback):
+    """
+    Registers a callback that is called with a list of camera names whenever cameras are
+    added or overwritten, so derived data (caches, indexes) can update itself.
+
+    Args:
+      callback (callable): Called as callback(camera_names).
+    """
+    self._listeners.append(callback)
+
+  def remove_listener(self, callback):
+    """
+    Unregisters a callback added with add_listener. Unknown callbacks are ignored.
+
+    Args:
+      callback (callable): The callback to remove.
+    """
+    try:
+      self._listeners.remove(callback)
+    except ValueError:
+      pass
+
+  def _notify(self, camera_names):
+    """
+    Calls every registered listener with the changed camera names.
+    """
+    # A copy, as a listener may be removed from another thread meanwhile
+    for callback in list(self._listeners):
+      callback(camera_names)
+
+  @classmethod
+  def from_environment(cls, watch_interval=None):
+    """
+    Opens the camera database in the storage chosen by storage_from_environment: the
+    GSD_CAMERA_DATABASE environment variable, or the default camera_database.json.
+
+    Args:
+      watch_interval (Optional[float]): Reload changes from other processes every
+        watch_interval seconds.
+
+    Returns:
+      Camera_Database: The opened camera database.
+    """
+    return cls(storage_from_environment(), watch_interval=watch_interval)
 
   def get_list_cameras(self):
     """
@@ -127,11 +361,273 @@ class GSDCalculator:
     altitude_m = ( gsd_m * sensor_width_px * focal_length_m) / sensor_width_m
     return altitude_m
 
+  @staticmethod
+  def _prepare_batch(values, sensor_width_px, pixel_size_um, focal_length_mm, dtype, out, outer=True):
+    """
+        Converts batch inputs to arrays and lays them out for broadcasting.
+
+        The camera parameters are broadcast against each other to a camera shape C, the
+        altitude/GSD values keep their own shape A, and the result has shape A + C. With
+        outer=False the values are broadcast directly against the cameras instead, pairing
+        them element by element. The unit conversions are done once per camera in float64, in the same order as the
+        scalar methods, so float64 results match them exactly.
+
+        Args:
+            values (array_like): Altitudes in meters or GSDs in centimeters.
+            sensor_width_px (array_like): The sensor width(s) in pixels.
+            pixel_size_um (array_like): The sensor pixel size(s) in micrometers.
+            focal_length_mm (array_like): The sensor focal length(s) in millimeters.
+            dtype (numpy dtype): Output dtype, float32 or float64.
+            out (Optional[numpy.ndarray]): Preallocated output buffer of shape A + C.
+            outer (bool): Whether to build the A + C grid or pair values with cameras.
+
+        Returns:
+            tuple: (values, sensor_width_px, sensor_width_m, focal_length_m, out) ready for
+            in-place ufunc calls.
+
+        Raises:
+            ValueError: If dtype is not a float type or out has the wrong shape/dtype.
+        """
+    # Imported here so the scalar calculator and the CLI start without loading NumPy
+    import numpy as np
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+      raise ValueError(f"dtype must be float32 or float64, not {dtype}.")
+    sensor_width_px, pixel_size_um, focal_length_mm = np.broadcast_arrays(
+      np.asarray(sensor_width_px, dtype=np.float64), np.asarray(pixel_size_um, dtype=np.float64),
+      np.asarray(focal_length_mm, dtype=np.float64))
+    pixel_size_m = pixel_size_um * uM_TO_M # Convert micrometre to meter
+    sensor_width_m = sensor_width_px * pixel_size_m # Calculate sensor width in meters
+    focal_length_m = focal_length_mm * MM_TO_M # Convert millimeter to meter
+    values = np.asarray(values, dtype=np.float64)
+    if outer:
+      # Append one axis per camera dimension so values broadcast as A + C
+      values = values.reshape(values.shape + (1,) * sensor_width_px.ndim)
+    shape = np.broadcast_shapes(values.shape, sensor_width_px.shape)
+    if out is None:
+      out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape or out.dtype != dtype:
+      raise ValueError(f"out must have shape {shape} and dtype {dtype}, "
+                       f"got {out.shape} and {out.dtype}.")
+    if dtype != np.float64:
+      values = values.astype(dtype)
+      sensor_width_px = sensor_width_px.astype(dtype)
+      sensor_width_m = sensor_width_m.astype(dtype)
+      focal_length_m = focal_length_m.astype(dtype)
+    return values, sensor_width_px, sensor_width_m, focal_length_m, out
+
+  @staticmethod
+  def calculate_gsd_batch(altitude_m, sensor_width_px, pixel_size_um, focal_length_mm,
+                          dtype='float64', out=None, outer=True):
+    """
+        Vectorized version of calculate_gsd for arrays of altitudes and cameras.
+
+        Passing N altitudes and M-element camera parameter arrays returns an N x M grid.
+        Scalars are accepted anywhere, so a single camera with N altitudes returns N values.
+        Set outer=False to pair each altitude with the camera at the same position instead.
+
+        Args:
+            altitude_m (array_like): The flight altitude(s) in meters.
+            sensor_width_px (array_like): The sensor width(s) in pixels.
+            pixel_size_um (array_like): The sensor pixel size(s) in micrometers.
+            focal_length_mm (array_like): The sensor focal length(s) in millimeters.
+            dtype (numpy dtype): float64 (default, identical to calculate_gsd) or float32.
+            out (Optional[numpy.ndarray]): Buffer to write the result into.
+            outer (bool): Build an altitudes x cameras grid (default) or pair them element-wise.
+
+        Returns:
+            numpy.ndarray: The calculated GSDs in centimeters.
+        """
+    altitude_m, sensor_width_px, sensor_width_m, focal_length_m, out = GSDCalculator._prepare_batch(
+      altitude_m, sensor_width_px, pixel_size_um, focal_length_mm, dtype, out, outer)
+    import numpy as np
+    np.multiply(altitude_m, sensor_width_m, out=out)
+    np.divide(out, sensor_width_px * focal_length_m, out=out)
+    np.multiply(out, CM_TO_M, out=out) # Convert meter to centimeter
+    return out
+
+  @staticmethod
+  def calculate_altitude_batch(gsd_cm, sensor_width_px, pixel_size_um, focal_length_mm,
+                               dtype='float64', out=None, outer=True):
+    """
+        Vectorized version of calculate_altitude for arrays of GSDs and cameras.
+
+        Passing N GSDs and M-element camera parameter arrays returns an N x M grid.
+        Set outer=False to pair each GSD with the camera at the same position instead.
+
+        Args:
+            gsd_cm (array_like): The Ground Sampling Distance(s) in centimeters.
+            sensor_width_px (array_like): The sensor width(s) in pixels.
+            pixel_size_um (array_like): The sensor pixel size(s) in micrometers.
+            focal_length_mm (array_like): The sensor focal length(s) in millimeters.
+            dtype (numpy dtype): float64 (default, identical to calculate_altitude) or float32.
+            out (Optional[numpy.ndarray]): Buffer to write the result into.
+            outer (bool): Build a GSDs x cameras grid (default) or pair them element-wise.
+
+        Returns:
+            numpy.ndarray: The calculated flight altitudes in meters.
+        """
+    gsd_cm, sensor_width_px, sensor_width_m, focal_length_m, out = GSDCalculator._prepare_batch(
+      gsd_cm, sensor_width_px, pixel_size_um, focal_length_mm, dtype, out, outer)
+    import numpy as np
+    np.divide(gsd_cm, CM_TO_M, out=out) # Convert centimeter to meter
+    np.multiply(out, sensor_width_px, out=out)
+    np.multiply(out, focal_length_m, out=out)
+    np.divide(out, sensor_width_m, out=out)
+    return out
+
+class CompiledCamera:
+  """
+  A camera with the unit conversions of GSDCalculator done once, so repeated GSD/altitude
+  calculations only do the altitude-dependent arithmetic. Results are identical to
+  GSDCalculator.calculate_gsd and calculate_altitude, for scalars and NumPy arrays alike.
+  """
+  __slots__ = ('camera_name', 'sensor_width_px', 'sensor_width_m', 'focal_length_m', '_gsd_denominator')
+
+  def __init__(self, camera_name, camera_parameters):
+    """
+    Args:
+      camera_name (str): The name of the camera.
+      camera_parameters (dict): The parameters of the camera from the camera database.
+    """
+    self.camera_name = camera_name
+    self.sensor_width_px = camera_parameters['sensor_width_px']
+    pixel_size_m = get_pixel_size_um(camera_parameters) * uM_TO_M # Convert micrometre to meter
+    self.sensor_width_m = self.sensor_width_px * pixel_size_m # Calculate sensor width in meters
+    self.focal_length_m = camera_parameters['focal_length_mm'] * MM_TO_M # Convert millimeter to meter
+    self._gsd_denominator = self.sensor_width_px * self.focal_length_m
+
+  @property
+  def gsd_per_m(self):
+    """
+    float: GSD in centimeters per meter of altitude.
+    """
+    return self.sensor_width_m / self._gsd_denominator * CM_TO_M
+
+  @property
+  def altitude_per_cm(self):
+    """
+    float: Altitude in meters per centimeter of GSD.
+    """
+    return 1 / self.gsd_per_m
+
+  def calculate_gsd(self, altitude_m):
+    """
+    Args:
+      altitude_m (float or numpy.ndarray): The flight altitude in meters.
+
+    Returns:
+      float or numpy.ndarray: The GSD in centimeters.
+    """
+    return (altitude_m * self.sensor_width_m) / self._gsd_denominator * CM_TO_M
+
+  def calculate_altitude(self, gsd_cm):
+    """
+    Args:
+      gsd_cm (float or numpy.ndarray): The Ground Sampling Distance in centimeters.
+
+    Returns:
+      float or numpy.ndarray: The flight altitude in meters.
+    """
+    return (gsd_cm / CM_TO_M * self.sensor_width_px * self.focal_length_m) / self.sensor_width_m
+
+class CompiledCameraCache:
+  """
+  LRU cache of CompiledCamera objects keyed by camera name. Entries are dropped automatically
+  when Camera_Database.add_camera overwrites the camera.
+  """
+
+  def __init__(self, camera_database, maxsize=COMPILED_CAMERA_CACHE_SIZE):
+    """
+    Args:
+      camera_database (Camera_Database): The database to compile cameras from.
+      maxsize (int): The maximum number of compiled cameras to keep.
+    """
+    self.camera_database = camera_database
+    self.maxsize = maxsize
+    self._cache = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+    # Bumped by every invalidate, so a get that compiled from parameters read before an
+    # invalidation does not cache the stale result
+    self._generation = 0
+    camera_database.add_listener(self.invalidate)
+
+  def get(self, camera_name):
+    """
+    Gets the compiled camera for a name, compiling it on a miss.
+
+    Args:
+      camera_name (str): The name of the camera.
+
+    Returns:
+      CompiledCamera or None: The compiled camera, or None if it is not in the database.
+    """
+    with self._lock:
+      compiled = self._cache.get(camera_name)
+      if compiled is not None:
+        self._cache.move_to_end(camera_name)
+        self.hits += 1
+        return compiled
+      self.misses += 1
+      generation = self._generation
+    camera_parameters = self.camera_database.get_camera_data(camera_name)
+    if camera_parameters is None:
+      return None
+    compiled = CompiledCamera(camera_name, camera_parameters)
+    with self._lock:
+      if generation != self._generation:
+        # The camera may have changed since its parameters were read: compile again from the
+        # current parameters, under the lock so no invalidation can slip in before the insert
+        camera_parameters = self.camera_database.camera_database.get(camera_name)
+        if camera_parameters is None:
+          return None
+        compiled = CompiledCamera(camera_name, camera_parameters)
+      self._cache[camera_name] = compiled
+      self._cache.move_to_end(camera_name)
+      while len(self._cache) > self.maxsize:
+        self._cache.popitem(last=False)
+        self.evictions += 1
+    return compiled
+
+  def invalidate(self, camera_names=None):
+    """
+    Drops compiled cameras so they are rebuilt from the database on next use.
+
+    Args:
+      camera_names (Optional[Iterable[str]]): The cameras to drop, or None for all of them.
+    """
+    with self._lock:
+      self._generation += 1
+      if camera_names is None:
+        self.invalidations += len(self._cache)
+        self._cache.clear()
+        return
+      for camera_name in camera_names:
+        if self._cache.pop(camera_name, None) is not None:
+          self.invalidations += 1
+
+  def stats(self):
+    """
+    Returns:
+      dict: Hit, miss, eviction and invalidation counts, the current size and the hit rate.
+    """
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+              'invalidations': self.invalidations, 'size': len(self._cache), 'maxsize': self.maxsize,
+              'hit_rate': self.hits / lookups if lookups else 0.0}
+
 def clear_console():
     """
-    Clear console
+    Clear console with ANSI escape codes instead of spawning cls/clear. Does nothing when the
+    output is not a terminal, e.g. piped into a file.
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if sys.stdout.isatty():
+      print("\033[2J\033[H", end="", flush=True)
 
 def validate_input(user_input, min_value=None, max_value=None, expected_types=None):
     """
@@ -193,14 +689,13 @@ def add_cam(camera_database):
       camera_database (Camera_Database): The Camera_Database object to add the camera to.
 
   Returns:
-      None
+      str: The next menu state.
 
   """
   camera_name = input("Enter camera name [B for back]: ")
   if camera_name.lower() == "b":
     display_welcome_message()
-    display_menu(camera_database)
-    return
+    return MENU
 
 
   # Prompt the user to enter sensor width in pixels
@@ -209,8 +704,7 @@ def add_cam(camera_database):
     sensor_width_px = input("Enter sensor width in pixels [B for back]: ")
     if sensor_width_px.lower() == "b":
       display_welcome_message()
-      display_menu(camera_database)
-      return # return from the function if the user wants to go back
+      return MENU # return from the function if the user wants to go back
     is_valid = validate_input(sensor_width_px, min_value=1, max_value=100000, expected_types=[int])
     if is_valid:
       sensor_width_px = int(sensor_width_px)
@@ -221,8 +715,7 @@ def add_cam(camera_database):
     sensor_height_px = input("Enter sensor height in pixels [B for back]: ")
     if sensor_height_px.lower() == "b":
       display_welcome_message()
-      display_menu(camera_database)
-      return # return from the function if the user wants to go back
+      return MENU # return from the function if the user wants to go back
     is_valid = validate_input(sensor_height_px, min_value=1, max_value=100000, expected_types=[int])
     if is_valid:
       sensor_height_px = int(sensor_height_px)
@@ -233,8 +726,7 @@ def add_cam(camera_database):
     pixel_size_um = input("Enter pixel size in nanometers [B for back]: ")
     if pixel_size_um.lower() == "b":
       display_welcome_message()
-      display_menu(camera_database)
-      return
+      return MENU
     is_valid = validate_input(pixel_size_um, min_value=1, max_value=100000, expected_types=[int,float])
     if is_valid:
       pixel_size_um = float(pixel_size_um)
@@ -245,8 +737,7 @@ def add_cam(camera_database):
     focal_length_mm = input("Enter focal length in millimeters [B for back]: ")
     if focal_length_mm .lower() == "b":
       display_welcome_message()
-      display_menu(camera_database)
-      return
+      return MENU
     is_valid = validate_input(focal_length_mm, min_value=1, max_value=1500, expected_types=[int,float])
     if is_valid:
       focal_length_mm = float(focal_length_mm)
@@ -255,17 +746,19 @@ def add_cam(camera_database):
   camera_database.add_camera(camera_name, sensor_width_px, sensor_height_px, pixel_size_um, focal_length_mm)
   # Print success message
   print("Camera added successfully.")
-  display_menu(camera_database)
+  return MENU
 
 def select_camera(camera_database):
   """
-  Allows the user to select a camera from the camera database.
+  Allows the user to select a camera from the camera database. Asks again until the input is
+  a valid camera number or B.
 
   Args:
       camera_database (Camera_Database): The Camera_Database object containing the camera database.
 
   Returns:
-      tuple: A tuple containing the selected camera name and its parameters.
+      tuple or None: A tuple containing the selected camera name and its parameters, or None
+      if the user went back.
 
   """
   # List the available camera and prompt the user to select one
@@ -274,36 +767,39 @@ def select_camera(camera_database):
   print("Camera List:")
   for i in range(len(camera_list)):
     print(str(i) + ": " + camera_list[i])
-  # Prompt the user to select a camera
-  camera_index = input("Select a camera or B for back: ")
-  # Validate user input to make sure its a possitive integer
-  if camera_index.lower() == "b":
-    display_menu(camera_database)
-  if camera_index.isdigit():
+  while True:
+    # Prompt the user to select a camera
+    camera_index = input("Select a camera or B for back: ")
+    # Validate user input to make sure its a possitive integer
+    if camera_index.lower() == "b":
+      return None
+    if not camera_index.isdigit():
+      print("Invalid input. Please enter a valid number.")
+      continue
     camera_index = int(camera_index)
-  else:
-    print("Invalid input. Please enter a valid number.")
-    select_camera(camera_database)
-  if camera_index < 0 or camera_index >= len(camera_list):
-    print("Invalid camera selection.")
-    select_camera(camera_database)
-  # Get the camera object from the camera list
-  camera = camera_list[camera_index]
-  # Get camera parametzers from database
-  camera_parameters = camera_database.get_camera_data(camera)
-  # Print selected camera name and its parameters
-  print("Selected camera: " + camera + " - " + str(camera_parameters))
-  return camera, camera_parameters
+    if camera_index >= len(camera_list):
+      print("Invalid camera selection.")
+      continue
+    # Get the camera object from the camera list
+    camera = camera_list[camera_index]
+    # Get camera parametzers from database
+    camera_parameters = camera_database.get_camera_data(camera)
+    if camera_parameters is None:
+      # Removed by a reload since the list was printed
+      continue
+    # Print selected camera name and its parameters
+    print("Selected camera: " + camera + " - " + str(camera_parameters))
+    return camera, camera_parameters
 
 def list_cameras(camera_database):
   """
-  Displays the available cameras from the camera database and prompts the user to select one.
+  Displays the available cameras from the camera database.
 
   Args:
       camera_database (Camera_Database): The Camera_Database object containing the camera database.
 
   Returns:
-      None
+      str: The next menu state.
 
   """
   # List the available camera and prompt the user to select one
@@ -312,49 +808,40 @@ def list_cameras(camera_database):
   print("Camera List:")
   for i in range(len(camera_list)):
     print(str(i) + ": " + camera_list[i])
-  # Prompt the user to select a camera
+  # Prompt the user to go back
   input("Any key for back: ")
-  # Validate user input to make sure its a possitive integer
-  display_menu(camera_database)
+  return MENU
 
 def trigger_gsd_calculator(camera_database):
   """
     Triggers the GSD calculator. Prompts the user to select a camera from the database and
-    to enter the flight altitude. The function then calculates and displays the GSD.
+    to enter flight altitudes until they go back. Each GSD is calculated and displayed.
 
-    Note: This function doesn't take any arguments, so we don't have an 'Args:' section in the docstring.
+    Args:
+        camera_database (Camera_Database): The Camera_Database object containing the camera database.
 
     Returns:
-        None
+        str: The next menu state.
 
     """
   # Call select_camera function to get the camera and camera parameters
-  camera, camera_parameters = select_camera(camera_database)
+  selection = select_camera(camera_database)
+  if selection is None:
+    return MENU
+  camera, camera_parameters = selection
+  # Do the unit conversions once for all altitudes entered below
+  compiled_camera = camera_database.compiled_cameras.get(camera)
 
   # Continously prompt for new altitudes until the user writes B
-  stillWorking = 'y'
-  while stillWorking.lower() == 'y':
-      """
-    Prompts the user for a new altitude or to go back.
-
-    Returns:
-        float: The entered altitude in meters.
-    """
+  while True:
     # Promt for new altitude or to go back
-      print("Enter the altitude in meters, or B to go back: ")
-      altitude_m = input()
-      if altitude_m.lower() == "b":
-        stillWorking = 'n'
-      if altitude_m.isdigit():
-        altitude_m = float(altitude_m)
-        # Validate user input to make sure its a positive float
-        if not validate_input(altitude_m, min_value=0, max_value=2000000,
-                              expected_types=[float]):
-            return prompt_altitude()
-        calculate_gsd(altitude_m, camera_parameters)
-      else:
-        print("Invalid input.")
-
+    print("Enter the altitude in meters, or B to go back: ")
+    altitude_m = input()
+    if altitude_m.lower() == "b":
+      return MENU
+    # Validate user input to make sure its a positive float
+    if validate_input(altitude_m, min_value=0, max_value=2000000, expected_types=[float]):
+      calculate_gsd(float(altitude_m), compiled_camera)
 
 def calculate_gsd(altitude_m, camera_parameters):
       """
@@ -362,58 +849,50 @@ def calculate_gsd(altitude_m, camera_parameters):
 
       Args:
           altitude_m (float): The altitude in meters.
-          camera_parameters (dict): The parameters of the selected camera.
+          camera_parameters (dict or CompiledCamera): The parameters of the selected camera.
 
       Returns:
           None
 
       """
       # Calculate GSD for the given altitude and camera parameters
-      gsd_cm = GSDCalculator.calculate_gsd(altitude_m, camera_parameters["sensor_width_px"],
-                                           camera_parameters["pixel_size_um"],
-                                           camera_parameters["focal_length_mm"])
+      if isinstance(camera_parameters, CompiledCamera):
+        gsd_cm = camera_parameters.calculate_gsd(altitude_m)
+      else:
+        gsd_cm = GSDCalculator.calculate_gsd(altitude_m, camera_parameters["sensor_width_px"],
+                                             get_pixel_size_um(camera_parameters),
+                                             camera_parameters["focal_length_mm"])
       # Print the GSD in centimeters
       print("GSD: " + str(round(gsd_cm, 2)) + "cm" + " at altitude of: " + str(round(altitude_m,2)))
 
 def trigger_altitude_calculator(camera_database):
   """
-  Triggers the Altitude calculator.
+  Triggers the Altitude calculator. Prompts the user to select a camera from the database and
+  to enter GSDs until they go back. Each altitude is calculated and displayed.
 
   Args:
       camera_database (Camera_Database): The Camera_Database object containing the camera database.
 
   Returns:
-      None
+      str: The next menu state.
 
   """
   # Call select_camera function to get the camera and camera parameters
-  camera, camera_parameters = select_camera(camera_database)
-  stillWorking = 'y'
-  while stillWorking.lower() == 'y':
-          """
-      Prompts the user for a new GSD or to go back.
-
-      Returns:
-          float: The entered GSD in centimeters.
-
-      """
-          # Promt for new altitude or to go back
-          print("Enter a GSD [cm] or B to go back: ")
-          gsd_cm = input()
-          if gsd_cm.lower() == "b" or gsd_cm.lower() == "q":
-              stillWorking = 'n'
-          elif gsd_cm.isdigit():
-              gsd_cm = float(gsd_cm)
-              # Validate user input to make sure its a positive float
-              while not validate_input(gsd_cm, min_value=0, max_value=10000, expected_types=[float]):
-                print("Invalid GSD... value should be in meters")
-                print("Enter a GSD [cm] or B to go back: ")
-                gsd_cm = input()
-
-              calculate_alttitude(gsd_cm, camera_parameters)
-          else:
-              print("Invalid input.")
-              return prompt_gsd()
+  selection = select_camera(camera_database)
+  if selection is None:
+    return MENU
+  camera, camera_parameters = selection
+  # Do the unit conversions once for all GSDs entered below
+  compiled_camera = camera_database.compiled_cameras.get(camera)
+  while True:
+    # Promt for new GSD or to go back
+    print("Enter a GSD [cm] or B to go back: ")
+    gsd_cm = input()
+    if gsd_cm.lower() == "b" or gsd_cm.lower() == "q":
+      return MENU
+    # Validate user input to make sure its a positive float
+    if validate_input(gsd_cm, min_value=0, max_value=10000, expected_types=[float]):
+      calculate_alttitude(float(gsd_cm), compiled_camera)
 
 def calculate_alttitude(gsd_cm, camera_parameters):
         """
@@ -421,15 +900,18 @@ def calculate_alttitude(gsd_cm, camera_parameters):
 
       Args:
           gsd_cm (float): The GSD in centimeters.
-          camera_parameters (dict): The parameters of the selected camera.
+          camera_parameters (dict or CompiledCamera): The parameters of the selected camera.
 
       Returns:
           None
 
         """
         # Calculate altitude for the given gsd and camera parameters
-        altitude_m = GSDCalculator.calculate_altitude(gsd_cm, camera_parameters["sensor_width_px"],
-                                             camera_parameters["pixel_size_um"], camera_parameters["focal_length_mm"])
+        if isinstance(camera_parameters, CompiledCamera):
+          altitude_m = camera_parameters.calculate_altitude(gsd_cm)
+        else:
+          altitude_m = GSDCalculator.calculate_altitude(gsd_cm, camera_parameters["sensor_width_px"],
+                                               get_pixel_size_um(camera_parameters), camera_parameters["focal_length_mm"])
         # Print the altitudes in meters
         print("Altitude: " + str(round(altitude_m, 2)) + "m" + " at GSD of: " + str(round(gsd_cm, 2)) + " cm")
 
@@ -476,57 +958,289 @@ Program Description: {program_description}
 
 def display_menu(camera_database):
   """
-  Displays the menu for the GSD Calculator program and handles user input.
+  Displays the menu for the GSD Calculator program and handles user input until the user quits.
+
+  The menu is a state machine: every screen returns the next state instead of calling the next
+  screen, so the stack depth stays constant however long the program runs.
+
+  Args:
+      camera_database (Camera_Database): The Camera_Database object containing the camera database.
 
   Returns:
-      None
+      int: 0 when the user quits.
+
+  """
+  state = MENU
+  while state != QUIT:
+    state = MENU_SCREENS[state](camera_database)
+  return 0
 
+def main_menu(camera_database):
   """
+  Displays the menu options and reads the user's choice.
 
-  continueRunning = 'y'
-  while(continueRunning =='y'):
-      print("""Select an option from the menu below:
+  Args:
+      camera_database (Camera_Database): The Camera_Database object containing the camera database.
+
+  Returns:
+      str: The state for the chosen option.
+
+  """
+  print("""Select an option from the menu below:
     ===============================================================
     1. Calculate GSD for a given flight altitude
     2. Calculate flight altitude for a given GSD
     3. List available cameras
     4. Add a new camera
     5. Quit (q)
+    6. Show performance stats
     ===============================================================""")
-      # Prompt user for input
-      user_input = input("Enter your choice: ")
-      # Validate user input
-      if user_input == "1":
-        clear_console()
-        trigger_gsd_calculator(camera_database)
-      elif user_input == "2":
-        clear_console()
-        trigger_altitude_calculator(camera_database)
-      elif user_input == "3":
-        clear_console()
-        list_cameras(camera_database)
-      elif user_input == "4":
-        clear_console()
-        add_cam(camera_database)
-      elif user_input == "5" or user_input.lower() == "q":
-        clear_console()
-        continueRunning = 'n'
-        return 0
-      else:
-        clear_console()
-        print("\""+ user_input + "\"" + " is an invalid choice. \n")
-        display_welcome_message()
-        display_menu(camera_database)
+  # Prompt user for input
+  user_input = input("Enter your choice: ")
+  clear_console()
+  # Validate user input
+  if user_input.lower() == "q":
+    return QUIT
+  if user_input in MENU_CHOICES:
+    return MENU_CHOICES[user_input]
+  print("\""+ user_input + "\"" + " is an invalid choice. \n")
+  display_welcome_message()
+  return MENU
+
+def show_stats(camera_database):
+  """
+  Displays the instrumentation timings, memory use and the camera database cache and reload
+  statistics.
+
+  Args:
+      camera_database (Camera_Database): The Camera_Database object containing the camera database.
+
+  Returns:
+      str: The next menu state.
+  """
+  import instrumentation
+  print(instrumentation.format_stats())
+  cache = camera_database.compiled_cameras.stats()
+  print(f"Compiled camera cache: {cache['hits']} hits, {cache['misses']} misses, "
+        f"{cache['size']}/{cache['maxsize']} entries, hit rate {cache['hit_rate']:.1%}")
+  reload_stats = camera_database.reload_stats()
+  print(f"Camera database: {reload_stats['cameras']} cameras, {reload_stats['reloads']} reloads "
+        f"in {reload_stats['checks']} checks")
+  input("Any key for back: ")
+  clear_console()
+  return MENU
+
+# Menu states; display_menu runs the screen of the current state until it returns QUIT
+MENU = 'menu'
+GSD_CALCULATOR = 'gsd_calculator'
+ALTITUDE_CALCULATOR = 'altitude_calculator'
+LIST_CAMERAS = 'list_cameras'
+ADD_CAMERA = 'add_camera'
+SHOW_STATS = 'show_stats'
+QUIT = 'quit'
+MENU_SCREENS = {MENU: main_menu, GSD_CALCULATOR: trigger_gsd_calculator,
+                ALTITUDE_CALCULATOR: trigger_altitude_calculator, LIST_CAMERAS: list_cameras,
+                ADD_CAMERA: add_cam, SHOW_STATS: show_stats}
+MENU_CHOICES = {'1': GSD_CALCULATOR, '2': ALTITUDE_CALCULATOR, '3': LIST_CAMERAS, '4': ADD_CAMERA,
+                '5': QUIT, '6': SHOW_STATS}
+
+def _configure_instrumentation(extra_stats):
+  """
+  Switches instrumentation on if the environment asks for it. The module (cProfile,
+  tracemalloc) is only imported then, to keep the command line start-up fast.
+  """
+  if any(os.environ.get(name) for name in INSTRUMENTATION_VARIABLES):
+    import instrumentation
+    instrumentation.configure_from_environment(extra_stats)
+
+def _lookup_camera(camera_name):
+  """
+  Looks up one camera for a command line calculation without building a Camera_Database.
+
+  Returns:
+    dict or None: The camera parameters, or None (after printing an error) if it is unknown.
+  """
+  storage = storage_from_environment()
+  camera_parameters = storage.get(camera_name)
+  if camera_parameters is None:
+    # A storage that does not exist yet holds the example camera once Camera_Database creates it
+    camera_parameters = Camera_Database(storage).camera_database.get(camera_name)
+  if camera_parameters is None:
+    print(f"Camera {camera_name} not found in the database.", file=sys.stderr)
+  return camera_parameters
+
+def _check_bounds(values, name, min_value, max_value):
+  """
+  Returns:
+    bool: Whether all values are within the bounds; prints an error if not.
+  """
+  for value in values:
+    if not min_value <= value <= max_value:
+      print(f"Invalid {name} {value}. The value should be between {min_value} and {max_value}.", file=sys.stderr)
+      return False
+  return True
 
-def main():
+def command_gsd(args):
   """
-  Main function.
+  Prints the GSD for each altitude given on the command line.
   """
+  if not _check_bounds(args.altitude_m, 'altitude', 0, 2000000):
+    return 1
+  camera_parameters = _lookup_camera(args.camera)
+  if camera_parameters is None:
+    return 1
+  compiled_camera = CompiledCamera(args.camera, camera_parameters)
+  results = [{'camera': args.camera, 'altitude_m': altitude_m, 'gsd_cm': compiled_camera.calculate_gsd(altitude_m)}
+             for altitude_m in args.altitude_m]
+  _print_results(results, 'gsd_cm', args.json)
+  return 0
+
+def command_altitude(args):
+  """
+  Prints the flight altitude for each GSD given on the command line.
+  """
+  if not _check_bounds(args.gsd_cm, 'GSD', 0, 10000):
+    return 1
+  camera_parameters = _lookup_camera(args.camera)
+  if camera_parameters is None:
+    return 1
+  compiled_camera = CompiledCamera(args.camera, camera_parameters)
+  results = [{'camera': args.camera, 'gsd_cm': gsd_cm, 'altitude_m': compiled_camera.calculate_altitude(gsd_cm)}
+             for gsd_cm in args.gsd_cm]
+  _print_results(results, 'altitude_m', args.json)
+  return 0
+
+def _print_results(results, key, as_json):
+  if as_json:
+    import json
+    print(json.dumps(results))
+  else:
+    for result in results:
+      print(round(result[key], 2))
+
+def command_list(args):
+  """
+  Prints the camera names, one per line.
+  """
+  storage = storage_from_environment()
+  camera_names = storage.names() if storage.version() is not None else None
+  if not camera_names:
+    camera_names = Camera_Database(storage).get_list_cameras()
+  if args.json:
+    import json
+    print(json.dumps(camera_names))
+  else:
+    print("\n".join(camera_names))
+  return 0
+
+def command_add(args):
+  """
+  Adds a camera, with the same bounds as the interactive add_cam.
+  """
+  valid = (_check_bounds([args.sensor_width_px], 'sensor width', 1, 100000)
+           and _check_bounds([args.sensor_height_px], 'sensor height', 1, 100000)
+           and _check_bounds([args.pixel_size_um], 'pixel size', 1, 100000)
+           and _check_bounds([args.focal_length_mm], 'focal length', 1, 1500))
+  if not valid:
+    return 1
+  Camera_Database.from_environment().add_camera(args.camera, args.sensor_width_px, args.sensor_height_px,
+                                                args.pixel_size_um, args.focal_length_mm)
+  return 0
+
+def command_import(args):
+  """
+  Imports cameras from a CSV, JSON or JSON Lines file with camera_import.py (imports NumPy only now).
+  """
+  from camera_import import main as import_main
+  return import_main(args.import_argv, prog='main.py import')
+
+def command_serve(args):
+  """
+  Runs the HTTP service (imports Flask and NumPy only now).
+  """
+  from service import create_app
+  camera_database = Camera_Database.from_environment(watch_interval=args.reload_interval)
+  create_app(camera_database).run(host=args.host, port=args.port, threaded=True)
+  return 0
+
+def build_parser():
+  """
+  Builds the command line parser. Without a subcommand the interactive menu starts.
+
+  Returns:
+    argparse.ArgumentParser: The parser.
+  """
+  parser = argparse.ArgumentParser(description="GSD Calculator for UAV Flights. Run without a command for the interactive menu.")
+  subparsers = parser.add_subparsers(dest='command')
+  gsd_parser = subparsers.add_parser('gsd', help="GSD in cm for one or more altitudes")
+  gsd_parser.add_argument('camera', help="Camera name from the camera database")
+  gsd_parser.add_argument('altitude_m', type=float, nargs='+', help="Flight altitude(s) in meters")
+  gsd_parser.add_argument('--json', action='store_true', help="Print the full results as JSON")
+  gsd_parser.set_defaults(func=command_gsd)
+  altitude_parser = subparsers.add_parser('altitude', help="Flight altitude in meters for one or more GSDs")
+  altitude_parser.add_argument('camera', help="Camera name from the camera database")
+  altitude_parser.add_argument('gsd_cm', type=float, nargs='+', help="GSD(s) in centimeters")
+  altitude_parser.add_argument('--json', action='store_true', help="Print the full results as JSON")
+  altitude_parser.set_defaults(func=command_altitude)
+  list_parser = subparsers.add_parser('list', help="List the cameras in the database")
+  list_parser.add_argument('--json', action='store_true', help="Print the names as a JSON list")
+  list_parser.set_defaults(func=command_list)
+  add_parser = subparsers.add_parser('add', help="Add or overwrite a camera")
+  add_parser.add_argument('camera', help="Camera name")
+  add_parser.add_argument('sensor_width_px', type=int, help="Sensor width in pixels")
+  add_parser.add_argument('sensor_height_px', type=int, help="Sensor height in pixels")
+  add_parser.add_argument('pixel_size_um', type=float, help="Pixel size in micrometers")
+  add_parser.add_argument('focal_length_mm', type=float, help="Focal length in millimeters")
+  add_parser.set_defaults(func=command_add)
+  # camera_import.py parses its own arguments, including --help
+  import_parser = subparsers.add_parser('import', add_help=False,
+                                        help="Import cameras from a CSV, JSON or JSON Lines file")
+  import_parser.set_defaults(func=command_import)
+  serve_parser = subparsers.add_parser('serve', help="Run the HTTP service")
+  serve_parser.add_argument('--host', default='127.0.0.1')
+  serve_parser.add_argument('--port', type=int, default=5000)
+  serve_parser.add_argument('--reload-interval', type=float,
+                            help="Check the camera database for changes every this many seconds")
+  serve_parser.set_defaults(func=command_serve)
+  return parser
+
+def main(argv=None):
+  """
+  Main function. Runs a command line subcommand, or the interactive menu without one.
+
+  Args:
+      argv (Optional[list]): The command line arguments; sys.argv[1:] by default.
+
+  Returns:
+      int: The exit status.
+  """
+  parser = build_parser()
+  args, extra_args = parser.parse_known_args(argv)
+  if args.command == 'import':
+    args.import_argv = extra_args
+  elif extra_args:
+    parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+  camera_database = None
+  # Before the camera database is created, so its load is timed too
+  _configure_instrumentation(
+    lambda: {} if camera_database is None else {'compiled_cameras': camera_database.compiled_cameras.stats(),
+                                                 'reload': camera_database.reload_stats()})
+  if args.command is not None:
+    try:
+      status = args.func(args)
+      # Flush here, so a closed pipe is reported now rather than at interpreter exit
+      sys.stdout.flush()
+      return status
+    except BrokenPipeError:
+      # The reader stopped early, e.g. `main.py list | head -1`. Point stdout at devnull so
+      # the final flush at exit does not fail again.
+      os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+      return 0
   # Initialize camera database object
-  camera_database = Camera_Database()
+  camera_database = Camera_Database.from_environment()
 
   display_welcome_message()
-  display_menu(camera_database)
+  return display_menu(camera_database)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,183 @@
+# GSD-Calculator for UAV Flights - oblique (gimbal-tilt) per-pixel GSD maps
+#
+# GSDCalculator models a nadir camera with a single GSD. With the gimbal tilted the GSD grows
+# from the near to the far edge of the frame, so this module computes the GSD of every pixel
+# (or of every step-th pixel) for a pinhole camera over flat ground.
+#
+# Angles follow the DJI gimbal convention: pitch -90 is nadir and 0 is the horizon, roll tilts
+# the camera sideways and yaw is the heading clockwise from north. A pixel's GSD is the larger
+# of its ground footprint along the image rows and columns, so over nadir it equals
+# GSDCalculator.calculate_gsd everywhere in the frame.
+#
+# The map is computed in row tiles to bound memory and can be streamed to a .npy memory map.
+
+import argparse
+import sys
+
+import numpy as np
+
+from main import CM_TO_M, MM_TO_M, uM_TO_M, Camera_Database, get_pixel_size_um
+
+DEFAULT_TILE_ROWS = 256
+# Rays whose downward component is within this fraction of the focal length of zero count as
+# horizontal: cos(90 deg) leaves about 1e-17 instead of 0, which would give a GSD of ~1e32 cm
+HORIZON_TOLERANCE = 1e-9
+
+
+def camera_rotation(pitch_deg=-90.0, roll_deg=0.0, yaw_deg=0.0):
+  """
+  Builds the camera-to-world rotation matrix.
+
+  Camera axes: x to the right of the image, y down the image, z along the optical axis.
+  World axes: x east, y north, z up.
+
+  Args:
+    pitch_deg (float): Gimbal pitch, -90 for nadir and 0 for the horizon.
+    roll_deg (float): Gimbal roll, positive to the right.
+    yaw_deg (float): Heading, clockwise from north.
+
+  Returns:
+    numpy.ndarray: A 3x3 rotation matrix whose columns are the camera axes in world coordinates.
+  """
+  tilt = np.radians(90.0 + pitch_deg)  # Angle from nadir towards the heading
+  roll = np.radians(roll_deg)
+  yaw = np.radians(yaw_deg)
+  # Nadir, heading north: image right is east, image down is south, optical axis is down
+  nadir = np.array([[1.0, 0.0, 0.0], [0.0, -1.0, 0.0], [0.0, 0.0, -1.0]])
+  rotate_roll = np.array([[np.cos(roll), 0.0, -np.sin(roll)], [0.0, 1.0, 0.0], [np.sin(roll), 0.0, np.cos(roll)]])
+  rotate_tilt = np.array([[1.0, 0.0, 0.0], [0.0, np.cos(tilt), -np.sin(tilt)], [0.0, np.sin(tilt), np.cos(tilt)]])
+  rotate_yaw = np.array([[np.cos(yaw), np.sin(yaw), 0.0], [-np.sin(yaw), np.cos(yaw), 0.0], [0.0, 0.0, 1.0]])
+  return rotate_yaw @ rotate_tilt @ rotate_roll @ nadir
+
+
+def _gsd_tile(rows, cols, rotation, altitude_m, pixel_size_m, focal_length_m, center, dtype):
+  """
+  Computes the GSD in centimeters for a grid of pixel rows x pixel columns.
+
+  The ground point of pixel (u, v) is G = altitude * d / -d_z for the world ray direction d.
+  Its derivatives along u and v are the ground size of one pixel in each image direction.
+  """
+  u = (cols.astype(dtype) - dtype(center[0])) * dtype(pixel_size_m)
+  v = (rows.astype(dtype) - dtype(center[1])) * dtype(pixel_size_m)
+  rotation = rotation.astype(dtype)
+  a = rotation[:, 0] * dtype(pixel_size_m)  # d(ray)/du
+  b = rotation[:, 1] * dtype(pixel_size_m)  # d(ray)/dv
+  # World ray direction for every pixel, component by component to keep temporaries 2-D
+  d_x = rotation[0, 0] * u[np.newaxis, :] + rotation[0, 1] * v[:, np.newaxis] + rotation[0, 2] * dtype(focal_length_m)
+  d_y = rotation[1, 0] * u[np.newaxis, :] + rotation[1, 1] * v[:, np.newaxis] + rotation[1, 2] * dtype(focal_length_m)
+  d_z = rotation[2, 0] * u[np.newaxis, :] + rotation[2, 1] * v[:, np.newaxis] + rotation[2, 2] * dtype(focal_length_m)
+  # Rays at or above the horizon never reach the ground. The tolerance also covers the rounding
+  # of the ray in float32.
+  tolerance = max(HORIZON_TOLERANCE, 8 * np.finfo(dtype).eps) * focal_length_m
+  d_z[d_z >= -tolerance] = np.nan
+  scale = dtype(altitude_m) / (d_z * d_z)
+  # dG/du = altitude * (d * a_z - a * d_z) / d_z^2, horizontal components only
+  gsd_u = np.hypot(d_x * a[2] - a[0] * d_z, d_y * a[2] - a[1] * d_z)
+  gsd_v = np.hypot(d_x * b[2] - b[0] * d_z, d_y * b[2] - b[1] * d_z)
+  gsd = np.maximum(gsd_u, gsd_v)
+  gsd *= scale
+  gsd *= dtype(CM_TO_M)
+  return gsd
+
+
+def oblique_gsd_map(camera_parameters, altitude_m, pitch_deg=-90.0, roll_deg=0.0, yaw_deg=0.0, step=1,
+                    dtype=np.float32, tile_rows=DEFAULT_TILE_ROWS, out_path=None):
+  """
+  Computes the GSD of every step-th pixel for a tilted camera over flat ground.
+
+  Args:
+    camera_parameters (dict): The camera, as returned by Camera_Database.get_camera_data.
+    altitude_m (float): The height of the camera above ground in meters.
+    pitch_deg (float): Gimbal pitch, -90 for nadir and 0 for the horizon.
+    roll_deg (float): Gimbal roll in degrees.
+    yaw_deg (float): Heading in degrees clockwise from north (does not change the GSD).
+    step (int): Decimation; 1 computes every pixel, 4 every fourth pixel in each direction.
+    dtype (numpy dtype): np.float32 (default) or np.float64.
+    tile_rows (int): Map rows computed per tile.
+    out_path (Optional[str]): Write the map to this .npy file as a memory map instead of
+      returning an in-memory array.
+
+  Returns:
+    tuple: (gsd_map, summary). gsd_map has shape (ceil(height / step), ceil(width / step)) in
+    centimeters, NaN for pixels looking at or above the horizon. summary holds
+    'centre_gsd_cm' (None if the centre looks at or above the horizon), 'near_gsd_cm' (finest), 'far_gsd_cm' (coarsest finite) and
+    'above_horizon_fraction'.
+
+  Raises:
+    ValueError: If the altitude is not positive or step is less than 1.
+  """
+  if altitude_m <= 0:
+    raise ValueError("Altitude must be positive.")
+  if step < 1:
+    raise ValueError("step must be at least 1.")
+  dtype = np.dtype(dtype).type
+  width_px = camera_parameters['sensor_width_px']
+  height_px = camera_parameters['sensor_height_px']
+  pixel_size_m = get_pixel_size_um(camera_parameters) * uM_TO_M
+  focal_length_m = camera_parameters['focal_length_mm'] * MM_TO_M
+  rotation = camera_rotation(pitch_deg, roll_deg, yaw_deg)
+  # Pixel centres, measured from the principal point at the image centre
+  center = ((width_px - 1) / 2, (height_px - 1) / 2)
+  rows = np.arange(0, height_px, step)
+  cols = np.arange(0, width_px, step)
+
+  if out_path is None:
+    gsd_map = np.empty((len(rows), len(cols)), dtype=dtype)
+  else:
+    gsd_map = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=(len(rows), len(cols)))
+  near, far, above_horizon = np.inf, -np.inf, 0
+  for start in range(0, len(rows), tile_rows):
+    tile = _gsd_tile(rows[start:start + tile_rows], cols, rotation, altitude_m, pixel_size_m,
+                     focal_length_m, center, dtype)
+    gsd_map[start:start + len(tile)] = tile
+    finite = np.isfinite(tile)
+    above_horizon += tile.size - int(finite.sum())
+    if finite.any():
+      near = min(near, float(tile[finite].min()))
+      far = max(far, float(tile[finite].max()))
+  if out_path is not None:
+    gsd_map.flush()
+
+  centre_gsd = _gsd_tile(np.array([center[1]]), np.array([center[0]]), rotation, altitude_m,
+                         pixel_size_m, focal_length_m, center, np.float64)[0, 0]
+  summary = {'centre_gsd_cm': float(centre_gsd) if np.isfinite(centre_gsd) else None,
+             'near_gsd_cm': near if np.isfinite(near) else None,
+             'far_gsd_cm': far if np.isfinite(far) else None,
+             'above_horizon_fraction': above_horizon / gsd_map.size}
+  return gsd_map, summary
+
+
+def main(argv=None):
+  """
+  Command line entry point for oblique GSD maps.
+  """
+  parser = argparse.ArgumentParser(description="Per-pixel GSD map for a tilted camera.")
+  parser.add_argument('--camera', required=True, help="Camera name from the camera database")
+  parser.add_argument('--altitude', type=float, required=True, help="Height above ground in meters")
+  parser.add_argument('--pitch', type=float, default=-90.0, help="Gimbal pitch, -90 = nadir (default)")
+  parser.add_argument('--roll', type=float, default=0.0)
+  parser.add_argument('--yaw', type=float, default=0.0)
+  parser.add_argument('--step', type=int, default=1, help="Compute every step-th pixel")
+  parser.add_argument('--float64', action='store_true', help="Compute in float64 instead of float32")
+  parser.add_argument('-o', '--output', help="Write the map to this .npy file")
+  args = parser.parse_args(argv)
+
+  camera_parameters = Camera_Database.from_environment().get_camera_data(args.camera)
+  if camera_parameters is None:
+    return 1
+  _, summary = oblique_gsd_map(camera_parameters, args.altitude, args.pitch, args.roll, args.yaw,
+                               step=args.step, dtype=np.float64 if args.float64 else np.float32,
+                               out_path=args.output)
+  if summary['centre_gsd_cm'] is None:
+    print("Centre GSD: none, the image centre looks at or above the horizon")
+  else:
+    print(f"Centre GSD: {summary['centre_gsd_cm']:.2f} cm")
+  if summary['near_gsd_cm'] is not None:
+    print(f"Near GSD: {summary['near_gsd_cm']:.2f} cm, far GSD: {summary['far_gsd_cm']:.2f} cm")
+  if summary['above_horizon_fraction']:
+    print(f"{summary['above_horizon_fraction']:.1%} of the pixels look at or above the horizon")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,269 @@
+# GSD-Calculator for UAV Flights - process-pool sharded execution
+#
+# Spreads GSDCalculator batch computations that are too large for one core (mission libraries,
+# catalog x altitude sweeps) over a pool of worker processes.
+#
+# Each worker loads the Camera_Database once, in the pool initializer. Inputs and results do not
+# travel through pickling: the parent copies a window of the job into shared memory blocks,
+# every task names a [start, stop) slice of that window, and the worker computes the slice in
+# place. A task and its reply are a few hundred bytes whatever the shard size. Shards map to
+# fixed slices of the output, so results keep the input order however the tasks complete.
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from camera_storage import open_storage
+from main import Camera_Database, GSDCalculator, get_pixel_size_um, storage_from_environment
+
+KINDS = ('gsd', 'altitude')  # gsd: GSD (cm) from altitude (m); altitude: altitude (m) from GSD (cm)
+DEFAULT_SHARD_SIZE = 1 << 20  # Results per task
+WINDOW_SHARDS = 2  # Shards per worker in each shared memory window, so fast workers pick up slack
+
+# Worker process state, set by _init_worker
+_worker_database = None
+_worker_blocks = {}  # Shared memory block name -> SharedMemory, for the current job
+_worker_job = (None, None)  # (job id, camera parameter columns)
+
+
+def _init_worker(database_path):
+  """
+  Pool initializer: loads the camera database once per worker process.
+  """
+  global _worker_database
+  storage = storage_from_environment() if database_path is None else open_storage(database_path)
+  _worker_database = Camera_Database(storage)
+
+
+def _attach(name):
+  block = _worker_blocks.get(name)
+  if block is None:
+    block = _worker_blocks[name] = shared_memory.SharedMemory(name=name)
+  return block
+
+
+def _job_cameras(job_id, names_block, names_size):
+  """
+  Resolves the job's camera names to parameter columns, once per job in each worker.
+
+  Returns:
+    tuple: (sensor_width_px, pixel_size_um, focal_length_mm, unknown camera names).
+  """
+  global _worker_job
+  if _worker_job[0] != job_id:
+    # A new job: the parent has unlinked the previous job's blocks, so unmap them
+    for block in _worker_blocks.values():
+      block.close()
+    _worker_blocks.clear()
+    names = bytes(_attach(names_block).buf[:names_size]).decode('utf-8').split('\n')
+    cameras = _worker_database.camera_database
+    parameters = np.full((len(names), 3), np.nan)
+    unknown = []
+    for row, name in enumerate(names):
+      camera_parameters = cameras.get(name)
+      if camera_parameters is None:
+        unknown.append(name)
+      else:
+        parameters[row] = (camera_parameters['sensor_width_px'], get_pixel_size_um(camera_parameters),
+                           camera_parameters['focal_length_mm'])
+    _worker_job = (job_id, (*parameters.T, unknown))
+  return _worker_job[1]
+
+
+def _run_shard(task):
+  """
+  Computes rows [start, stop) of the current window in place.
+
+  Returns:
+    list: Camera names of the job that are not in this worker's database.
+  """
+  (job_id, kind, pairwise, dtype, names_block, names_size, values_block, cameras_block, out_block,
+   window, columns, start, stop) = task
+  sensor_width_px, pixel_size_um, focal_length_mm, unknown = _job_cameras(job_id, names_block, names_size)
+  calculate = GSDCalculator.calculate_gsd_batch if kind == 'gsd' else GSDCalculator.calculate_altitude_batch
+  values = np.ndarray(window, dtype=np.float64, buffer=_attach(values_block).buf)[start:stop]
+  if pairwise:
+    rows = np.ndarray(window, dtype=np.int32, buffer=_attach(cameras_block).buf)[start:stop]
+    out = np.ndarray(window, dtype=dtype, buffer=_attach(out_block).buf)[start:stop]
+    calculate(values, sensor_width_px[rows], pixel_size_um[rows], focal_length_mm[rows],
+              dtype=dtype, out=out, outer=False)
+  else:
+    out = np.ndarray((window, columns), dtype=dtype, buffer=_attach(out_block).buf)[start:stop]
+    calculate(values, sensor_width_px, pixel_size_um, focal_length_mm, dtype=dtype, out=out)
+  return unknown
+
+
+class ShardedExecutor:
+  """
+  Runs GSDCalculator batch computations on a process pool. Use it as a context manager, or
+  call close() when done, so the worker processes exit.
+  """
+
+  def __init__(self, workers=None, database_path=None, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Args:
+      workers (Optional[int]): Worker processes; the number of CPUs by default.
+      database_path (Optional[str]): The camera database the workers load. By default the one
+        Camera_Database.from_environment uses (GSD_CAMERA_DATABASE, or camera_database.json).
+      shard_size (int): Results computed per task.
+
+    Raises:
+      ValueError: If workers or shard_size is not positive.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers < 1 or shard_size < 1:
+      raise ValueError("workers and shard_size must be positive.")
+    self.workers = workers
+    self.shard_size = shard_size
+    self.database_path = database_path
+    self._pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(database_path,))
+    self._jobs = itertools.count()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    """
+    Shuts the worker processes down.
+    """
+    self._pool.shutdown()
+
+  def calculate_gsd(self, camera_names, altitude_m, dtype='float64', out=None):
+    """
+    Calculates the GSD for each (camera, altitude) pair.
+
+    Args:
+      camera_names (str or array_like): One camera name for every altitude, or a name per altitude.
+      altitude_m (array_like): The flight altitudes in meters.
+      dtype (numpy dtype): float64 (default) or float32.
+      out (Optional[numpy.ndarray]): One-dimensional buffer for the result, e.g. a np.memmap
+        for jobs larger than memory.
+
+    Returns:
+      numpy.ndarray: The GSDs in centimeters, in input order.
+
+    Raises:
+      ValueError: If a camera is not in the database or the inputs do not line up.
+    """
+    return self._pairwise('gsd', camera_names, altitude_m, dtype, out)
+
+  def calculate_altitude(self, camera_names, gsd_cm, dtype='float64', out=None):
+    """
+    Calculates the flight altitude for each (camera, GSD) pair.
+
+    Args:
+      camera_names (str or array_like): One camera name for every GSD, or a name per GSD.
+      gsd_cm (array_like): The Ground Sampling Distances in centimeters.
+      dtype (numpy dtype): float64 (default) or float32.
+      out (Optional[numpy.ndarray]): One-dimensional buffer for the result.
+
+    Returns:
+      numpy.ndarray: The flight altitudes in meters, in input order.
+
+    Raises:
+      ValueError: If a camera is not in the database or the inputs do not line up.
+    """
+    return self._pairwise('altitude', camera_names, gsd_cm, dtype, out)
+
+  def sweep(self, kind, values, camera_names=None, dtype='float64', out=None):
+    """
+    Calculates a values x cameras grid, like GSDCalculator's batch methods with outer=True.
+
+    Args:
+      kind (str): 'gsd' for GSDs (cm) from altitudes (m), 'altitude' for altitudes (m) from GSDs (cm).
+      values (array_like): One-dimensional altitudes or GSDs.
+      camera_names (Optional[list]): The grid columns; every camera in the database by default.
+      dtype (numpy dtype): float64 (default) or float32.
+      out (Optional[numpy.ndarray]): (len(values), len(camera_names)) buffer for the result.
+
+    Returns:
+      tuple: (grid, camera_names), the grid with one row per value and one column per camera.
+
+    Raises:
+      ValueError: If the kind is unknown or a camera is not in the database.
+    """
+    if kind not in KINDS:
+      raise ValueError(f"kind must be one of {KINDS}.")
+    if camera_names is None:
+      storage = storage_from_environment() if self.database_path is None else open_storage(self.database_path)
+      camera_names = storage.names()
+    camera_names = list(camera_names)
+    values = np.asarray(values, dtype=np.float64).ravel()
+    shape = (len(values), len(camera_names))
+    out = self._output(out, shape, dtype)
+    shard_rows = max(1, self.shard_size // max(len(camera_names), 1))
+    self._run(kind, False, camera_names, values, None, out, shard_rows)
+    return out, camera_names
+
+  def _pairwise(self, kind, camera_names, values, dtype, out):
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if isinstance(camera_names, str):
+      names, rows = [camera_names], np.zeros(len(values), dtype=np.int32)
+    else:
+      names, rows = np.unique(np.asarray(camera_names, dtype=str).ravel(), return_inverse=True)
+      names, rows = names.tolist(), rows.astype(np.int32)
+      if len(rows) != len(values):
+        raise ValueError(f"Got {len(rows)} camera names for {len(values)} values.")
+    out = self._output(out, values.shape, dtype)
+    self._run(kind, True, names, values, rows, out, self.shard_size)
+    return out
+
+  @staticmethod
+  def _output(out, shape, dtype):
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+      raise ValueError(f"dtype must be float32 or float64, not {dtype}.")
+    if out is None:
+      return np.empty(shape, dtype=dtype)
+    if out.shape != shape or out.dtype != dtype:
+      raise ValueError(f"out must have shape {shape} and dtype {dtype}, got {out.shape} and {out.dtype}.")
+    return out
+
+  def _run(self, kind, pairwise, camera_names, values, rows, out, shard_rows):
+    """
+    Streams the job through shared memory one window at a time.
+    """
+    if not len(values):
+      return
+    dtype = out.dtype
+    columns = 1 if pairwise else len(camera_names)
+    window = min(len(values), shard_rows * self.workers * WINDOW_SHARDS)
+    names = '\n'.join(camera_names).encode('utf-8')
+    sizes = [max(len(names), 1), window * 8, window * 4 if pairwise else 1, window * columns * dtype.itemsize]
+    blocks = []
+    shared_values = shared_rows = shared_out = None
+    try:
+      for size in sizes:
+        blocks.append(shared_memory.SharedMemory(create=True, size=size))
+      names_block, values_block, cameras_block, out_block = blocks
+      names_block.buf[:len(names)] = names
+      shared_values = np.ndarray(window, dtype=np.float64, buffer=values_block.buf)
+      shared_rows = np.ndarray(window, dtype=np.int32, buffer=cameras_block.buf) if pairwise else None
+      shared_out = np.ndarray((window, columns) if not pairwise else window, dtype=dtype, buffer=out_block.buf)
+      job_id = (os.getpid(), next(self._jobs))
+      for offset in range(0, len(values), window):
+        count = min(window, len(values) - offset)
+        shared_values[:count] = values[offset:offset + count]
+        if pairwise:
+          shared_rows[:count] = rows[offset:offset + count]
+        tasks = [(job_id, kind, pairwise, dtype.str, names_block.name, len(names), values_block.name,
+                  cameras_block.name, out_block.name, window, columns, start, min(start + shard_rows, count))
+                 for start in range(0, count, shard_rows)]
+        unknown = set()
+        for missing in self._pool.map(_run_shard, tasks):
+          unknown.update(missing)
+        if unknown:
+          raise ValueError(f"Cameras not in the database: {', '.join(sorted(unknown))}")
+        out[offset:offset + count] = shared_out[:count]
+    finally:
+      # Views into the blocks must go before the blocks can be closed
+      shared_values = shared_rows = shared_out = None
+      for block in blocks:
+        block.close()
+        block.unlink()
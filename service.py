@@ -0,0 +1,195 @@
+# GSD-Calculator for UAV Flights - HTTP service
+#
+# Long-running Flask service around Camera_Database and GSDCalculator. The camera database is
+# loaded once when the app is created (and reloaded on change with --reload-interval); batch endpoints compute a whole altitudes x cameras (or
+# GSDs x cameras) grid in one vectorized call.
+#
+# Run with: python service.py [--host 127.0.0.1] [--port 5000] [--reload-interval SECONDS]
+
+import argparse
+
+import numpy as np
+from flask import Flask, jsonify, request
+
+from main import Camera_Database, GSDCalculator, get_pixel_size_um
+
+# Same bounds the interactive calculators pass to validate_input
+ALTITUDE_BOUNDS = (0, 2000000)
+GSD_BOUNDS = (0, 10000)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_VALUES = 1000000  # altitudes/GSDs x cameras per batch request
+
+
+class RequestError(Exception):
+  """
+  An invalid request, reported to the client as JSON with the given HTTP status.
+  """
+
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.message = message
+    self.status = status
+
+
+def _parse_number(value, name, bounds):
+  """
+  Parses a single query value and checks it against bounds.
+  """
+  try:
+    number = float(value)
+  except (TypeError, ValueError):
+    raise RequestError(f"{name} must be a number.")
+  if not bounds[0] <= number <= bounds[1]:
+    raise RequestError(f"{name} must be between {bounds[0]} and {bounds[1]}.")
+  return number
+
+
+def _parse_array(values, name, bounds):
+  """
+  Parses a JSON list of numbers into a float64 array and checks it against bounds.
+  """
+  # JSON true/false would otherwise count as 1 and 0
+  if not isinstance(values, list) or not values or any(isinstance(value, bool) for value in values):
+    raise RequestError(f"{name} must be a non-empty list of numbers.")
+  try:
+    array = np.asarray(values, dtype=np.float64)
+  except (TypeError, ValueError, OverflowError):
+    raise RequestError(f"{name} must be a non-empty list of numbers.")
+  if array.ndim != 1:
+    raise RequestError(f"{name} must be a flat list of numbers.")
+  if not np.all((array >= bounds[0]) & (array <= bounds[1])):
+    raise RequestError(f"{name} values must be between {bounds[0]} and {bounds[1]}.")
+  return array
+
+
+def create_app(camera_database=None):
+  """
+  Creates the Flask app.
+
+  Args:
+    camera_database (Optional[Camera_Database]): The camera database to serve. Defaults to
+      Camera_Database.from_environment().
+
+  Returns:
+    Flask: The app.
+  """
+  if camera_database is None:
+    camera_database = Camera_Database.from_environment()
+  app = Flask(__name__)
+  app.config['camera_database'] = camera_database
+
+  def camera_parameters(camera_name):
+    camera = camera_database.camera_database.get(camera_name)
+    if camera is None:
+      raise RequestError(f"Camera {camera_name} not found in the database.", status=404)
+    return camera
+
+  def compiled_camera(camera_name):
+    if not camera_name:
+      raise RequestError("camera is required.")
+    # One lookup: a separate existence check could disagree after a hot reload removes the camera
+    compiled = camera_database.compiled_cameras.get(camera_name)
+    if compiled is None:
+      raise RequestError(f"Camera {camera_name} not found in the database.", status=404)
+    return compiled
+
+  def camera_arrays(camera_names):
+    if (not isinstance(camera_names, list) or not camera_names
+        or not all(isinstance(name, str) for name in camera_names)):
+      raise RequestError("cameras must be a non-empty list of camera names.")
+    cameras = [camera_parameters(name) for name in camera_names]
+    return ([camera['sensor_width_px'] for camera in cameras],
+            [get_pixel_size_um(camera) for camera in cameras],
+            [camera['focal_length_mm'] for camera in cameras])
+
+  def batch(value_name, bounds, calculate, result_name):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+      raise RequestError("Request body must be a JSON object.")
+    camera_names = body.get('cameras')
+    if camera_names is None and 'camera' in body:
+      camera_names = [body['camera']]
+    sensor_width_px, pixel_size_um, focal_length_mm = camera_arrays(camera_names)
+    values = _parse_array(body.get(value_name), value_name, bounds)
+    if len(values) * len(camera_names) > MAX_BATCH_VALUES:
+      raise RequestError(f"At most {MAX_BATCH_VALUES} values per batch request.", status=413)
+    result = calculate(values, sensor_width_px, pixel_size_um, focal_length_mm)
+    # One row per camera, one column per input value
+    return jsonify({'cameras': camera_names, value_name: values.tolist(), result_name: result.T.tolist()})
+
+  @app.errorhandler(RequestError)
+  def handle_request_error(error):
+    return jsonify({'error': error.message}), error.status
+
+  @app.get('/cameras')
+  def list_cameras():
+    try:
+      offset = int(request.args.get('offset', 0))
+      limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+      raise RequestError("offset and limit must be integers.")
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+      raise RequestError(f"offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}.")
+    camera_list = camera_database.get_list_cameras()
+    page = camera_list[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(camera_list) else None
+    return jsonify({'cameras': page, 'total': len(camera_list), 'offset': offset, 'limit': limit,
+                    'next_offset': next_offset})
+
+  @app.get('/cameras/<path:camera_name>')
+  def get_camera(camera_name):
+    camera = camera_parameters(camera_name)
+    return jsonify({'camera': camera_name, 'sensor_width_px': camera['sensor_width_px'],
+                    'sensor_height_px': camera['sensor_height_px'],
+                    'pixel_size_um': get_pixel_size_um(camera), 'focal_length_mm': camera['focal_length_mm']})
+
+  @app.get('/gsd')
+  def gsd():
+    camera_name = request.args.get('camera')
+    altitude_m = _parse_number(request.args.get('altitude_m'), 'altitude_m', ALTITUDE_BOUNDS)
+    camera = compiled_camera(camera_name)
+    return jsonify({'camera': camera_name, 'altitude_m': altitude_m,
+                    'gsd_cm': camera.calculate_gsd(altitude_m)})
+
+  @app.get('/altitude')
+  def altitude():
+    camera_name = request.args.get('camera')
+    gsd_cm = _parse_number(request.args.get('gsd_cm'), 'gsd_cm', GSD_BOUNDS)
+    camera = compiled_camera(camera_name)
+    return jsonify({'camera': camera_name, 'gsd_cm': gsd_cm,
+                    'altitude_m': camera.calculate_altitude(gsd_cm)})
+
+  @app.get('/stats')
+  def stats():
+    return jsonify({'reload': camera_database.reload_stats(),
+                    'compiled_cameras': camera_database.compiled_cameras.stats()})
+
+  @app.post('/gsd/batch')
+  def gsd_batch():
+    return batch('altitude_m', ALTITUDE_BOUNDS, GSDCalculator.calculate_gsd_batch, 'gsd_cm')
+
+  @app.post('/altitude/batch')
+  def altitude_batch():
+    return batch('gsd_cm', GSD_BOUNDS, GSDCalculator.calculate_altitude_batch, 'altitude_m')
+
+  return app
+
+
+def main(argv=None):
+  """
+  Runs the service with Flask's threaded server.
+  """
+  parser = argparse.ArgumentParser(description="Serve GSD/altitude calculations over HTTP.")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=5000)
+  parser.add_argument('--reload-interval', type=float,
+                      help="Check the camera database for changes every this many seconds")
+  args = parser.parse_args(argv)
+  camera_database = Camera_Database.from_environment(watch_interval=args.reload_interval)
+  create_app(camera_database).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,111 @@
+# GSD-Calculator for UAV Flights - local load test for service.py
+#
+# Starts the service in-process (or targets --url) and hammers the single and batch endpoints
+# from several client threads, reporting requests/sec and p50/p99 latency for each.
+#
+# Run with: python service_loadtest.py [--clients 8] [--duration 5] [--url http://host:port]
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+
+def _client(host, port, make_request, deadline):
+  """
+  Sends requests over one keep-alive connection until the deadline and returns the latencies.
+  """
+  connection = http.client.HTTPConnection(host, port)
+  latencies = []
+  errors = 0
+  while time.perf_counter() < deadline:
+    method, path, body = make_request()
+    start = time.perf_counter()
+    connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    latencies.append(time.perf_counter() - start)
+    if response.status != 200:
+      errors += 1
+  connection.close()
+  return latencies, errors
+
+
+def run_scenario(name, host, port, make_request, clients, duration):
+  """
+  Runs one scenario with the given number of concurrent clients and prints its results.
+
+  Returns:
+    dict: requests, errors, requests/sec and p50/p99 latency in milliseconds.
+  """
+  deadline = time.perf_counter() + duration
+  with ThreadPoolExecutor(max_workers=clients) as executor:
+    results = list(executor.map(lambda _: _client(host, port, make_request, deadline), range(clients)))
+  latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+  errors = sum(client_errors for _, client_errors in results)
+  quantiles = statistics.quantiles(latencies, n=100)
+  report = {'requests': len(latencies), 'errors': errors, 'requests_per_s': len(latencies) / duration,
+            'p50_ms': quantiles[49] * 1000, 'p99_ms': quantiles[98] * 1000}
+  print(f"{name:<28} {report['requests_per_s']:>10.0f} req/s   p50 {report['p50_ms']:7.2f} ms   "
+        f"p99 {report['p99_ms']:7.2f} ms   ({report['requests']} requests, {errors} errors)")
+  return report
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Load test the GSD HTTP service.")
+  parser.add_argument('--url', help="Service to test; by default one is started in-process")
+  parser.add_argument('--clients', type=int, default=8, help="Concurrent client connections")
+  parser.add_argument('--duration', type=float, default=5.0, help="Seconds per scenario")
+  parser.add_argument('--batch-size', type=int, default=1000, help="Altitudes per batch request")
+  args = parser.parse_args(argv)
+
+  server = None
+  if args.url is None:
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from service import create_app
+
+    class KeepAliveHandler(WSGIRequestHandler):
+      protocol_version = 'HTTP/1.1'
+
+      def log_request(self, *args, **kwargs):
+        pass
+
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = '127.0.0.1', server.server_port
+  else:
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+
+  connection = http.client.HTTPConnection(host, port)
+  connection.request('GET', '/cameras?limit=1000')
+  cameras = json.loads(connection.getresponse().read())['cameras']
+  connection.close()
+  altitudes = [round(random.uniform(20, 120), 2) for _ in range(args.batch_size)]
+
+  def single_gsd():
+    return 'GET', f"/gsd?camera={quote(random.choice(cameras))}&altitude_m={random.uniform(20, 120):.2f}", None
+
+  def single_altitude():
+    return 'GET', f"/altitude?camera={quote(random.choice(cameras))}&gsd_cm={random.uniform(0.5, 5):.2f}", None
+
+  def batch_gsd():
+    return 'POST', '/gsd/batch', json.dumps({'cameras': cameras, 'altitude_m': altitudes})
+
+  print(f"{args.clients} clients, {args.duration:g}s per scenario, {len(cameras)} cameras")
+  run_scenario('GET /gsd', host, port, single_gsd, args.clients, args.duration)
+  run_scenario('GET /altitude', host, port, single_altitude, args.clients, args.duration)
+  report = run_scenario(f'POST /gsd/batch ({args.batch_size}x{len(cameras)})', host, port, batch_gsd,
+                        args.clients, args.duration)
+  print(f"{'':<28} {report['requests_per_s'] * args.batch_size * len(cameras):>10.0f} GSDs/s in batch")
+  if server is not None:
+    server.shutdown()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,187 @@
+# GSD-Calculator for UAV Flights - area survey planner
+#
+# For a survey polygon and a target GSD with forward/side overlap, computes the flight altitude,
+# image footprint, trigger distance, flight-line spacing and count, photo count and raw data
+# volume for every camera in the catalog at once, and ranks the cameras on the result.
+#
+# The polygon is given in a local metric coordinate system (e.g. UTM eastings/northings).
+# Flight lines run along heading_deg (0 = along the x axis) and the sensor width is across track.
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from camera_catalog import CameraCatalog
+from main import CM_TO_M, Camera_Database, GSDCalculator
+
+DEFAULT_FORWARD_OVERLAP = 0.8
+DEFAULT_SIDE_OVERLAP = 0.7
+DEFAULT_BYTES_PER_PIXEL = 3  # 8-bit RGB, uncompressed
+
+RANK_KEYS = ('photos', 'flight_distance_m', 'storage_bytes', 'lines')
+
+
+def polygon_area_m2(polygon):
+  """
+  Calculates the area of a simple polygon with the shoelace formula.
+
+  Args:
+    polygon (array_like): (n, 2) vertices in meters.
+
+  Returns:
+    float: The area in square meters.
+  """
+  x, y = np.asarray(polygon, dtype=np.float64).T
+  return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def polygon_extent_m(polygon, heading_deg=0.0):
+  """
+  Calculates the extent of a polygon along and across a flight heading.
+
+  Args:
+    polygon (array_like): (n, 2) vertices in meters.
+    heading_deg (float): The flight-line direction, counter-clockwise from the x axis.
+
+  Returns:
+    tuple: (along_track_m, across_track_m).
+  """
+  vertices = np.asarray(polygon, dtype=np.float64)
+  heading = np.radians(heading_deg)
+  along = vertices @ np.array([np.cos(heading), np.sin(heading)])
+  across = vertices @ np.array([-np.sin(heading), np.cos(heading)])
+  return float(np.ptp(along)), float(np.ptp(across))
+
+
+def plan_survey(catalog, polygon, target_gsd_cm, forward_overlap=DEFAULT_FORWARD_OVERLAP,
+                side_overlap=DEFAULT_SIDE_OVERLAP, heading_deg=0.0, bytes_per_pixel=DEFAULT_BYTES_PER_PIXEL):
+  """
+  Plans a survey of a polygon for every camera in a catalog.
+
+  target_gsd_cm, forward_overlap and side_overlap are broadcast against each other to a scenario
+  shape P, so passing np.ix_(gsds, forward_overlaps, side_overlaps) sweeps the full grid. Every
+  result array has shape P + (len(catalog),).
+
+  The total flight-line length is approximated by area / line spacing, which is exact for
+  rectangles aligned with the heading and close for convex polygons; every line adds one photo.
+
+  Args:
+    catalog (CameraCatalog): The cameras to plan for.
+    polygon (array_like): (n, 2) survey area vertices in meters.
+    target_gsd_cm (array_like): Target GSD(s) in centimeters.
+    forward_overlap (array_like): Forward (along-track) overlap fraction(s), 0 <= overlap < 1.
+    side_overlap (array_like): Side (across-track) overlap fraction(s), 0 <= overlap < 1.
+    heading_deg (float): The flight-line direction, counter-clockwise from the x axis.
+    bytes_per_pixel (float): Stored bytes per pixel, for the data volume estimate.
+
+  Returns:
+    dict: 'names' plus arrays 'altitude_m', 'footprint_width_m', 'footprint_height_m',
+    'line_spacing_m', 'trigger_distance_m', 'lines', 'photos', 'flight_distance_m' and
+    'storage_bytes'.
+
+  Raises:
+    ValueError: If an overlap is outside [0, 1) or a target GSD is not positive.
+  """
+  target_gsd_cm, forward_overlap, side_overlap = np.broadcast_arrays(
+    np.asarray(target_gsd_cm, dtype=np.float64), np.asarray(forward_overlap, dtype=np.float64),
+    np.asarray(side_overlap, dtype=np.float64))
+  if np.any(target_gsd_cm <= 0):
+    raise ValueError("Target GSD must be positive.")
+  if np.any((forward_overlap < 0) | (forward_overlap >= 1) | (side_overlap < 0) | (side_overlap >= 1)):
+    raise ValueError("Overlaps must be fractions between 0 (inclusive) and 1 (exclusive).")
+  area_m2 = polygon_area_m2(polygon)
+  _, across_track_m = polygon_extent_m(polygon, heading_deg)
+
+  # Append the camera axis to the scenario parameters
+  gsd_m = (target_gsd_cm / CM_TO_M)[..., np.newaxis]
+  forward_overlap = forward_overlap[..., np.newaxis]
+  side_overlap = side_overlap[..., np.newaxis]
+
+  altitude_m = GSDCalculator.calculate_altitude_batch(target_gsd_cm, catalog.sensor_width_px,
+                                                      catalog.pixel_size_um, catalog.focal_length_mm)
+  footprint_width_m = catalog.sensor_width_px * gsd_m
+  footprint_height_m = catalog.sensor_height_px * gsd_m
+  line_spacing_m = footprint_width_m * (1 - side_overlap)
+  trigger_distance_m = footprint_height_m * (1 - forward_overlap)
+  lines = np.ceil(across_track_m / line_spacing_m) + 1
+  line_length_m = area_m2 / line_spacing_m
+  photos = np.ceil(line_length_m / trigger_distance_m) + lines
+  # Survey lines plus the transits between neighbouring lines
+  flight_distance_m = line_length_m + (lines - 1) * line_spacing_m
+  storage_bytes = photos * (catalog.sensor_width_px.astype(np.float64) * catalog.sensor_height_px) * bytes_per_pixel
+  return {'names': catalog.names, 'altitude_m': altitude_m, 'footprint_width_m': footprint_width_m,
+          'footprint_height_m': footprint_height_m, 'line_spacing_m': line_spacing_m,
+          'trigger_distance_m': trigger_distance_m, 'lines': lines.astype(np.int64),
+          'photos': photos.astype(np.int64), 'flight_distance_m': flight_distance_m,
+          'storage_bytes': storage_bytes}
+
+
+def rank_cameras(plan, by='photos', min_altitude_m=None, max_altitude_m=None):
+  """
+  Ranks the cameras of a single-scenario plan.
+
+  Args:
+    plan (dict): A plan_survey result for scalar GSD/overlap inputs.
+    by (str): The result to sort on, ascending: one of RANK_KEYS.
+    min_altitude_m (Optional[float]): Drop cameras that would have to fly lower than this.
+    max_altitude_m (Optional[float]): Drop cameras that would have to fly higher than this.
+
+  Returns:
+    list: Dicts with the camera name and its plan values, best first.
+
+  Raises:
+    ValueError: If by is not a rankable key or the plan covers more than one scenario.
+  """
+  if by not in RANK_KEYS:
+    raise ValueError(f"Can only rank by one of {RANK_KEYS}.")
+  if plan['altitude_m'].ndim != 1:
+    raise ValueError("rank_cameras expects a plan for a single GSD/overlap scenario.")
+  feasible = np.ones(len(plan['names']), dtype=bool)
+  if min_altitude_m is not None:
+    feasible &= plan['altitude_m'] >= min_altitude_m
+  if max_altitude_m is not None:
+    feasible &= plan['altitude_m'] <= max_altitude_m
+  rows = np.flatnonzero(feasible)
+  # Ties are broken by flight distance
+  rows = rows[np.lexsort((plan['flight_distance_m'][rows], plan[by][rows]))]
+  keys = [key for key in plan if key != 'names']
+  return [{'camera': plan['names'][row], **{key: plan[key][row].item() for key in keys}} for row in rows]
+
+
+def main(argv=None):
+  """
+  Command line entry point for the survey planner.
+  """
+  parser = argparse.ArgumentParser(description="Plan an area survey for every camera in the database.")
+  parser.add_argument('polygon', help="JSON file with a list of [x, y] vertices in meters")
+  parser.add_argument('--gsd', type=float, required=True, help="Target GSD in cm")
+  parser.add_argument('--forward-overlap', type=float, default=DEFAULT_FORWARD_OVERLAP)
+  parser.add_argument('--side-overlap', type=float, default=DEFAULT_SIDE_OVERLAP)
+  parser.add_argument('--heading', type=float, default=0.0, help="Flight-line direction in degrees from the x axis")
+  parser.add_argument('--min-altitude', type=float, help="Lowest allowed altitude in meters")
+  parser.add_argument('--max-altitude', type=float, help="Highest allowed altitude in meters")
+  parser.add_argument('--rank-by', choices=RANK_KEYS, default='photos')
+  parser.add_argument('--bytes-per-pixel', type=float, default=DEFAULT_BYTES_PER_PIXEL)
+  parser.add_argument('--top', type=int, default=10, help="Number of cameras to show")
+  args = parser.parse_args(argv)
+
+  with open(args.polygon) as f:
+    polygon = json.load(f)
+  catalog = CameraCatalog.from_camera_database(Camera_Database.from_environment())
+  plan = plan_survey(catalog, polygon, args.gsd, args.forward_overlap, args.side_overlap,
+                     args.heading, args.bytes_per_pixel)
+  ranking = rank_cameras(plan, args.rank_by, args.min_altitude, args.max_altitude)
+  print(f"Area: {polygon_area_m2(polygon) / 1e4:.2f} ha, target GSD {args.gsd} cm, "
+        f"{len(ranking)} of {len(catalog)} cameras within the altitude limits")
+  for row in ranking[:args.top]:
+    print(f"{row['camera']}: altitude {row['altitude_m']:.1f} m, footprint {row['footprint_width_m']:.1f} x "
+          f"{row['footprint_height_m']:.1f} m, trigger every {row['trigger_distance_m']:.1f} m, "
+          f"{row['lines']} lines {row['line_spacing_m']:.1f} m apart, {row['photos']} photos, "
+          f"{row['flight_distance_m'] / 1000:.2f} km, {row['storage_bytes'] / 1e9:.2f} GB")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,217 @@
+# GSD-Calculator for UAV Flights - terrain-aware GSD rasters
+#
+# GSDCalculator assumes the altitude is the height above ground. Over hilly sites the height
+# above ground varies with the terrain, so this module takes a flight altitude above mean sea
+# level (or one altitude per DEM row, i.e. per flight line) and a DEM, and writes a per-cell
+# GSD raster plus a raster flagging cells coarser than a target GSD.
+#
+# The DEM and the output rasters are memory-mapped and processed tile by tile on a process
+# pool, so peak memory depends on the tile size, not on the size of the DEM.
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from main import Camera_Database, GSDCalculator, get_pixel_size_um
+
+DEFAULT_TILE_SIZE = 1024
+
+# Per-process state set up by _init_worker: the memory-mapped inputs and outputs
+_worker = {}
+
+
+def open_dem(path, shape=None, dtype=np.float32):
+  """
+  Memory-maps a DEM.
+
+  Args:
+    path (str): A .npy file, or a raw binary grid (row-major) if shape is given.
+    shape (Optional[tuple]): (rows, cols) of a raw grid.
+    dtype (numpy dtype): The element type of a raw grid.
+
+  Returns:
+    numpy.memmap: The read-only DEM.
+
+  Raises:
+    ValueError: If a raw grid has no shape or its size does not match the shape.
+  """
+  if path.lower().endswith('.npy'):
+    dem = np.load(path, mmap_mode='r')
+  else:
+    if shape is None:
+      raise ValueError("A raw DEM needs its shape (rows, cols).")
+    expected = shape[0] * shape[1] * np.dtype(dtype).itemsize
+    if os.path.getsize(path) != expected:
+      raise ValueError(f"{path} is {os.path.getsize(path)} bytes, expected {expected} for shape {shape}.")
+    dem = np.memmap(path, dtype=dtype, mode='r', shape=tuple(shape))
+  if dem.ndim != 2:
+    raise ValueError(f"DEM must be 2-dimensional, got shape {dem.shape}.")
+  return dem
+
+
+def iter_tiles(shape, tile_size):
+  """
+  Splits a raster shape into tiles.
+
+  Args:
+    shape (tuple): (rows, cols) of the raster.
+    tile_size (int): The maximum rows and columns per tile.
+
+  Yields:
+    tuple: (row_start, row_stop, col_start, col_stop) of each tile.
+  """
+  rows, cols = shape
+  for row_start in range(0, rows, tile_size):
+    for col_start in range(0, cols, tile_size):
+      yield row_start, min(row_start + tile_size, rows), col_start, min(col_start + tile_size, cols)
+
+
+def _init_worker(dem_args, gsd_path, exceed_path, altitude_amsl_m, camera, target_gsd_cm, nodata):
+  """
+  Opens the memory maps once per worker process.
+  """
+  _worker['dem'] = open_dem(*dem_args)
+  _worker['gsd'] = np.load(gsd_path, mmap_mode='r+')
+  _worker['exceed'] = None if exceed_path is None else np.load(exceed_path, mmap_mode='r+')
+  _worker['altitude_amsl_m'] = altitude_amsl_m
+  _worker['camera'] = camera
+  _worker['target_gsd_cm'] = target_gsd_cm
+  _worker['nodata'] = nodata
+
+
+def _process_tile(tile):
+  """
+  Computes one tile of the GSD (and exceedance) raster and returns its partial statistics.
+  """
+  row_start, row_stop, col_start, col_stop = tile
+  dem = np.asarray(_worker['dem'][row_start:row_stop, col_start:col_stop], dtype=np.float64)
+  altitude_amsl_m = _worker['altitude_amsl_m']
+  if np.ndim(altitude_amsl_m) == 1:
+    # One altitude per flight line (DEM row)
+    altitude_amsl_m = altitude_amsl_m[row_start:row_stop, np.newaxis]
+  height_above_ground_m = altitude_amsl_m - dem
+  # Cells without terrain data or at/above the flight altitude have no GSD
+  invalid = height_above_ground_m <= 0
+  if _worker['nodata'] is not None:
+    invalid |= dem == _worker['nodata']
+  height_above_ground_m[invalid] = np.nan
+
+  gsd = _worker['gsd'][row_start:row_stop, col_start:col_stop]
+  sensor_width_px, pixel_size_um, focal_length_mm = _worker['camera']
+  GSDCalculator.calculate_gsd_batch(height_above_ground_m, sensor_width_px, pixel_size_um,
+                                    focal_length_mm, dtype=np.float32, out=gsd)
+  valid = ~np.isnan(gsd)
+  stats = {'cells': int(valid.sum()), 'sum': float(gsd[valid].sum(dtype=np.float64)),
+           'min': float(gsd[valid].min()) if valid.any() else np.inf,
+           'max': float(gsd[valid].max()) if valid.any() else -np.inf, 'exceed': 0}
+  if _worker['target_gsd_cm'] is not None:
+    exceed = valid & (gsd > _worker['target_gsd_cm'])
+    stats['exceed'] = int(exceed.sum())
+    if _worker['exceed'] is not None:
+      _worker['exceed'][row_start:row_stop, col_start:col_stop] = exceed
+  return stats
+
+
+def terrain_gsd_raster(dem_path, camera_parameters, altitude_amsl_m, gsd_path, target_gsd_cm=None,
+                       exceed_path=None, dem_shape=None, dem_dtype=np.float32, nodata=None,
+                       tile_size=DEFAULT_TILE_SIZE, workers=None):
+  """
+  Writes a per-cell GSD raster for a flight over a DEM.
+
+  Args:
+    dem_path (str): The DEM, as .npy or a raw grid (see open_dem).
+    camera_parameters (dict): The camera, as returned by Camera_Database.get_camera_data.
+    altitude_amsl_m (float or array_like): The flight altitude above mean sea level in meters,
+      or one altitude per DEM row for a per-line profile.
+    gsd_path (str): The .npy file to write the float32 GSD raster (cm) to. Cells without a
+      valid height above ground are NaN.
+    target_gsd_cm (Optional[float]): Cells with a GSD above this are counted as exceeding it.
+    exceed_path (Optional[str]): The .npy file to write the exceedance raster (uint8, 1 where
+      the GSD exceeds target_gsd_cm) to.
+    dem_shape (Optional[tuple]): (rows, cols) of a raw DEM.
+    dem_dtype (numpy dtype): The element type of a raw DEM.
+    nodata (Optional[float]): DEM value marking cells without data.
+    tile_size (int): The maximum rows and columns per tile.
+    workers (Optional[int]): The number of worker processes (default: os.cpu_count()).
+
+  Returns:
+    dict: Valid cell count, min/mean/max GSD and the number of cells exceeding the target.
+
+  Raises:
+    ValueError: If the altitude profile does not have one value per DEM row, or an exceedance
+      raster is requested without a target GSD.
+  """
+  dem = open_dem(dem_path, dem_shape, dem_dtype)
+  altitude_amsl_m = np.asarray(altitude_amsl_m, dtype=np.float64)
+  if altitude_amsl_m.ndim == 1 and len(altitude_amsl_m) != dem.shape[0]:
+    raise ValueError(f"Altitude profile has {len(altitude_amsl_m)} values, DEM has {dem.shape[0]} rows.")
+  if altitude_amsl_m.ndim > 1:
+    raise ValueError("altitude_amsl_m must be a single altitude or one altitude per DEM row.")
+  if exceed_path is not None and target_gsd_cm is None:
+    raise ValueError("An exceedance raster needs a target GSD.")
+  # Create the outputs on disk; workers reopen them as memory maps
+  np.lib.format.open_memmap(gsd_path, mode='w+', dtype=np.float32, shape=dem.shape).flush()
+  if exceed_path is not None:
+    np.lib.format.open_memmap(exceed_path, mode='w+', dtype=np.uint8, shape=dem.shape).flush()
+  camera = (camera_parameters['sensor_width_px'], get_pixel_size_um(camera_parameters),
+            camera_parameters['focal_length_mm'])
+  initargs = ((dem_path, dem_shape, dem_dtype), gsd_path, exceed_path, altitude_amsl_m, camera,
+              target_gsd_cm, nodata)
+
+  totals = {'cells': 0, 'sum': 0.0, 'min': np.inf, 'max': -np.inf, 'exceed': 0}
+  with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+    for stats in executor.map(_process_tile, iter_tiles(dem.shape, tile_size), chunksize=4):
+      totals['cells'] += stats['cells']
+      totals['sum'] += stats['sum']
+      totals['min'] = min(totals['min'], stats['min'])
+      totals['max'] = max(totals['max'], stats['max'])
+      totals['exceed'] += stats['exceed']
+  cells = totals['cells']
+  return {'cells': cells, 'min_gsd_cm': totals['min'] if cells else None,
+          'mean_gsd_cm': totals['sum'] / cells if cells else None,
+          'max_gsd_cm': totals['max'] if cells else None,
+          'exceed_cells': totals['exceed'] if target_gsd_cm is not None else None}
+
+
+def main(argv=None):
+  """
+  Command line entry point for terrain-aware GSD rasters.
+  """
+  parser = argparse.ArgumentParser(description="Compute a per-cell GSD raster over a DEM.")
+  parser.add_argument('dem', help="DEM as .npy, or a raw float32 grid with --shape")
+  parser.add_argument('--camera', required=True, help="Camera name from the camera database")
+  altitude = parser.add_mutually_exclusive_group(required=True)
+  altitude.add_argument('--altitude', type=float, help="Flight altitude AMSL in meters")
+  altitude.add_argument('--altitude-profile', help=".npy or text file with one altitude AMSL per DEM row")
+  parser.add_argument('-o', '--output', required=True, help="GSD raster (.npy, float32, cm)")
+  parser.add_argument('--target-gsd', type=float, help="Target GSD in cm")
+  parser.add_argument('--exceed-output', help="Raster of cells exceeding --target-gsd (.npy, uint8)")
+  parser.add_argument('--shape', type=int, nargs=2, metavar=('ROWS', 'COLS'), help="Shape of a raw DEM")
+  parser.add_argument('--nodata', type=float, help="DEM nodata value")
+  parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE)
+  parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+  args = parser.parse_args(argv)
+
+  camera_parameters = Camera_Database.from_environment().get_camera_data(args.camera)
+  if camera_parameters is None:
+    return 1
+  if args.altitude_profile is None:
+    altitude_amsl_m = args.altitude
+  elif args.altitude_profile.lower().endswith('.npy'):
+    altitude_amsl_m = np.load(args.altitude_profile)
+  else:
+    altitude_amsl_m = np.loadtxt(args.altitude_profile, ndmin=1)
+  summary = terrain_gsd_raster(args.dem, camera_parameters, altitude_amsl_m, args.output,
+                               target_gsd_cm=args.target_gsd, exceed_path=args.exceed_output,
+                               dem_shape=args.shape, nodata=args.nodata, tile_size=args.tile_size,
+                               workers=args.workers)
+  for key, value in summary.items():
+    print(f"{key}: {value}")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,57 @@
+# Tests for the chunked batch processing in batch_mode.py
+
+import io
+import unittest
+
+from batch_mode import BatchJob, read_jsonl_rows
+
+CAMERA = {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27, 'focal_length_mm': 35}
+
+
+class RecordingDatabase:
+  """
+  Stands in for Camera_Database and records the names it is asked for.
+  """
+
+  def __init__(self, cameras):
+    self.cameras = cameras
+    self.lookups = []
+
+  def get_camera_data(self, camera_name):
+    self.lookups.append(camera_name)
+    return self.cameras.get(camera_name)
+
+
+class ProcessChunkTest(unittest.TestCase):
+
+  def process(self, text):
+    database = RecordingDatabase({'P1': CAMERA})
+    chunk = list(read_jsonl_rows(io.StringIO(text)))
+    return BatchJob(database).process_chunk(chunk), database.lookups
+
+  def test_malformed_rows_are_not_looked_up(self):
+    (results, rejects), lookups = self.process('{bad\n{"camera_name": "P1", "altitude_m": 100}\n')
+    self.assertEqual(lookups, ['P1'])
+    self.assertEqual(len(results), 1)
+    self.assertTrue(rejects[0][4].startswith("invalid JSON"))
+
+  def test_only_malformed_rows(self):
+    (results, rejects), lookups = self.process('{bad\n[1]\n')
+    self.assertEqual((results, lookups), ([], []))
+    self.assertEqual(len(rejects), 2)
+
+  def test_booleans_are_rejected(self):
+    (results, rejects), _ = self.process('{"camera_name": "P1", "altitude_m": true}\n'
+                                         '{"camera_name": "P1", "gsd_cm": false}\n')
+    self.assertEqual(results, [])
+    self.assertEqual([reject[4] for reject in rejects], ["missing or invalid altitude_m/gsd_cm"] * 2)
+
+  def test_oversized_integers_are_rejected(self):
+    (results, rejects), _ = self.process('{"camera_name": "P1", "altitude_m": 1%s}\n'
+                                         '{"camera_name": "P1", "altitude_m": 100}\n' % ('0' * 400))
+    self.assertEqual(len(results), 1)
+    self.assertEqual(rejects[0][4], "missing or invalid altitude_m/gsd_cm")
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,75 @@
+# Tests for the vectorized GSDCalculator batch API in main.py
+
+import unittest
+
+import numpy as np
+
+from main import GSDCalculator
+
+WIDTHS = [8192, 5280, 4000]
+PIXEL_SIZES = [4.27, 3.3, 2.4]
+FOCAL_LENGTHS = [35.0, 12.29, 8.8]
+ALTITUDES = [0.5, 60.0, 120.0, 433.3]
+GSDS = [0.1, 1.0, 2.5, 7.77]
+
+
+class BatchCalculatorTest(unittest.TestCase):
+
+  def scalar_grid(self, calculate, values):
+    return [[calculate(value, width, pixel_size, focal_length)
+             for width, pixel_size, focal_length in zip(WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS)] for value in values]
+
+  def test_outer_grid_matches_scalar_exactly(self):
+    for batch, scalar, values in ((GSDCalculator.calculate_gsd_batch, GSDCalculator.calculate_gsd, ALTITUDES),
+                                  (GSDCalculator.calculate_altitude_batch, GSDCalculator.calculate_altitude, GSDS)):
+      with self.subTest(batch=batch.__name__):
+        result = batch(values, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS)
+        self.assertEqual(result.shape, (len(values), len(WIDTHS)))
+        self.assertEqual(result.dtype, np.float64)
+        self.assertEqual(result.tolist(), self.scalar_grid(scalar, values))
+
+  def test_pairwise(self):
+    result = GSDCalculator.calculate_gsd_batch(ALTITUDES[:3], WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS, outer=False)
+    self.assertEqual(result.tolist(), [GSDCalculator.calculate_gsd(*row) for row in
+                                       zip(ALTITUDES, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS)])
+    with self.assertRaises(ValueError):
+      GSDCalculator.calculate_gsd_batch(ALTITUDES, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS, outer=False)
+
+  def test_broadcasting(self):
+    # One camera, many altitudes
+    result = GSDCalculator.calculate_gsd_batch(ALTITUDES, 8192, 4.27, 35.0)
+    self.assertEqual(result.shape, (len(ALTITUDES),))
+    self.assertEqual(result.tolist(), [GSDCalculator.calculate_gsd(a, 8192, 4.27, 35.0) for a in ALTITUDES])
+    # One altitude, many cameras, with a scalar parameter broadcast against the others
+    result = GSDCalculator.calculate_gsd_batch(120.0, WIDTHS, 4.27, FOCAL_LENGTHS)
+    self.assertEqual(result.tolist(), [GSDCalculator.calculate_gsd(120.0, w, 4.27, f)
+                                       for w, f in zip(WIDTHS, FOCAL_LENGTHS)])
+    # Multidimensional values keep their shape in front of the camera axis
+    result = GSDCalculator.calculate_altitude_batch(np.reshape(GSDS, (2, 2)), WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS)
+    self.assertEqual(result.shape, (2, 2, len(WIDTHS)))
+    self.assertEqual(result.reshape(len(GSDS), -1).tolist(),
+                     self.scalar_grid(GSDCalculator.calculate_altitude, GSDS))
+
+  def test_out(self):
+    out = np.full((len(ALTITUDES), len(WIDTHS)), np.nan)
+    result = GSDCalculator.calculate_gsd_batch(ALTITUDES, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS, out=out)
+    self.assertIs(result, out)
+    self.assertEqual(out.tolist(), self.scalar_grid(GSDCalculator.calculate_gsd, ALTITUDES))
+    for bad_out in (np.empty((len(ALTITUDES), 2)), np.empty((len(ALTITUDES), len(WIDTHS)), dtype=np.float32)):
+      with self.assertRaises(ValueError):
+        GSDCalculator.calculate_gsd_batch(ALTITUDES, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS, out=bad_out)
+
+  def test_dtype(self):
+    expected = np.array(self.scalar_grid(GSDCalculator.calculate_gsd, ALTITUDES))
+    result = GSDCalculator.calculate_gsd_batch(ALTITUDES, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS, dtype=np.float32)
+    self.assertEqual(result.dtype, np.float32)
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+    out = np.empty((len(ALTITUDES), len(WIDTHS)), dtype=np.float32)
+    self.assertIs(GSDCalculator.calculate_gsd_batch(ALTITUDES, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS, dtype='float32',
+                                                    out=out), out)
+    with self.assertRaises(ValueError):
+      GSDCalculator.calculate_gsd_batch(ALTITUDES, WIDTHS, PIXEL_SIZES, FOCAL_LENGTHS, dtype=np.int64)
+
+
+if __name__ == '__main__':
+  unittest.main()
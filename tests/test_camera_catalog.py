@@ -0,0 +1,67 @@
+# Tests for the columnar camera catalog in camera_catalog.py
+
+import unittest
+
+import numpy as np
+
+from camera_catalog import CameraCatalog
+from main import GSDCalculator
+
+CAMERAS = {
+  'Zenmuse P1 35mm': {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27,
+                      'focal_length_mm': 35.0},
+  'Mavic 3': {'sensor_width_px': 5280, 'sensor_height_px': 3956, 'pixel_size_nm': 3.3, 'focal_length_mm': 12.29},
+}
+
+
+class CameraCatalogTest(unittest.TestCase):
+
+  def test_from_dict_and_get(self):
+    catalog = CameraCatalog.from_dict(CAMERAS)
+    self.assertEqual(len(catalog), 2)
+    self.assertEqual(catalog.names, list(CAMERAS))
+    camera = catalog.get('Mavic 3')
+    self.assertEqual((camera.name, camera.sensor_width_px, camera.pixel_size_um), ('Mavic 3', 5280, 3.3))
+    self.assertIsInstance(camera.sensor_width_px, int)
+    self.assertIsNone(catalog.get('Nope'))
+    self.assertNotIn('Nope', catalog)
+    with self.assertRaises(KeyError):
+      catalog.row('Nope')
+
+  def test_add_grows_and_keeps_rows(self):
+    catalog = CameraCatalog(capacity=1)
+    for i in range(100):
+      self.assertEqual(catalog.add(f'Camera {i}', 1000 + i, 800, 2.0, 10.0), i)
+    view = catalog.get('Camera 3')
+    self.assertEqual(len(catalog), 100)
+    self.assertEqual(catalog.sensor_width_px.tolist(), list(range(1000, 1100)))
+    # Updating an existing name keeps its row, and existing views see the new values
+    self.assertEqual(catalog.add('Camera 3', 4000, 3000, 3.0, 20.0), 3)
+    self.assertEqual(len(catalog), 100)
+    self.assertEqual((view.sensor_width_px, view.focal_length_mm), (4000, 20.0))
+
+  def test_to_dict_round_trip(self):
+    expected = {name: {'sensor_width_px': camera['sensor_width_px'], 'sensor_height_px': camera['sensor_height_px'],
+                       'pixel_size_um': camera.get('pixel_size_um', camera.get('pixel_size_nm')),
+                       'focal_length_mm': camera['focal_length_mm']} for name, camera in CAMERAS.items()}
+    catalog = CameraCatalog.from_dict(CAMERAS)
+    self.assertEqual(catalog.to_dict(), expected)
+    self.assertEqual(catalog.get('Mavic 3').to_dict(), expected['Mavic 3'])
+    self.assertEqual(CameraCatalog.from_dict(catalog.to_dict()).to_dict(), expected)
+
+  def test_vectorized_gsd_matches_scalar(self):
+    catalog = CameraCatalog.from_dict(CAMERAS)
+    gsd_cm = catalog.calculate_gsd([60, 120])
+    self.assertEqual(gsd_cm.shape, (2, 2))
+    for row, altitude_m in enumerate((60, 120)):
+      for column, name in enumerate(catalog.names):
+        camera = catalog.get(name)
+        self.assertEqual(gsd_cm[row, column], GSDCalculator.calculate_gsd(
+          altitude_m, camera.sensor_width_px, camera.pixel_size_um, camera.focal_length_mm))
+    # Each camera's own GSD at 120 m takes it back to 120 m
+    altitude_m = catalog.calculate_altitude(gsd_cm[1])
+    np.testing.assert_allclose(np.diagonal(altitude_m), [120, 120], rtol=1e-12)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,112 @@
+# Tests for the bulk camera import in camera_import.py
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from camera_import import import_cameras, main, read_csv_cameras, read_json_cameras
+from camera_storage import JSONCameraStorage
+from main import Camera_Database
+
+EXISTING = {'Existing': {'sensor_width_px': 4000, 'sensor_height_px': 3000, 'pixel_size_um': 2.4,
+                         'focal_length_mm': 8.8}}
+HEADER = 'camera_name,sensor_width_px,sensor_height_px,pixel_size_um,focal_length_mm\n'
+
+
+class CountingStorage(JSONCameraStorage):
+  """
+  Counts the bulk writes Camera_Database makes.
+  """
+
+  def __init__(self, path):
+    super().__init__(path)
+    self.bulk_writes = 0
+
+  def put_many(self, cameras, all_cameras):
+    self.bulk_writes += 1
+    super().put_many(cameras, all_cameras)
+
+
+class ImportCamerasTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'cameras.json')
+    with open(self.path, 'w') as f:
+      json.dump(EXISTING, f)
+    self.storage = CountingStorage(self.path)
+    self.camera_database = Camera_Database(self.storage)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def import_csv(self, text, on_conflict='error', dry_run=False):
+    return import_cameras(self.camera_database, read_csv_cameras(io.StringIO(HEADER + text)), on_conflict, dry_run)
+
+  def stored(self):
+    return JSONCameraStorage(self.path).load()
+
+  def test_valid_rows_are_written_once(self):
+    stats, rejects = self.import_csv('A,100,50,3.3,10\nB,200,100,4.4,20\nC,0,100,4.4,20\n')
+    self.assertEqual((stats['imported'], stats['rejected']), (2, 1))
+    self.assertEqual(rejects, [(4, 'C', "sensor_width_px must be an integer between 1 and 100000")])
+    self.assertEqual(self.storage.bulk_writes, 1)
+    self.assertEqual(self.stored()['B'], {'sensor_width_px': 200, 'sensor_height_px': 100, 'pixel_size_um': 4.4,
+                                          'focal_length_mm': 20.0})
+
+  def test_dry_run_writes_nothing(self):
+    stats, _ = self.import_csv('A,100,50,3.3,10\n', dry_run=True)
+    self.assertEqual(stats['imported'], 1)
+    self.assertEqual(self.storage.bulk_writes, 0)
+    self.assertNotIn('A', self.stored())
+
+  def test_error_policy_aborts_on_conflicts(self):
+    for text in ('A,100,50,3.3,10\nA,200,100,4.4,20\n', 'Existing,100,50,3.3,10\n'):
+      with self.assertRaises(ValueError):
+        self.import_csv(text)
+    self.assertEqual(self.storage.bulk_writes, 0)
+
+  def test_skip_policy_keeps_existing_and_first(self):
+    stats, rejects = self.import_csv('A,100,50,3.3,10\nA,200,100,4.4,20\nExisting,100,50,3.3,10\n', 'skip')
+    self.assertEqual(stats, {'rows': 3, 'imported': 1, 'overwritten': 0, 'rejected': 2})
+    self.assertEqual([reason for _, _, reason in rejects], ["later row with the same name", "already in the database"])
+    self.assertEqual(self.stored()['A']['sensor_width_px'], 100)
+    self.assertEqual(self.stored()['Existing'], EXISTING['Existing'])
+
+  def test_overwrite_policy_keeps_last(self):
+    stats, rejects = self.import_csv('A,100,50,3.3,10\nA,200,100,4.4,20\nExisting,100,50,3.3,10\n', 'overwrite')
+    self.assertEqual(stats, {'rows': 3, 'imported': 2, 'overwritten': 1, 'rejected': 1})
+    self.assertEqual(rejects, [(2, 'A', "replaced by a later row")])
+    self.assertEqual(self.stored()['A']['sensor_width_px'], 200)
+    self.assertEqual(self.stored()['Existing']['sensor_width_px'], 100)
+
+  def test_pixel_size_nm_fallback(self):
+    document = {'Legacy': {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_nm': 4.27,
+                           'focal_length_mm': 35}}
+    stats, _ = import_cameras(self.camera_database, read_json_cameras(io.StringIO(json.dumps(document))))
+    self.assertEqual(stats['imported'], 1)
+    self.assertEqual(self.stored()['Legacy']['pixel_size_um'], 4.27)
+    self.assertNotIn('pixel_size_nm', self.stored()['Legacy'])
+
+  def test_oversized_integer_is_rejected(self):
+    document = {'Huge': {'sensor_width_px': 10 ** 400, 'sensor_height_px': 5460, 'pixel_size_um': 4.27,
+                         'focal_length_mm': 35}}
+    stats, rejects = import_cameras(self.camera_database, read_json_cameras(io.StringIO(json.dumps(document))))
+    self.assertEqual(stats['imported'], 0)
+    self.assertEqual(rejects, [(1, 'Huge', "sensor_width_px must be an integer between 1 and 100000")])
+
+  def test_command_line_dry_run(self):
+    source = os.path.join(self.directory, 'huge.json')
+    with open(source, 'w') as f:
+      f.write('{"Huge": {"sensor_width_px": 1%s, "sensor_height_px": 1, "pixel_size_um": 1, '
+              '"focal_length_mm": 1}}' % ('0' * 400))
+    with mock.patch.dict(os.environ, {'GSD_CAMERA_DATABASE': self.path}):
+      self.assertEqual(main([source, '--dry-run']), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
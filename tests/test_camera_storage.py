@@ -0,0 +1,111 @@
+# Tests for the JSON and SQLite storage backends in camera_storage.py
+
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from camera_storage import JSONCameraStorage, SQLiteCameraStorage, open_storage
+
+P1 = {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27, 'focal_length_mm': 35.0}
+MINI = {'sensor_width_px': 4000, 'sensor_height_px': 3000, 'pixel_size_um': 2.4, 'focal_length_mm': 8.8}
+
+
+class StorageTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def path(self, name):
+    return os.path.join(self.directory, name)
+
+
+class JSONCameraStorageTest(StorageTestCase):
+
+  def test_round_trip(self):
+    storage = JSONCameraStorage(self.path('cameras.json'))
+    self.assertIsNone(storage.load())
+    self.assertIsNone(storage.version())
+    storage.save({'P1': P1})
+    version = storage.version()
+    storage.put_many({'Mini': MINI}, {'P1': P1, 'Mini': MINI})
+    self.assertEqual(storage.load(), {'P1': P1, 'Mini': MINI})
+    self.assertEqual(storage.names(), ['P1', 'Mini'])
+    self.assertEqual(storage.get('Mini'), MINI)
+    self.assertNotEqual(storage.version(), version)
+
+  def test_failed_save_keeps_the_previous_file(self):
+    storage = JSONCameraStorage(self.path('cameras.json'))
+    storage.save({'P1': P1})
+    with self.assertRaises(TypeError):
+      storage.save({'P1': P1, 'Broken': object()})
+    self.assertEqual(storage.load(), {'P1': P1})
+    self.assertEqual(os.listdir(self.directory), ['cameras.json'])
+
+  @unittest.skipUnless(os.name == 'posix', "POSIX permission bits")
+  def test_save_keeps_the_file_mode(self):
+    storage = JSONCameraStorage(self.path('cameras.json'))
+    for mode in (0o644, 0o664, 0o600):
+      with open(storage.path, 'w') as f:
+        json.dump({}, f)
+      os.chmod(storage.path, mode)
+      storage.save({'P1': P1})
+      self.assertEqual(stat.S_IMODE(os.stat(storage.path).st_mode), mode)
+
+  @unittest.skipUnless(os.name == 'posix', "POSIX permission bits")
+  def test_new_file_follows_the_umask(self):
+    umask = os.umask(0o027)
+    try:
+      JSONCameraStorage(self.path('cameras.json')).save({'P1': P1})
+    finally:
+      os.umask(umask)
+    self.assertEqual(stat.S_IMODE(os.stat(self.path('cameras.json')).st_mode), 0o640)
+
+
+class SQLiteCameraStorageTest(StorageTestCase):
+
+  def test_upsert(self):
+    storage = SQLiteCameraStorage(self.path('cameras.db'))
+    self.assertIsNone(storage.load())
+    storage.put('P1', P1)
+    storage.put_many({'Mini': MINI, 'P1': dict(P1, focal_length_mm=50.0)})
+    self.assertEqual(storage.load(), {'P1': dict(P1, focal_length_mm=50.0), 'Mini': MINI})
+    self.assertEqual(storage.names(), ['P1', 'Mini'])
+    self.assertIsNone(storage.get('Nope'))
+    storage.close()
+
+  def test_version_changes_on_other_connections_commits(self):
+    storage = SQLiteCameraStorage(self.path('cameras.db'))
+    other = SQLiteCameraStorage(self.path('cameras.db'))
+    version = storage.version()
+    storage.put('P1', P1)
+    self.assertEqual(storage.version(), version)
+    other.put('Mini', MINI)
+    self.assertNotEqual(storage.version(), version)
+    self.assertEqual(storage.get('Mini'), MINI)
+    storage.close()
+    other.close()
+
+  def test_migration_from_json_runs_once(self):
+    json_path = self.path('cameras.json')
+    with open(json_path, 'w') as f:
+      # The shipped database stores the pixel size under 'pixel_size_nm'
+      json.dump({'P1': {key if key != 'pixel_size_um' else 'pixel_size_nm': value for key, value in P1.items()}}, f)
+    storage = open_storage(self.path('cameras.db'), migrate_from=json_path)
+    self.assertIsInstance(storage, SQLiteCameraStorage)
+    self.assertEqual(storage.load(), {'P1': P1})
+    storage.put('Mini', MINI)
+    self.assertEqual(storage.migrate_from_json(json_path), 0)
+    storage.close()
+    reopened = open_storage(self.path('cameras.db'), migrate_from=json_path)
+    self.assertEqual(reopened.names(), ['P1', 'Mini'])
+    reopened.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,46 @@
+# Tests for the command line subcommands in main.py
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+class CommandLineTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'cameras.json')
+    # Enough output to overflow the pipe buffer
+    with open(self.path, 'w') as f:
+      json.dump({f'Camera {i:05d}': {'sensor_width_px': 4000, 'sensor_height_px': 3000, 'pixel_size_um': 2.4,
+                                     'focal_length_mm': 8.8} for i in range(50000)}, f)
+    self.env = dict(os.environ, GSD_CAMERA_DATABASE=self.path)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_list_into_a_closed_pipe(self):
+    # Like `main.py list | head -1`
+    process = subprocess.Popen([sys.executable, MAIN, 'list'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=self.env)
+    self.assertEqual(process.stdout.readline(), b'Camera 00000\n')
+    process.stdout.close()
+    stderr = process.stderr.read()
+    process.stderr.close()
+    self.assertEqual(process.wait(), 0)
+    self.assertEqual(stderr, b'')
+
+  def test_gsd(self):
+    result = subprocess.run([sys.executable, MAIN, 'gsd', 'Camera 00001', '100', '--json'], capture_output=True,
+                            env=self.env, check=True)
+    self.assertEqual(json.loads(result.stdout)[0]['altitude_m'], 100)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,91 @@
+# Tests for the compiled camera cache in main.py
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from camera_storage import JSONCameraStorage
+from main import Camera_Database, CompiledCameraCache
+
+CAMERAS = {name: {'sensor_width_px': width, 'sensor_height_px': 3000, 'pixel_size_um': 2.4, 'focal_length_mm': 8.8}
+           for name, width in (('A', 4000), ('B', 5000), ('C', 6000))}
+
+
+class CompiledCameraCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    path = os.path.join(self.directory, 'cameras.json')
+    with open(path, 'w') as f:
+      json.dump(CAMERAS, f)
+    self.camera_database = Camera_Database(JSONCameraStorage(path))
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def add_camera(self, name, width):
+    with contextlib.redirect_stdout(io.StringIO()):
+      self.camera_database.add_camera(name, width, 3000, 2.4, 8.8)
+
+  def test_lru_eviction(self):
+    cache = CompiledCameraCache(self.camera_database, maxsize=2)
+    a = cache.get('A')
+    cache.get('B')
+    self.assertIs(cache.get('A'), a)  # A is now the most recently used
+    cache.get('C')
+    self.assertEqual(cache.stats()['evictions'], 1)
+    self.assertIs(cache.get('A'), a)
+    cache.get('B')  # Evicted, compiled again
+    self.assertEqual({key: cache.stats()[key] for key in ('hits', 'misses', 'size')},
+                     {'hits': 2, 'misses': 4, 'size': 2})
+    self.assertIsNone(cache.get('Nope'))
+
+  def test_overwritten_camera_is_recompiled(self):
+    cache = self.camera_database.compiled_cameras
+    self.assertEqual(cache.get('A').sensor_width_px, 4000)
+    self.add_camera('A', 4100)
+    self.assertEqual(cache.stats()['invalidations'], 1)
+    self.assertEqual(cache.get('A').sensor_width_px, 4100)
+    with contextlib.redirect_stdout(io.StringIO()):
+      self.camera_database.add_cameras({'A': dict(CAMERAS['A'], sensor_width_px=4200)})
+    self.assertEqual(cache.get('A').sensor_width_px, 4200)
+
+  def test_invalidation_during_compile_is_not_cached(self):
+    # The camera is overwritten after get read its parameters but before it cached the result
+    cache = self.camera_database.compiled_cameras
+    get_camera_data = self.camera_database.get_camera_data
+
+    def racing_get_camera_data(camera_name):
+      camera_parameters = get_camera_data(camera_name)
+      self.camera_database.get_camera_data = get_camera_data
+      self.add_camera(camera_name, 4100)
+      return camera_parameters
+
+    self.camera_database.get_camera_data = racing_get_camera_data
+    self.assertEqual(cache.get('A').sensor_width_px, 4100)
+    self.assertEqual(cache.get('A').sensor_width_px, 4100)
+    self.assertEqual(cache.stats()['hits'], 1)
+
+  def test_camera_removed_during_compile(self):
+    cache = self.camera_database.compiled_cameras
+    get_camera_data = self.camera_database.get_camera_data
+
+    def racing_get_camera_data(camera_name):
+      camera_parameters = get_camera_data(camera_name)
+      # As a hot reload does when another process removed the camera
+      self.camera_database.camera_database = {name: parameters for name, parameters in
+                                              self.camera_database.camera_database.items() if name != camera_name}
+      cache.invalidate([camera_name])
+      return camera_parameters
+
+    self.camera_database.get_camera_data = racing_get_camera_data
+    self.assertIsNone(cache.get('A'))
+    self.assertEqual(cache.stats()['size'], 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
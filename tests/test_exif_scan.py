@@ -0,0 +1,143 @@
+# Tests for matching photos to cameras in exif_scan.py
+
+import math
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from exif_scan import CameraMatcher, compute_batch, parse_exif, read_jpeg_headers, read_photo
+
+CAMERAS = {
+  'Zenmuse P1 35mm': {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27,
+                      'focal_length_mm': 35},
+  'Wide 35mm': {'sensor_width_px': 6000, 'sensor_height_px': 2000, 'pixel_size_um': 4.27, 'focal_length_mm': 35},
+}
+
+
+class FakeDatabase:
+  """
+  Stands in for Camera_Database with a fixed set of cameras.
+  """
+
+  def __init__(self, cameras):
+    self.camera_database = cameras
+
+  def get_camera_data(self, camera_name):
+    return self.camera_database.get(camera_name)
+
+
+def photo(width_px, height_px, focal_length_mm=35.0, model='FC-unknown'):
+  return {'model': model, 'image_width_px': width_px, 'image_height_px': height_px,
+          'focal_length_mm': focal_length_mm, 'relative_altitude_m': 100.0}
+
+
+class CameraMatcherTest(unittest.TestCase):
+
+  def setUp(self):
+    self.matcher = CameraMatcher(FakeDatabase(CAMERAS))
+
+  def test_full_resolution_photo(self):
+    self.assertEqual(self.matcher.match(photo(8192, 5460)), 'Zenmuse P1 35mm')
+    self.assertEqual(self.matcher.match(photo(6000, 2000)), 'Wide 35mm')
+
+  def test_resized_photo_matches_and_keeps_the_gsd(self):
+    photos = [photo(8192, 5460), photo(2048, 1365)]
+    compute_batch(photos, self.matcher)
+    self.assertEqual([p['camera'] for p in photos], ['Zenmuse P1 35mm'] * 2)
+    # A quarter of the pixels across the same footprint: four times the GSD
+    self.assertTrue(math.isclose(photos[1]['gsd_cm'], 4 * photos[0]['gsd_cm'], rel_tol=1e-12))
+
+  def test_no_match(self):
+    self.assertIsNone(self.matcher.match(photo(4000, 3000)))
+    self.assertIsNone(self.matcher.match(photo(8192, 5460, focal_length_mm=24.0)))
+
+  def test_invalid_photos_are_marked(self):
+    photos = [photo(0, 5460, model='Zenmuse P1 35mm'), photo(8192, 5460, focal_length_mm=0.0, model='Zenmuse P1 35mm'),
+              dict(photo(8192, 5460), relative_altitude_m=-0.5), dict(photo(8192, 5460), relative_altitude_m=0.0),
+              photo(8192, 5460)]
+    compute_batch(photos, self.matcher)
+    self.assertEqual([('error' in p, 'gsd_cm' in p) for p in photos], [(True, False)] * 4 + [(False, True)])
+
+
+def tiff(model, focal_length_mm, width_px, height_px):
+  """
+  Builds a little-endian EXIF TIFF block with IFD0 (make, model, EXIF pointer) and an EXIF IFD.
+  """
+  make = b'DJI\x00'
+  model = model.encode('ascii') + b'\x00'
+  ifd0_offset, exif_offset = 8, 8 + 2 + 3 * 12 + 4
+  data_offset = exif_offset + 2 + 3 * 12 + 4
+  ifd0 = struct.pack('<H', 3) + b''.join([
+    struct.pack('<HHI4s', 0x010F, 2, len(make), make),
+    struct.pack('<HHII', 0x0110, 2, len(model), data_offset + 8),
+    struct.pack('<HHII', 0x8769, 4, 1, exif_offset)]) + b'\x00' * 4
+  exif_ifd = struct.pack('<H', 3) + b''.join([
+    struct.pack('<HHII', 0x920A, 5, 1, data_offset),
+    struct.pack('<HHII', 0xA002, 4, 1, width_px),
+    struct.pack('<HHIHH', 0xA003, 3, 1, height_px, 0)]) + b'\x00' * 4
+  data = struct.pack('<II', int(focal_length_mm * 100), 100) + model
+  return b'II*\x00' + struct.pack('<I', ifd0_offset) + ifd0 + exif_ifd + data
+
+
+def segment(marker, payload):
+  return bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def jpeg(*segments):
+  return b'\xff\xd8' + b''.join(segments) + segment(0xDA, b'\x00' * 10) + b'\xab' * 100000
+
+
+EXIF = segment(0xE1, b'Exif\x00\x00' + tiff('FC-unknown', 35.0, 2048, 1365))
+XMP = segment(0xE1, b'http://ns.adobe.com/xap/1.0/\x00<x drone-dji:RelativeAltitude="+100.25"/>')
+
+
+class JPEGHeaderTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def write(self, content):
+    path = os.path.join(self.directory, f'{len(os.listdir(self.directory))}.jpg')
+    with open(path, 'wb') as f:
+      f.write(content)
+    return path
+
+  def test_headers_and_exif(self):
+    exif, xmp = read_jpeg_headers(self.write(jpeg(segment(0xE0, b'JFIF\x00'), EXIF, XMP)))
+    self.assertEqual(parse_exif(exif), {'make': 'DJI', 'model': 'FC-unknown', 'focal_length_mm': 35.0,
+                                        'image_width_px': 2048, 'image_height_px': 1365})
+    self.assertIn(b'RelativeAltitude', xmp)
+
+  def test_scan_one_photo(self):
+    photos = [read_photo(self.write(jpeg(EXIF, XMP)))]
+    compute_batch(photos, CameraMatcher(FakeDatabase(CAMERAS)))
+    self.assertEqual(photos[0]['camera'], 'Zenmuse P1 35mm')
+    self.assertEqual(photos[0]['relative_altitude_m'], 100.25)
+    self.assertNotIn('error', photos[0])
+
+  def test_corrupt_segment_length(self):
+    for length in (0, 1):
+      path = self.write(b'\xff\xd8\xff\xe1' + struct.pack('>H', length) + EXIF)
+      with self.assertRaisesRegex(ValueError, "corrupt JPEG segment"):
+        read_jpeg_headers(path)
+      self.assertEqual(read_photo(path)['error'], "corrupt JPEG segment")
+
+  def test_not_a_jpeg(self):
+    with self.assertRaises(ValueError):
+      read_jpeg_headers(self.write(b'GIF89a'))
+
+  def test_malformed_metadata(self):
+    self.assertEqual(parse_exif(b'XX\x00\x00'), {})
+    path = self.write(jpeg(segment(0xE1, b'Exif\x00\x00' + tiff('FC', 35.0, 0, 0)),
+                           segment(0xE1, b'http://ns.adobe.com/xap/1.0/\x00RelativeAltitude="."')))
+    photo = read_photo(path)
+    self.assertEqual((photo['image_width_px'], photo['error']), (0, "invalid relative altitude in XMP"))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,135 @@
+# Tests for the asyncio job queue in job_queue.py
+
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import job_queue
+from camera_storage import JSONCameraStorage
+from job_queue import CANCELLED, DONE, RUNNING, JobQueue
+from main import Camera_Database, GSDCalculator
+
+CAMERAS = {'P1': {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27, 'focal_length_mm': 35},
+           'Mini': {'sensor_width_px': 4000, 'sensor_height_px': 3000, 'pixel_size_um': 2.4, 'focal_length_mm': 8.8}}
+
+
+class JobQueueTest(unittest.IsolatedAsyncioTestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    path = os.path.join(self.directory, 'cameras.json')
+    with open(path, 'w') as f:
+      json.dump(CAMERAS, f)
+    self.camera_database = Camera_Database(JSONCameraStorage(path))
+    # A job that runs until released, checking for cancellation as it waits
+    self.release = threading.Event()
+
+    def run_block(params, catalog, checkpoint):
+      while not self.release.wait(0.001):
+        checkpoint(0, 1)
+      return params['value']
+
+    job_queue.JOB_TYPES['block'] = run_block
+
+  def tearDown(self):
+    self.release.set()
+    del job_queue.JOB_TYPES['block']
+    shutil.rmtree(self.directory)
+
+  async def until(self, condition):
+    for _ in range(1000):
+      if condition():
+        return
+      await asyncio.sleep(0.001)
+    self.fail("condition not reached")
+
+  async def test_gsd_job(self):
+    async with JobQueue(self.camera_database) as queue:
+      job = await queue.submit('gsd', {'camera': 'Mini', 'altitude_m': [50, 100]})
+      result = await job.wait()
+    self.assertEqual(job.state, DONE)
+    self.assertEqual(result.tolist(), [GSDCalculator.calculate_gsd(altitude_m, 4000, 2.4, 8.8)
+                                       for altitude_m in (50, 100)])
+
+  async def test_identical_jobs_are_merged(self):
+    async with JobQueue(self.camera_database, concurrency=1) as queue:
+      first = await queue.submit('block', {'value': 1})
+      second = await queue.submit('block', {'value': 1})
+      other = await queue.submit('block', {'value': 2})
+      self.assertIs(first, second)
+      self.assertIsNot(first, other)
+      self.assertEqual((first.submitters, queue.stats['merged']), (2, 1))
+      self.release.set()
+      self.assertEqual(await second.wait(), 1)
+    self.assertEqual(queue.stats['submitted'], 2)
+
+  async def test_cancellation(self):
+    async with JobQueue(self.camera_database, concurrency=1) as queue:
+      running = await queue.submit('block', {'value': 1})
+      queued = await queue.submit('block', {'value': 2})
+      await queue.submit('block', {'value': 2})
+      await self.until(lambda: running.state == RUNNING)
+      # A job submitted twice is only cancelled once both submitters withdraw
+      self.assertFalse(queue.cancel(queued))
+      self.assertTrue(queue.cancel(queued))
+      self.assertEqual(queued.state, CANCELLED)
+      with self.assertRaises(asyncio.CancelledError):
+        await queued.wait()
+      # A running job stops at its next checkpoint
+      self.assertTrue(queue.cancel(running))
+      with self.assertRaises(asyncio.CancelledError):
+        await running.wait()
+      self.assertEqual(running.state, CANCELLED)
+      # A new identical request starts a fresh job
+      fresh = await queue.submit('block', {'value': 1})
+      self.assertIsNot(fresh, running)
+      self.release.set()
+      self.assertEqual(await fresh.wait(), 1)
+    self.assertEqual(queue.stats['cancelled'], 2)
+
+  async def test_full_queue_pushes_back(self):
+    async with JobQueue(self.camera_database, concurrency=1, max_pending=1) as queue:
+      running = await queue.submit('block', {'value': 1})
+      await self.until(lambda: running.state == RUNNING)
+      await queue.submit('block', {'value': 2})
+      with self.assertRaises(asyncio.QueueFull):
+        await queue.submit('block', {'value': 3}, wait=False)
+      waiting = asyncio.ensure_future(queue.submit('block', {'value': 3}))
+      await asyncio.sleep(0.01)
+      self.assertFalse(waiting.done())
+      self.release.set()
+      self.assertEqual(await (await waiting).wait(), 3)
+
+  async def test_single_camera_jobs_need_one_camera(self):
+    async with JobQueue(self.camera_database) as queue:
+      for params in ({'altitude_m': [100]}, {'cameras': ['P1'], 'altitude_m': [100]},
+                     {'camera': 'P1', 'cameras': ['Mini'], 'altitude_m': [100]},
+                     {'camera': ['P1'], 'altitude_m': [100]}):
+        with self.subTest(params=params), self.assertRaisesRegex(ValueError, "exactly one camera"):
+          await queue.submit('gsd', params)
+      with self.assertRaisesRegex(ValueError, "not in the database"):
+        await queue.submit('altitude', {'camera': 'Nope', 'gsd_cm': [1]})
+    self.assertEqual(queue.stats['submitted'], 0)
+
+  async def test_oversized_table_is_rejected(self):
+    async with JobQueue(self.camera_database) as queue:
+      with self.assertRaisesRegex(ValueError, "at most"):
+        await queue.submit('table', {'start': 0, 'stop': 1e6, 'step': 0.001})
+      with self.assertRaisesRegex(ValueError, "numeric"):
+        await queue.submit('table', {'start': 0, 'stop': 100})
+      job = await queue.submit('table', {'start': 0, 'stop': 100, 'step': 1})
+      self.assertEqual((await job.wait())['table'].shape, (101, 2))
+
+  async def test_close_removes_the_listener(self):
+    listeners = len(self.camera_database._listeners)
+    async with JobQueue(self.camera_database):
+      self.assertEqual(len(self.camera_database._listeners), listeners + 1)
+    self.assertEqual(len(self.camera_database._listeners), listeners)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,76 @@
+# Tests for the interactive menu state machine in main.py
+
+import contextlib
+import itertools
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+import main
+from benchmarks import MENU_SCRIPT
+from camera_storage import JSONCameraStorage
+
+TRANSITIONS = 100000
+WARM_UP = 5000  # Transitions before the memory baseline, so caches and interned values settle
+MAX_GROWTH_BYTES = 64 * 1024  # A leak of one small object per transition would be megabytes
+MENU_PROMPT = "Enter your choice: "
+
+
+class MenuStackDepthTest(unittest.TestCase):
+
+  def test_stack_depth_and_memory_are_flat_over_100k_transitions(self):
+    passes = -(-TRANSITIONS // len(MENU_SCRIPT))
+    script = itertools.chain(itertools.chain.from_iterable(itertools.repeat(MENU_SCRIPT, passes)), ['q'])
+    # Only extremes and counters, so the probes themselves do not grow with the session
+    probe = {'inputs': 0, 'min_depth': sys.maxsize, 'max_depth': 0, 'baseline_bytes': None, 'last_bytes': None,
+             'state': None}
+
+    def scripted_input(prompt=''):
+      probe['inputs'] += 1
+      if prompt == MENU_PROMPT:
+        depth, frame = 0, sys._getframe()
+        while frame is not None:
+          depth, frame = depth + 1, frame.f_back
+        probe['min_depth'] = min(probe['min_depth'], depth)
+        probe['max_depth'] = max(probe['max_depth'], depth)
+        traced_bytes = tracemalloc.get_traced_memory()[0]
+        if probe['baseline_bytes'] is None and probe['inputs'] >= WARM_UP:
+          probe['baseline_bytes'] = traced_bytes
+        probe['last_bytes'] = traced_bytes
+      return next(script)
+
+    def recording_main_menu(camera_database):
+      probe['state'] = main_menu(camera_database)
+      return probe['state']
+
+    main_menu = main.main_menu
+    clear_console = main.clear_console
+    main.input = scripted_input
+    main.clear_console = lambda: None
+    main.MENU_SCREENS[main.MENU] = recording_main_menu
+    try:
+      with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull, \
+          contextlib.redirect_stdout(devnull):
+        camera_database = main.Camera_Database(JSONCameraStorage(os.path.join(directory, 'cameras.json')))
+        tracemalloc.start()
+        try:
+          status = main.display_menu(camera_database)
+        finally:
+          tracemalloc.stop()
+    finally:
+      del main.input
+      main.clear_console = clear_console
+      main.MENU_SCREENS[main.MENU] = main_menu
+
+    self.assertEqual(status, 0)
+    self.assertEqual(probe['state'], main.QUIT)
+    self.assertIsNone(next(script, None))  # Every scripted input was consumed
+    self.assertGreaterEqual(probe['inputs'], TRANSITIONS)
+    self.assertEqual(probe['max_depth'], probe['min_depth'])
+    self.assertLess(probe['last_bytes'] - probe['baseline_bytes'], MAX_GROWTH_BYTES)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,48 @@
+# Tests for the oblique per-pixel GSD maps in oblique.py
+
+import math
+import unittest
+
+import numpy as np
+
+from main import GSDCalculator
+from oblique import oblique_gsd_map
+
+CAMERA = {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27, 'focal_length_mm': 35}
+
+
+class ObliqueGSDMapTest(unittest.TestCase):
+
+  def test_nadir_matches_calculator(self):
+    gsd_map, summary = oblique_gsd_map(CAMERA, 100, step=512, dtype=np.float64)
+    expected = GSDCalculator.calculate_gsd(100, CAMERA['sensor_width_px'], CAMERA['pixel_size_um'],
+                                           CAMERA['focal_length_mm'])
+    self.assertTrue(math.isclose(summary['centre_gsd_cm'], expected, rel_tol=1e-9))
+    self.assertEqual(summary['above_horizon_fraction'], 0)
+
+  def test_horizon_centre_has_no_gsd(self):
+    for dtype in (np.float32, np.float64):
+      gsd_map, summary = oblique_gsd_map(CAMERA, 100, pitch_deg=0.0, step=64, dtype=dtype)
+      self.assertIsNone(summary['centre_gsd_cm'])
+      # The upper half of the frame looks above the horizon, the lower half reaches the ground
+      self.assertTrue(np.all(np.isnan(gsd_map[:len(gsd_map) // 2])))
+      self.assertTrue(np.all(np.isfinite(gsd_map[-1])))
+      self.assertLess(summary['far_gsd_cm'], 1e6)
+
+  def test_slightly_above_horizon_has_no_ground(self):
+    # Pitched up by more than half the vertical field of view, no pixel reaches the ground
+    half_fov = math.degrees(math.atan(CAMERA['sensor_height_px'] / 2 * CAMERA['pixel_size_um'] * 1e-3
+                                      / CAMERA['focal_length_mm']))
+    gsd_map, summary = oblique_gsd_map(CAMERA, 100, pitch_deg=half_fov + 0.5, step=64)
+    self.assertIsNone(summary['centre_gsd_cm'])
+    self.assertIsNone(summary['near_gsd_cm'])
+    self.assertEqual(summary['above_horizon_fraction'], 1.0)
+
+  def test_slightly_below_horizon_centre_is_finite(self):
+    _, summary = oblique_gsd_map(CAMERA, 100, pitch_deg=-1.0, step=64, dtype=np.float64)
+    self.assertIsNotNone(summary['centre_gsd_cm'])
+    self.assertTrue(math.isfinite(summary['centre_gsd_cm']))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,108 @@
+# Tests for hot reloading the camera database in main.py
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from camera_storage import JSONCameraStorage, SQLiteCameraStorage
+from main import Camera_Database
+
+P1 = {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27, 'focal_length_mm': 35}
+MINI = {'sensor_width_px': 4000, 'sensor_height_px': 3000, 'pixel_size_um': 2.4, 'focal_length_mm': 8.8}
+
+
+class NoLockStorage(JSONCameraStorage):
+  """
+  A storage whose writer lock must not be taken, as on a read-only mount.
+  """
+
+  def lock(self):
+    raise AssertionError("the writer lock was taken")
+
+
+class ReloadTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'cameras.json')
+    JSONCameraStorage(self.path).save({'P1': P1, 'Old': MINI})
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def open(self):
+    camera_database = Camera_Database(JSONCameraStorage(self.path))
+    changes = []
+    camera_database.add_listener(changes.append)
+    return camera_database, changes
+
+  def test_reload_after_another_process_writes(self):
+    camera_database, changes = self.open()
+    compiled = camera_database.compiled_cameras.get('P1')
+    self.assertFalse(camera_database.reload_if_changed())
+    # Another process rewrites the file: one camera changed, one removed, one added
+    JSONCameraStorage(self.path).save({'P1': dict(P1, focal_length_mm=50), 'Mini': MINI})
+    self.assertTrue(camera_database.reload_if_changed())
+    self.assertEqual(sorted(changes[0]), ['Mini', 'Old', 'P1'])
+    self.assertEqual(camera_database.get_list_cameras(), ['P1', 'Mini'])
+    self.assertIsNot(camera_database.compiled_cameras.get('P1'), compiled)
+    self.assertEqual(camera_database.compiled_cameras.get('P1').focal_length_m, 0.05)
+    self.assertFalse(camera_database.reload_if_changed())
+    self.assertEqual(camera_database.reload_stats()['reloads'], 1)
+
+  def test_unreadable_file_keeps_the_catalog(self):
+    camera_database, changes = self.open()
+    with open(self.path, 'w') as f:
+      f.write('{"P1": ')
+    self.assertFalse(camera_database.reload_if_changed())
+    self.assertEqual(camera_database.reload_stats()['errors'], 1)
+    self.assertEqual(camera_database.get_list_cameras(), ['P1', 'Old'])
+    self.assertEqual(changes, [])
+
+  def test_watch(self):
+    camera_database, changes = self.open()
+    camera_database.watch(0.005)
+    try:
+      JSONCameraStorage(self.path).save({'P1': P1, 'Old': MINI, 'Mini': MINI})
+      deadline = time.monotonic() + 5
+      while not changes and time.monotonic() < deadline:
+        time.sleep(0.005)
+    finally:
+      camera_database.stop_watching()
+    self.assertEqual(changes, [['Mini']])
+    self.assertFalse(camera_database.reload_stats()['watching'])
+
+  def test_sqlite_reload(self):
+    path = os.path.join(self.directory, 'cameras.db')
+    writer = SQLiteCameraStorage(path)
+    writer.save({'P1': P1})
+    camera_database = Camera_Database(SQLiteCameraStorage(path))
+    changes = []
+    camera_database.add_listener(changes.append)
+    self.assertFalse(camera_database.reload_if_changed())
+    writer.put('Mini', MINI)
+    self.assertTrue(camera_database.reload_if_changed())
+    self.assertEqual(changes, [['Mini']])
+    self.assertEqual(camera_database.get_camera_data('Mini'), MINI)
+    writer.close()
+    camera_database.storage.close()
+
+  def test_existing_database_loads_without_the_lock(self):
+    camera_database = Camera_Database(NoLockStorage(self.path))
+    self.assertEqual(camera_database.get_list_cameras(), ['P1', 'Old'])
+    self.assertFalse(os.path.exists(self.path + '.lock'))
+
+  def test_missing_database_is_created_under_the_lock(self):
+    path = os.path.join(self.directory, 'new.json')
+    camera_database = Camera_Database(JSONCameraStorage(path))
+    self.assertEqual(camera_database.get_list_cameras(), ['Zenmuse P1 35mm'])
+    with open(path) as f:
+      self.assertEqual(list(json.load(f)), ['Zenmuse P1 35mm'])
+    self.assertFalse(camera_database.reload_if_changed())
+
+
+if __name__ == '__main__':
+  unittest.main()
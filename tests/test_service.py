@@ -0,0 +1,85 @@
+# Tests for the HTTP service in service.py
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from camera_storage import JSONCameraStorage
+from main import Camera_Database, GSDCalculator
+from service import MAX_BATCH_VALUES, create_app
+
+CAMERAS = {f'Camera {i:02d}': {'sensor_width_px': 4000 + i, 'sensor_height_px': 3000, 'pixel_size_um': 2.4,
+                               'focal_length_mm': 8.8} for i in range(25)}
+
+
+class ServiceTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    path = os.path.join(self.directory, 'cameras.json')
+    with open(path, 'w') as f:
+      json.dump(CAMERAS, f)
+    self.client = create_app(Camera_Database(JSONCameraStorage(path))).test_client()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def assertError(self, response, status):
+    self.assertEqual(response.status_code, status)
+    self.assertIn('error', response.get_json())
+
+  def test_gsd(self):
+    response = self.client.get('/gsd', query_string={'camera': 'Camera 01', 'altitude_m': 100})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.get_json()['gsd_cm'], GSDCalculator.calculate_gsd(100, 4001, 2.4, 8.8))
+
+  def test_missing_camera_is_a_bad_request(self):
+    self.assertError(self.client.get('/gsd', query_string={'altitude_m': 100}), 400)
+    self.assertError(self.client.get('/altitude', query_string={'camera': '', 'gsd_cm': 1}), 400)
+
+  def test_unknown_camera_is_not_found(self):
+    self.assertError(self.client.get('/gsd', query_string={'camera': 'Nope', 'altitude_m': 100}), 404)
+    self.assertError(self.client.get('/cameras/Nope'), 404)
+    self.assertError(self.client.post('/gsd/batch', json={'cameras': ['Nope'], 'altitude_m': [100]}), 404)
+
+  def test_invalid_values_are_bad_requests(self):
+    self.assertError(self.client.get('/gsd', query_string={'camera': 'Camera 01', 'altitude_m': 'x'}), 400)
+    self.assertError(self.client.get('/gsd', query_string={'camera': 'Camera 01', 'altitude_m': -1}), 400)
+    for altitude_m in ([], [True], [100, False], [[100]], ['x'], 100):
+      with self.subTest(altitude_m=altitude_m):
+        self.assertError(self.client.post('/gsd/batch', json={'camera': 'Camera 01', 'altitude_m': altitude_m}), 400)
+    self.assertError(self.client.post('/gsd/batch', data='not json', content_type='application/json'), 400)
+
+  def test_oversized_integer_is_a_bad_request(self):
+    body = '{"camera": "Camera 01", "altitude_m": [1%s]}' % ('0' * 400)
+    self.assertError(self.client.post('/gsd/batch', data=body, content_type='application/json'), 400)
+
+  def test_batch(self):
+    response = self.client.post('/gsd/batch', json={'cameras': ['Camera 01', 'Camera 02'], 'altitude_m': [50, 100]})
+    self.assertEqual(response.status_code, 200)
+    result = response.get_json()
+    self.assertEqual(result['gsd_cm'][1][0], GSDCalculator.calculate_gsd(50, 4002, 2.4, 8.8))
+
+  def test_batch_too_large(self):
+    body = {'cameras': ['Camera 01', 'Camera 02'], 'altitude_m': [100] * (MAX_BATCH_VALUES // 2 + 1)}
+    self.assertError(self.client.post('/gsd/batch', json=body), 413)
+
+  def test_pagination(self):
+    pages = []
+    offset = 0
+    while offset is not None:
+      page = self.client.get('/cameras', query_string={'offset': offset, 'limit': 10}).get_json()
+      self.assertEqual(page['total'], len(CAMERAS))
+      pages.append(page['cameras'])
+      offset = page['next_offset']
+    self.assertEqual([len(page) for page in pages], [10, 10, 5])
+    self.assertEqual(sum(pages, []), list(CAMERAS))
+    for query in ({'limit': 0}, {'limit': 1001}, {'offset': -1}, {'offset': 'x'}):
+      with self.subTest(query=query):
+        self.assertError(self.client.get('/cameras', query_string=query), 400)
+
+
+if __name__ == '__main__':
+  unittest.main()
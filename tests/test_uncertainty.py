@@ -0,0 +1,33 @@
+# Tests for the Monte Carlo GSD spread in uncertainty.py
+
+import math
+import unittest
+
+from uncertainty import gsd_uncertainty
+
+CAMERA = {'sensor_width_px': 8192, 'sensor_height_px': 5460, 'pixel_size_um': 4.27, 'focal_length_mm': 35}
+
+
+class GSDUncertaintyTest(unittest.TestCase):
+
+  def test_fixed_inputs_match_nominal(self):
+    result = gsd_uncertainty(CAMERA, 100, samples=10000, chunk_size=3000)
+    self.assertTrue(math.isclose(result['mean_gsd_cm'], result['nominal_gsd_cm'], rel_tol=1e-12))
+    self.assertEqual(result['invalid_samples'], 0)
+
+  def test_exceed_probability_ignores_invalid_samples(self):
+    # About half the samples end up at or below the ground; every valid one exceeds the target
+    distributions = {'terrain_m': {'dist': 'uniform', 'low': 50, 'high': 150}}
+    result = gsd_uncertainty(CAMERA, 100, distributions, samples=10000, target_gsd_cm=1e-6)
+    self.assertGreater(result['invalid_samples'], 0)
+    self.assertEqual(result['exceed_probability'], 1.0)
+
+  def test_no_valid_samples(self):
+    result = gsd_uncertainty(CAMERA, 100, {'terrain_m': 200}, samples=100, target_gsd_cm=1.0)
+    self.assertEqual(result['invalid_samples'], 100)
+    self.assertIsNone(result['mean_gsd_cm'])
+    self.assertIsNone(result['exceed_probability'])
+
+
+if __name__ == '__main__':
+  unittest.main()
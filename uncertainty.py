@@ -0,0 +1,250 @@
+# GSD-Calculator for UAV Flights - Monte Carlo GSD uncertainty
+#
+# GSDCalculator.calculate_gsd gives one number, but altitude (barometric/GNSS) error, terrain
+# error and lens tolerances spread the GSD actually achieved. This module samples those inputs
+# from distributions and reports GSD percentiles and the probability of exceeding a target GSD.
+#
+# Samples are drawn and evaluated in fixed-size chunks and summarised in a log-spaced histogram
+# (relative bin width about 0.01 %), so memory stays flat however many samples are drawn. Each
+# chunk has its own seed derived from the run seed, so results are identical whether the chunks
+# run serially or on a process pool.
+
+import argparse
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from main import Camera_Database, GSDCalculator, get_pixel_size_um
+
+DEFAULT_SAMPLES = 1000000
+DEFAULT_CHUNK_SIZE = 1000000
+DEFAULT_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+# Histogram over GSDs from 1e-4 cm to 1e4 cm, log-spaced
+HISTOGRAM_LOG10_RANGE = (-4.0, 4.0)
+HISTOGRAM_BINS = 200000
+
+PARAMETERS = ('altitude_m', 'terrain_m', 'sensor_width_px', 'pixel_size_um', 'focal_length_mm')
+
+
+def _normalise_distribution(spec, nominal):
+  """
+  Turns a number or a partial distribution dict into a complete distribution dict.
+
+  Args:
+    spec (float, dict or None): A fixed value, or {'dist': 'normal'|'uniform'|'triangular'|
+      'fixed', ...}. Missing 'mean' (normal) or 'mode' (triangular) default to nominal, and
+      uniform/triangular accept 'low'/'high' or a symmetric 'half_width' around the nominal.
+    nominal (float): The nominal value of the parameter.
+
+  Returns:
+    dict: The complete distribution.
+
+  Raises:
+    ValueError: If the distribution is unknown or incomplete.
+  """
+  if spec is None:
+    return {'dist': 'fixed', 'value': nominal}
+  if not isinstance(spec, dict):
+    return {'dist': 'fixed', 'value': float(spec)}
+  dist = spec.get('dist', 'normal')
+  center = spec.get('mean', spec.get('mode', nominal))
+  if dist == 'fixed':
+    return {'dist': 'fixed', 'value': spec.get('value', nominal)}
+  if dist == 'normal':
+    if 'std' not in spec:
+      raise ValueError("A normal distribution needs 'std'.")
+    return {'dist': 'normal', 'mean': center, 'std': spec['std']}
+  if dist in ('uniform', 'triangular'):
+    if 'half_width' in spec:
+      low, high = center - spec['half_width'], center + spec['half_width']
+    elif 'low' in spec and 'high' in spec:
+      low, high = spec['low'], spec['high']
+    else:
+      raise ValueError(f"A {dist} distribution needs 'low' and 'high' or 'half_width'.")
+    if dist == 'uniform':
+      return {'dist': 'uniform', 'low': low, 'high': high}
+    return {'dist': 'triangular', 'low': low, 'mode': center, 'high': high}
+  raise ValueError(f"Unknown distribution {dist!r}.")
+
+
+def _sample(rng, distribution, n):
+  """
+  Draws n samples from a normalised distribution (a scalar for fixed values).
+  """
+  dist = distribution['dist']
+  if dist == 'fixed':
+    return distribution['value']
+  if dist == 'normal':
+    return rng.normal(distribution['mean'], distribution['std'], n)
+  if dist == 'uniform':
+    return rng.uniform(distribution['low'], distribution['high'], n)
+  return rng.triangular(distribution['low'], distribution['mode'], distribution['high'], n)
+
+
+def _chunk_sizes(samples, chunk_size):
+  """
+  Splits the sample count into chunks of chunk_size and a remainder.
+  """
+  return [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+
+
+def _run_chunks(seed, chunks, distributions, target_gsd_cm):
+  """
+  Samples and evaluates a list of (chunk_index, size) chunks.
+
+  Returns:
+    tuple: (histogram counts, per-chunk (sum, sum of squares) in chunk order, invalid count,
+    exceed count, min, max).
+  """
+  counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+  sums = []
+  invalid = exceed = 0
+  low, high = math.inf, -math.inf
+  log_low = HISTOGRAM_LOG10_RANGE[0]
+  bins_per_decade = HISTOGRAM_BINS / (HISTOGRAM_LOG10_RANGE[1] - HISTOGRAM_LOG10_RANGE[0])
+  for chunk_index, size in chunks:
+    # A per-chunk generator keeps results independent of how chunks are grouped or scheduled
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+    values = {name: _sample(rng, distributions[name], size) for name in PARAMETERS}
+    height_above_ground_m = np.asarray(values['altitude_m'] - values['terrain_m'], dtype=np.float64)
+    gsd_cm = GSDCalculator.calculate_gsd_batch(np.broadcast_to(height_above_ground_m, (size,)),
+                                               values['sensor_width_px'], values['pixel_size_um'],
+                                               values['focal_length_mm'], outer=False)
+    valid = np.isfinite(gsd_cm) & (gsd_cm > 0)
+    invalid += size - int(valid.sum())
+    gsd_cm = gsd_cm[valid]
+    if gsd_cm.size:
+      low, high = min(low, float(gsd_cm.min())), max(high, float(gsd_cm.max()))
+    # NumPy's pairwise sum is accurate enough within a chunk; math.fsum combines the chunks
+    sums.append((float(np.sum(gsd_cm, dtype=np.float64)), float(np.sum(gsd_cm * gsd_cm, dtype=np.float64))))
+    if target_gsd_cm is not None:
+      exceed += int(np.count_nonzero(gsd_cm > target_gsd_cm))
+    index = ((np.log10(gsd_cm) - log_low) * bins_per_decade).astype(np.int64)
+    np.clip(index, 0, HISTOGRAM_BINS - 1, out=index)
+    counts += np.bincount(index, minlength=HISTOGRAM_BINS)
+  return counts, sums, invalid, exceed, low, high
+
+
+def _histogram_percentile(counts, total, percentile):
+  """
+  Reads a percentile off the log-spaced histogram, interpolating within the bin.
+  """
+  rank = percentile / 100 * total
+  cumulative = np.cumsum(counts)
+  bin_index = int(np.searchsorted(cumulative, rank, side='left'))
+  bin_index = min(bin_index, HISTOGRAM_BINS - 1)
+  before = cumulative[bin_index - 1] if bin_index else 0
+  fraction = (rank - before) / counts[bin_index] if counts[bin_index] else 0.5
+  decades = HISTOGRAM_LOG10_RANGE[1] - HISTOGRAM_LOG10_RANGE[0]
+  return float(10 ** (HISTOGRAM_LOG10_RANGE[0] + (bin_index + fraction) * decades / HISTOGRAM_BINS))
+
+
+def gsd_uncertainty(camera_parameters, altitude_m, distributions=None, samples=DEFAULT_SAMPLES,
+                    target_gsd_cm=None, percentiles=DEFAULT_PERCENTILES, seed=0,
+                    chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+  """
+  Estimates the spread of the achieved GSD by Monte Carlo sampling.
+
+  Args:
+    camera_parameters (dict): The camera, as returned by Camera_Database.get_camera_data.
+    altitude_m (float): The nominal flight altitude above ground in meters.
+    distributions (Optional[dict]): Distributions keyed by 'altitude_m', 'terrain_m' (terrain
+      height error, subtracted from the altitude), 'sensor_width_px', 'pixel_size_um' and
+      'focal_length_mm'; see _normalise_distribution. Missing parameters are fixed at their
+      nominal value (0 for terrain_m).
+    samples (int): The number of samples to draw.
+    target_gsd_cm (Optional[float]): Report the probability of a GSD coarser than this.
+    percentiles (Iterable[float]): The GSD percentiles to report.
+    seed (int): The seed; the same seed and chunk_size give the same result for any number of workers.
+    chunk_size (int): Samples evaluated at a time per process.
+    workers (Optional[int]): Run the chunks on a process pool of this size; None runs serially.
+
+  Returns:
+    dict: 'nominal_gsd_cm', 'mean_gsd_cm', 'std_gsd_cm', 'min_gsd_cm', 'max_gsd_cm',
+    'percentiles' (percentile -> GSD), 'exceed_probability' (among the valid samples), 'samples'
+    and 'invalid_samples' (samples at or below the ground). The statistics are None when no
+    sample is valid.
+  """
+  nominal = {'altitude_m': altitude_m, 'terrain_m': 0.0,
+             'sensor_width_px': camera_parameters['sensor_width_px'],
+             'pixel_size_um': get_pixel_size_um(camera_parameters),
+             'focal_length_mm': camera_parameters['focal_length_mm']}
+  distributions = distributions or {}
+  unknown = set(distributions) - set(PARAMETERS)
+  if unknown:
+    raise ValueError(f"Unknown parameters {sorted(unknown)}; expected some of {PARAMETERS}.")
+  distributions = {name: _normalise_distribution(distributions.get(name), nominal[name]) for name in PARAMETERS}
+  chunks = list(enumerate(_chunk_sizes(samples, chunk_size)))
+
+  if workers is None or workers <= 1 or len(chunks) == 1:
+    results = [_run_chunks(seed, chunks, distributions, target_gsd_cm)]
+  else:
+    # Contiguous groups of chunks, a few per worker to balance the load
+    groups = np.array_split(np.arange(len(chunks)), min(len(chunks), workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      results = list(executor.map(_run_chunks, [seed] * len(groups),
+                                  [[chunks[i] for i in group] for group in groups],
+                                  [distributions] * len(groups), [target_gsd_cm] * len(groups)))
+
+  counts = sum(result[0] for result in results)
+  sums = [chunk_sums for result in results for chunk_sums in result[1]]
+  invalid = sum(result[2] for result in results)
+  exceed = sum(result[3] for result in results)
+  valid = samples - invalid
+  mean = math.fsum(total for total, _ in sums) / valid if valid else None
+  variance = math.fsum(squares for _, squares in sums) / valid - mean * mean if valid else None
+  return {'nominal_gsd_cm': GSDCalculator.calculate_gsd(altitude_m, nominal['sensor_width_px'],
+                                                        nominal['pixel_size_um'], nominal['focal_length_mm']),
+          'mean_gsd_cm': mean, 'std_gsd_cm': math.sqrt(max(variance, 0.0)) if valid else None,
+          'min_gsd_cm': min(result[4] for result in results) if valid else None,
+          'max_gsd_cm': max(result[5] for result in results) if valid else None,
+          'percentiles': {p: _histogram_percentile(counts, valid, p) for p in percentiles} if valid else {},
+          'exceed_probability': exceed / valid if target_gsd_cm is not None and valid else None,
+          'samples': samples, 'invalid_samples': invalid}
+
+
+def main(argv=None):
+  """
+  Command line entry point for GSD uncertainty estimates.
+  """
+  parser = argparse.ArgumentParser(description="Monte Carlo spread of the achieved GSD.")
+  parser.add_argument('--camera', required=True, help="Camera name from the camera database")
+  parser.add_argument('--altitude', type=float, required=True, help="Nominal altitude above ground in meters")
+  parser.add_argument('--altitude-std', type=float, help="Altitude error (normal std) in meters")
+  parser.add_argument('--terrain-std', type=float, help="Terrain height error (normal std) in meters")
+  parser.add_argument('--focal-length-std', type=float, help="Focal length tolerance (normal std) in mm")
+  parser.add_argument('--pixel-size-std', type=float, help="Pixel size tolerance (normal std) in micrometers")
+  parser.add_argument('--target-gsd', type=float, help="Report the probability of exceeding this GSD (cm)")
+  parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--workers', type=int, help="Process pool size (default: serial)")
+  args = parser.parse_args(argv)
+
+  camera_parameters = Camera_Database.from_environment().get_camera_data(args.camera)
+  if camera_parameters is None:
+    return 1
+  distributions = {name: {'dist': 'normal', 'std': std} for name, std in
+                   (('altitude_m', args.altitude_std), ('terrain_m', args.terrain_std),
+                    ('focal_length_mm', args.focal_length_std), ('pixel_size_um', args.pixel_size_std))
+                   if std is not None}
+  result = gsd_uncertainty(camera_parameters, args.altitude, distributions, args.samples, args.target_gsd,
+                           seed=args.seed, workers=args.workers)
+  print(f"Nominal GSD: {result['nominal_gsd_cm']:.4f} cm")
+  if result['mean_gsd_cm'] is None:
+    print("Every sample was at or below the ground")
+    return 1
+  print(f"Mean GSD: {result['mean_gsd_cm']:.4f} cm (std {result['std_gsd_cm']:.4f} cm)")
+  for percentile, gsd in result['percentiles'].items():
+    print(f"P{percentile:g}: {gsd:.4f} cm")
+  if result['exceed_probability'] is not None:
+    print(f"P(GSD > {args.target_gsd} cm): {result['exceed_probability']:.4%}")
+  if result['invalid_samples']:
+    print(f"{result['invalid_samples']} samples were at or below the ground and are excluded")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())